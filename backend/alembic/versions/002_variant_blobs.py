@@ -0,0 +1,30 @@
+"""Compressed columnar variant blobs per upload
+
+Revision ID: 002
+Revises: 001
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+
+revision = "002"
+down_revision = "001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "variant_blobs",
+        sa.Column("id", UUID(as_uuid=True), primary_key=True),
+        sa.Column("upload_id", UUID(as_uuid=True), sa.ForeignKey("patient_uploads.id"), unique=True, nullable=False),
+        sa.Column("variant_count", sa.Integer, nullable=False),
+        sa.Column("format_version", sa.Integer, nullable=False),
+        sa.Column("data", sa.LargeBinary, nullable=False),
+        sa.Column("created_at", sa.DateTime, server_default=sa.func.now()),
+    )
+
+
+def downgrade():
+    op.drop_table("variant_blobs")
@@ -0,0 +1,36 @@
+"""Compressed reports with content-addressed shared sections
+
+Revision ID: 003
+Revises: 002
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "003"
+down_revision = "002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "report_payloads",
+        sa.Column("digest", sa.String(64), primary_key=True),
+        sa.Column("encoding", sa.String(16), nullable=False),
+        sa.Column("size", sa.Integer, nullable=False),
+        sa.Column("data", sa.LargeBinary, nullable=False),
+        sa.Column("created_at", sa.DateTime, server_default=sa.func.now()),
+    )
+    with op.batch_alter_table("generated_reports") as batch:
+        batch.alter_column("report_json", existing_type=sa.JSON, nullable=True)
+        batch.add_column(sa.Column("report_data", sa.LargeBinary, nullable=True))
+        batch.add_column(sa.Column("report_encoding", sa.String(16), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("generated_reports") as batch:
+        batch.drop_column("report_encoding")
+        batch.drop_column("report_data")
+        batch.alter_column("report_json", existing_type=sa.JSON, nullable=False)
+    op.drop_table("report_payloads")
@@ -0,0 +1,91 @@
+"""
+Bulk row inserts that bypass the ORM unit of work.
+
+``session.add()`` per row pays for identity-map bookkeeping, per-object
+state and a flush-time sort for every row. ``bulk_insert`` writes plain
+row dicts with one Core ``insert()`` executemany instead. Without
+RETURNING, SQLAlchemy hands that to the driver's ``executemany()``: one
+single-row ``INSERT`` statement, prepared once and executed for every
+parameter set (sqlite3 loops over them in C, asyncpg pipelines them). It
+does not rewrite it into multi-row ``INSERT ... VALUES``. On PostgreSQL
+via asyncpg, larger batches are streamed with ``COPY``
+(``copy_records_to_table``) instead, which skips per-row statement
+execution altogether.
+
+Both run on the session's connection and inside its transaction, so
+they commit or roll back together with the rest of the session.
+"""
+from typing import Any, Dict, List, Mapping, Sequence, Tuple
+import logging
+
+from sqlalchemy import Table, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger("pharmaguard.bulk_insert")
+
+# Smaller batches go through INSERT; COPY's setup costs more than it saves
+COPY_MIN_ROWS = 100
+
+
+def _with_defaults(table: Table, rows: Sequence[Mapping[str, Any]]) -> List[Dict[str, Any]]:
+    """Rows with the Python-side column defaults (ids, timestamps) filled in, as INSERT would"""
+    defaults = [
+        column for column in table.columns
+        if column.default is not None and (column.default.is_callable or column.default.is_scalar)
+    ]
+    filled = []
+    for row in rows:
+        row = dict(row)
+        for column in defaults:
+            if column.name not in row:
+                default = column.default
+                row[column.name] = default.arg(None) if default.is_callable else default.arg
+        filled.append(row)
+    return filled
+
+
+def _copy_records(rows: Sequence[Mapping[str, Any]]) -> Tuple[List[str], List[Tuple[Any, ...]]]:
+    """The column names of ``rows`` and one value tuple per row in that column order, for COPY"""
+    columns = list(rows[0])
+    return columns, [tuple(row[column] for column in columns) for row in rows]
+
+
+async def _copy_rows(session: AsyncSession, table: Table, rows: List[Dict[str, Any]]) -> None:
+    conn = await session.connection()
+    driver = (await conn.get_raw_connection()).driver_connection
+    if not driver.is_in_transaction():
+        # Make SQLAlchemy open its transaction so the COPY is part of it
+        await conn.exec_driver_sql("SELECT 1")
+    columns, records = _copy_records(rows)
+    await driver.copy_records_to_table(
+        table.name,
+        records=records,
+        columns=columns,
+        schema_name=table.schema,
+    )
+
+
+async def bulk_insert(
+    session: AsyncSession,
+    table: Table,
+    rows: Sequence[Mapping[str, Any]],
+    copy_min_rows: int = COPY_MIN_ROWS,
+) -> int:
+    """
+    Insert ``rows`` (column name -> value, all with the same keys) into ``table``.
+
+    Uses ``COPY`` on asyncpg for at least ``copy_min_rows`` rows, a Core
+    executemany ``INSERT`` otherwise. Rows referencing other rows through
+    foreign keys need those flushed first.
+
+    Returns:
+        Number of rows written
+    """
+    if not rows:
+        return 0
+    filled = _with_defaults(table, rows)
+    if len(filled) >= copy_min_rows and session.get_bind().dialect.driver == "asyncpg":
+        await _copy_rows(session, table, filled)
+    else:
+        await session.execute(insert(table), filled)
+    return len(filled)
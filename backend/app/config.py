@@ -13,6 +13,32 @@ class Settings(BaseSettings):
     
     # Database
     database_url: str = "sqlite+aiosqlite:///./pharmaguard.db"
+    # Connection pool (see GET /db/stats); recycle -1 = never
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: int = 30  # seconds to wait for a connection
+    db_pool_recycle: int = 1800  # seconds
+    # Test connections with a round trip on checkout; only worth it when
+    # something (a firewall, PgBouncer) drops idle connections before
+    # db_pool_recycle
+    db_pool_pre_ping: bool = False
+    # asyncpg prepared statements cached per connection (0 behind PgBouncer
+    # in transaction mode)
+    db_statement_cache_size: int = 100
+    # SQLite: WAL lets readers run alongside the writer; synchronous=NORMAL
+    # is durable in WAL mode except for the last commits on power loss
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    sqlite_busy_timeout: int = 5000  # ms a writer waits for the lock
+    # SQLite has a single writer: extra connections only wait in its busy
+    # handler (sleeping up to 100ms at a time) instead of the pool's queue.
+    # Replaces db_pool_size/db_max_overflow for SQLite files
+    sqlite_pool_size: int = 1
+    # Read-only connections for requests that only read (report lookups);
+    # with WAL they are not blocked by the writer. 0 = read through the
+    # writer's pool
+    sqlite_read_pool_size: int = 4
     
     # Security
     secret_key: str = secrets.token_urlsafe(32)
@@ -27,8 +53,53 @@ class Settings(BaseSettings):
     rate_limit_window: int = 60  # seconds
     
     # File Upload
-    max_upload_size: int = 5 * 1024 * 1024  # 5MB
-    allowed_file_types: List[str] = [".vcf"]
+    max_upload_size: int = 5 * 1024 * 1024  # 5MB (compressed size for .vcf.gz)
+    max_decompressed_size: int = 512 * 1024 * 1024  # 512MB
+    max_indexed_upload_size: int = 2 * 1024 * 1024 * 1024  # 2GB bgzipped VCF sent with a .tbi/.csi index
+    allowed_file_types: List[str] = [".vcf", ".vcf.gz", ".vcf.bgz"]
+    
+    # Parallel VCF parsing (bodies at or above the threshold are split into
+    # line-aligned chunks and parsed in a process pool; 0 workers = CPU count)
+    parse_workers: int = 0
+    parse_chunk_size: int = 1024 * 1024  # characters per chunk
+    parse_parallel_threshold: int = 2 * 1024 * 1024
+    # Skip full parsing of lines no active rule can match (reports are unchanged)
+    parse_prefilter: bool = True
+    
+    # Cache of parsed VCFs (by SHA-256 of the content) and per-drug
+    # recommendations (by content hash, drug, build and rule-set version).
+    # With parse_prefilter, cached tables keep only the lines some drug can
+    # use (plus the stored variants), per build and rule-set version
+    result_cache_enabled: bool = True
+    result_cache_max_entries: int = 64  # parsed VCFs
+    result_cache_max_bytes: int = 256 * 1024 * 1024
+    result_cache_ttl: int = 3600  # seconds
+    
+    # How an upload's variants are persisted: "rows" (the first 1000 as
+    # extracted_variants rows), "blob" (all of them as one compressed
+    # columnar blob, queryable through GET /api/v1/reports/{id}/variants)
+    # or "both". Blob storage keeps every line, so it disables parse_prefilter
+    # (and the result cache then holds whole files)
+    variant_storage: str = "rows"
+    
+    # Write-behind persistence: analyses respond before the database commit
+    # and their writes are committed in batches by a background task; a
+    # report can be read back shortly after its response
+    write_behind_enabled: bool = False
+    write_behind_queue_size: int = 32  # pending uploads (each holds its variants)
+    write_behind_batch_size: int = 16  # uploads per commit
+    write_behind_submit_timeout: float = 30.0  # seconds a request waits on a full queue
+    # A failed upload is retried this many times (backoff doubling from
+    # write_behind_retry_backoff seconds), then appended to the dead-letter
+    # file, which is replayed on startup (empty path = drop it). The file
+    # holds patient data as JSON lines, readable by its owner only
+    write_behind_max_retries: int = 3
+    write_behind_retry_backoff: float = 0.5
+    write_behind_dead_letter_path: str = ""
+    
+    # CPIC knowledge base JSON file (empty = the bundled app/data file);
+    # reloadable at runtime through POST /api/v1/knowledge-base/reload
+    knowledge_base_path: str = ""
     
     # Logging
     log_level: str = "INFO"
@@ -48,6 +119,24 @@ class Settings(BaseSettings):
             return [origin.strip() for origin in v.split(',') if origin.strip()]
         return v
     
+    @field_validator('variant_storage', mode='before')
+    @classmethod
+    def parse_variant_storage(cls, v):
+        """Accept rows, blob or both (case-insensitive)"""
+        v = str(v).strip().lower()
+        if v not in ('rows', 'blob', 'both'):
+            raise ValueError("VARIANT_STORAGE must be one of: rows, blob, both")
+        return v
+    
+    @field_validator('sqlite_journal_mode', 'sqlite_synchronous', mode='before')
+    @classmethod
+    def parse_sqlite_pragma(cls, v):
+        """Pragma values are interpolated into SQL; allow keywords only"""
+        v = str(v).strip().upper()
+        if not v.isalpha():
+            raise ValueError("SQLite pragma values must be keywords such as WAL or NORMAL")
+        return v
+    
     @field_validator('debug', mode='before')
     @classmethod
     def parse_debug(cls, v):
@@ -1,9 +1,138 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from typing import Any, Dict
+import json
+import weakref
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import DeclarativeBase
 from .config import settings
 
-engine = create_async_engine(settings.database_url, echo=False)
+# Pool events counted per engine for pool_stats()
+_POOL_EVENTS = ("connect", "checkout", "checkin", "invalidate")
+_pool_event_counts: "weakref.WeakKeyDictionary[Any, Dict[str, int]]" = weakref.WeakKeyDictionary()
+
+
+def _json_serializer(value: Any) -> str:
+    """JSON column serializer; bytes are already serialized JSON (e.g. ``ClinicalReport.to_json()``) and stored as is"""
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8")
+    return json.dumps(value)
+
+
+def _is_memory_sqlite(url) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def _has_sqlite_readers(url) -> bool:
+    """Whether reads get their own (read-only) SQLite connections"""
+    return url.get_backend_name() == "sqlite" and not _is_memory_sqlite(url) and settings.sqlite_read_pool_size > 0
+
+
+def engine_options(database_url: str, read_only: bool = False) -> Dict[str, Any]:
+    """``create_async_engine`` keyword arguments for the pool and driver settings (``read_only``: the SQLite reader pool)"""
+    url = make_url(database_url)
+    options: Dict[str, Any] = {"echo": False, "json_serializer": _json_serializer}
+    if _is_memory_sqlite(url):
+        # One shared connection (StaticPool); pool sizing does not apply
+        return options
+    sqlite = url.get_backend_name() == "sqlite"
+    if sqlite:
+        pool_size = settings.sqlite_read_pool_size if read_only else settings.sqlite_pool_size
+    else:
+        pool_size = settings.db_pool_size
+    options.update(
+        pool_size=pool_size,
+        max_overflow=0 if sqlite else settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+    )
+    if url.get_driver_name() == "asyncpg":
+        # SQLAlchemy's prepared statement cache and asyncpg's own
+        options["connect_args"] = {
+            "prepared_statement_cache_size": settings.db_statement_cache_size,
+            "statement_cache_size": settings.db_statement_cache_size,
+        }
+    return options
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        if settings.sqlite_journal_mode:
+            cursor.execute(f"PRAGMA journal_mode={settings.sqlite_journal_mode}")
+        if settings.sqlite_synchronous:
+            cursor.execute(f"PRAGMA synchronous={settings.sqlite_synchronous}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout)}")
+    finally:
+        cursor.close()
+
+
+def _set_sqlite_read_only(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA query_only=ON")
+    finally:
+        cursor.close()
+
+
+def _count_pool_events(engine: AsyncEngine) -> None:
+    counts = _pool_event_counts[engine.sync_engine] = dict.fromkeys(_POOL_EVENTS, 0)
+    for name in _POOL_EVENTS:
+        def count(*args, _name=name):
+            counts[_name] += 1
+        event.listen(engine.sync_engine, name, count)
+
+
+def create_engine(database_url: str, read_only: bool = False) -> AsyncEngine:
+    """
+    Async engine with the configured pool, the SQLite pragmas (file
+    databases) applied to every new connection and pool event counters.
+
+    ``read_only`` builds the SQLite reader pool: ``sqlite_read_pool_size``
+    connections with ``query_only`` set.
+    """
+    engine = create_async_engine(database_url, **engine_options(database_url, read_only))
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite" and not _is_memory_sqlite(url):
+        event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+        if read_only:
+            event.listen(engine.sync_engine, "connect", _set_sqlite_read_only)
+    _count_pool_events(engine)
+    return engine
+
+
+def create_read_engine(database_url: str, engine: AsyncEngine) -> AsyncEngine:
+    """
+    Engine for read-only requests.
+
+    SQLite allows one writer, but in WAL mode readers run alongside it, so a
+    SQLite file gets a separate pool of read-only connections (unless
+    ``sqlite_read_pool_size`` is 0). Other databases, and in-memory SQLite,
+    read through ``engine``.
+    """
+    if _has_sqlite_readers(make_url(database_url)):
+        return create_engine(database_url, read_only=True)
+    return engine
+
+
+def pool_stats(engine: AsyncEngine) -> Dict[str, Any]:
+    """Current pool occupancy plus event counts since startup"""
+    pool = engine.sync_engine.pool
+    stats: Dict[str, Any] = {"pool": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        method = getattr(pool, name, None)
+        if method is not None:
+            stats[name] = method()
+    stats.update(_pool_event_counts.get(engine.sync_engine, {}))
+    return stats
+
+
+engine = create_engine(settings.database_url)
+read_engine = create_read_engine(settings.database_url, engine)
 async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+async_read_session = async_sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False)
 
 
 class Base(DeclarativeBase):
@@ -13,3 +142,9 @@ class Base(DeclarativeBase):
 async def get_db():
     async with async_session() as session:
         yield session
+
+
+async def get_read_db():
+    """Session for requests that only read (see ``create_read_engine``)"""
+    async with async_read_session() as session:
+        yield session
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, Request, status
+from fastapi import Depends, FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.responses import JSONResponse
@@ -8,8 +8,11 @@ import logging
 import uuid
 import time
 from .config import settings
-from .database import engine, Base
+from .database import engine, read_engine, Base, pool_stats
 from .routers import analysis
+from .security import get_current_user
+from .services.knowledge_base import reload_knowledge_base
+from .services.vcf_parser import shutdown_parse_executor
 
 # Configure logging
 logging.basicConfig(
@@ -83,9 +86,19 @@ async def lifespan(app: FastAPI):
     
     logger.info("Database initialized")
     
+    # Compile the knowledge base now rather than on the first request
+    reload_knowledge_base(settings.knowledge_base_path or None)
+    analysis.start_write_behind()
+    
     yield
     
     logger.info("DRUGIFY API shutting down")
+    # Queued writes need the database, so before the engine goes
+    await analysis.close_write_behind()
+    shutdown_parse_executor()
+    await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
 
 
 # Create FastAPI app
@@ -150,6 +163,10 @@ app.include_router(drugs.router, prefix="/api/v1", tags=["drugs"])
 from .routers import ai_insights
 app.include_router(ai_insights.router, prefix="/api/v1", tags=["ai-insights"])
 
+# Import and register knowledge base router
+from .routers import knowledge_base
+app.include_router(knowledge_base.router, prefix="/api/v1", tags=["knowledge-base"])
+
 
 @app.get("/health")
 async def health():
@@ -181,6 +198,15 @@ async def health():
         )
 
 
+@app.get("/db/stats", dependencies=[Depends(get_current_user)])
+async def db_stats():
+    """Connection pool occupancy and event counters (SQLite reader pool under ``read``)"""
+    stats = pool_stats(engine)
+    if read_engine is not engine:
+        stats["read"] = pool_stats(read_engine)
+    return stats
+
+
 @app.get("/")
 async def root():
     """Root endpoint"""
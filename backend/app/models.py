@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Integer, DateTime, Text, JSON, ForeignKey
+from sqlalchemy import Column, String, Integer, DateTime, Text, JSON, ForeignKey, LargeBinary
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from .database import Base
@@ -18,6 +18,7 @@ class PatientUpload(Base):
 
     variants = relationship("ExtractedVariant", back_populates="upload", cascade="all, delete-orphan")
     reports = relationship("GeneratedReport", back_populates="upload", cascade="all, delete-orphan")
+    variant_blob = relationship("VariantBlob", back_populates="upload", uselist=False, cascade="all, delete-orphan")
 
 
 class ExtractedVariant(Base):
@@ -36,6 +37,20 @@ class ExtractedVariant(Base):
     upload = relationship("PatientUpload", back_populates="variants")
 
 
+class VariantBlob(Base):
+    """Every variant of an upload in one compressed columnar blob (see services.variant_blob)"""
+    __tablename__ = "variant_blobs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    upload_id = Column(UUID(as_uuid=True), ForeignKey("patient_uploads.id"), unique=True, nullable=False)
+    variant_count = Column(Integer, nullable=False)
+    format_version = Column(Integer, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    upload = relationship("PatientUpload", back_populates="variant_blob")
+
+
 class GeneratedReport(Base):
     __tablename__ = "generated_reports"
 
@@ -43,12 +58,27 @@ class GeneratedReport(Base):
     upload_id = Column(UUID(as_uuid=True), ForeignKey("patient_uploads.id"), nullable=False)
     report_id = Column(String(50), unique=True, nullable=False)
     patient_id = Column(String(50), nullable=False, index=True)
-    report_json = Column(JSON, nullable=False)
+    # Reports are stored compressed, with shared sections in report_payloads
+    # (see report_store); report_json only holds reports written before that
+    report_json = Column(JSON, nullable=True)
+    report_data = Column(LargeBinary, nullable=True)
+    report_encoding = Column(String(16), nullable=True)
     generated_at = Column(DateTime, default=datetime.utcnow)
 
     upload = relationship("PatientUpload", back_populates="reports")
 
 
+class ReportPayload(Base):
+    """Compressed report section shared between reports, keyed by the SHA-256 of its JSON (see report_store)"""
+    __tablename__ = "report_payloads"
+
+    digest = Column(String(64), primary_key=True)
+    encoding = Column(String(16), nullable=False)
+    size = Column(Integer, nullable=False)  # uncompressed bytes
+    data = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
 class DrugRequestHistory(Base):
     __tablename__ = "drug_request_history"
 
@@ -0,0 +1,196 @@
+"""
+Compressed, content-addressed storage of generated reports.
+
+A report is split into its shared sections (``SHARED_SECTIONS``: the
+variant preview and the disclaimer, which repeat verbatim across
+re-analyses of an upload and across reports) and the rest, its core. In
+the core, each section is replaced by a ``{"$payload": digest}``
+reference. Sections are stored once as ``ReportPayload`` rows keyed by
+the SHA-256 of their JSON. Only the sections are deduplicated: the core
+(report ID, time, summary and recommendations) is unique per report and
+is stored on each ``GeneratedReport`` row. Both are zlib-compressed.
+
+Section digests committed by this process are remembered, so writing a
+report whose sections are already stored is the single
+``GeneratedReport`` INSERT. Sections are immutable, so their decoded
+JSON is cached for reads.
+
+``load_report`` reverses the split and returns exactly the bytes of
+``ClinicalReport.to_json()``. Reports stored before this are read from
+``report_json``; the oldest of those hold the engine's snake_case dict
+and are converted to the API's camelCase shape on the way out.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Set, Tuple
+import hashlib
+import zlib
+
+import orjson
+from sqlalchemy import event, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .models import GeneratedReport, ReportPayload
+from .schemas import ClinicalReportOut
+from .services.report_model import ClinicalReport
+
+# Report keys stored as separate, shared payloads
+SHARED_SECTIONS = ("variants", "disclaimer")
+
+PAYLOAD_ENCODING = "zlib"
+COMPRESSION_LEVEL = 6
+
+# Section digests known to be committed / decoded sections kept for reads
+KNOWN_SECTIONS_MAX = 4096
+SECTION_CACHE_MAX = 256
+
+_REF = "$payload"
+_PENDING = "report_store_pending_sections"
+
+_known_sections: "OrderedDict[str, None]" = OrderedDict()
+_section_cache: "OrderedDict[str, Any]" = OrderedDict()
+
+
+def payload_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def split_report(report: ClinicalReport) -> Tuple[bytes, Dict[str, bytes]]:
+    """A report's core JSON (sections replaced by references) and its sections' JSON by digest"""
+    content = report.to_dict()
+    sections: Dict[str, bytes] = {}
+    for name in SHARED_SECTIONS:
+        data = orjson.dumps(content[name])
+        digest = payload_digest(data)
+        sections[digest] = data
+        content[name] = {_REF: digest}
+    return orjson.dumps(content), sections
+
+
+def _references(content: Mapping[str, Any]) -> Dict[str, str]:
+    """Section name -> digest of the references in a decoded core"""
+    return {
+        name: value[_REF] for name, value in content.items()
+        if isinstance(value, dict) and _REF in value
+    }
+
+
+def _unpack(encoding: str, data: bytes) -> bytes:
+    if encoding != PAYLOAD_ENCODING:
+        raise ValueError(f"Unsupported report payload encoding {encoding!r}")
+    return zlib.decompress(data)
+
+
+def _remember(cache: "OrderedDict[str, Any]", key: str, value: Any, limit: int) -> None:
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > limit:
+        cache.popitem(last=False)
+
+
+@event.listens_for(Session, "after_commit")
+def _sections_committed(session: Session) -> None:
+    for digest in session.info.pop(_PENDING, ()):
+        _remember(_known_sections, digest, None, KNOWN_SECTIONS_MAX)
+
+
+@event.listens_for(Session, "after_rollback")
+def _sections_rolled_back(session: Session) -> None:
+    session.info.pop(_PENDING, None)
+
+
+async def _store_sections(session: AsyncSession, sections: Mapping[str, bytes]) -> None:
+    """Write the sections, skipping those already stored (one statement where the dialect supports it)"""
+    table = ReportPayload.__table__
+    rows = [
+        {"digest": digest, "encoding": PAYLOAD_ENCODING, "size": len(data), "data": zlib.compress(data, COMPRESSION_LEVEL)}
+        for digest, data in sections.items()
+    ]
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        result = await session.execute(select(table.c.digest).where(table.c.digest.in_(list(sections))))
+        existing = set(result.scalars())
+        rows = [row for row in rows if row["digest"] not in existing]
+        if rows:
+            await session.execute(insert(table), rows)
+        return
+    await session.execute(dialect_insert(table).on_conflict_do_nothing(index_elements=["digest"]), rows)
+
+
+async def store_reports(session: AsyncSession, reports: Sequence[ClinicalReport]) -> List[Dict[str, Any]]:
+    """
+    Store the reports' shared sections in the session's transaction.
+
+    Returns:
+        Per report, the ``GeneratedReport`` column values holding its core
+    """
+    columns: List[Dict[str, Any]] = []
+    new_sections: Dict[str, bytes] = {}
+    for report in reports:
+        core, sections = split_report(report)
+        new_sections.update((d, data) for d, data in sections.items() if d not in _known_sections)
+        columns.append({"report_data": zlib.compress(core, COMPRESSION_LEVEL), "report_encoding": PAYLOAD_ENCODING})
+    if new_sections:
+        await _store_sections(session, new_sections)
+        pending: Set[str] = session.sync_session.info.setdefault(_PENDING, set())
+        pending.update(new_sections)
+    return columns
+
+
+async def _sections(session: AsyncSession, digests: Sequence[str]) -> Dict[str, Any]:
+    """Decoded sections by digest, from the cache or the database"""
+    found = {}
+    for digest in digests:
+        if digest in _section_cache:
+            _section_cache.move_to_end(digest)
+            found[digest] = _section_cache[digest]
+    missing = [digest for digest in digests if digest not in found]
+    if missing:
+        result = await session.execute(
+            select(ReportPayload.digest, ReportPayload.encoding, ReportPayload.data)
+            .where(ReportPayload.digest.in_(missing))
+        )
+        for digest, encoding, data in result:
+            found[digest] = orjson.loads(_unpack(encoding, data))
+            _remember(_section_cache, digest, found[digest], SECTION_CACHE_MAX)
+    lost = set(digests) - set(found)
+    if lost:
+        raise LookupError(f"Report payloads {', '.join(sorted(lost))} are missing")
+    return found
+
+
+def legacy_report_json(report_json: Mapping[str, Any]) -> bytes:
+    """
+    JSON bytes of a ``report_json`` column value. Reports stored before the
+    API shape was serialized directly hold snake_case keys (and the full
+    parsed variants); they are passed through ``ClinicalReportOut``, as the
+    API did when it returned them.
+    """
+    if "reportId" in report_json:
+        return orjson.dumps(report_json)
+    return orjson.dumps(ClinicalReportOut.model_validate(report_json).model_dump(mode="json", by_alias=True))
+
+
+async def load_report(session: AsyncSession, report_id: str) -> Optional[bytes]:
+    """A stored report's JSON bytes, or None if there is no such report"""
+    result = await session.execute(
+        select(GeneratedReport.report_encoding, GeneratedReport.report_data, GeneratedReport.report_json)
+        .where(GeneratedReport.report_id == report_id)
+    )
+    row = result.one_or_none()
+    if row is None:
+        return None
+    encoding, data, legacy = row
+    if data is None:
+        return legacy_report_json(legacy)
+
+    content = orjson.loads(_unpack(encoding, data))
+    references = _references(content)
+    sections = await _sections(session, list(references.values()))
+    for name, digest in references.items():
+        content[name] = sections[digest]
+    return orjson.dumps(content)
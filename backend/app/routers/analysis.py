@@ -1,17 +1,421 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from ..database import get_db
-from ..schemas import AnalysisRequest, ClinicalReportOut
-from ..services.vcf_parser import parse_vcf
-from ..services.pgx_engine import analyze_variants
-from ..models import PatientUpload, ExtractedVariant, GeneratedReport, DrugRequestHistory
-from ..security import rate_limit_dependency, sanitize_patient_id
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import FormData, UploadFile
+from starlette.formparsers import MultiPartException
+from ..bulk_insert import bulk_insert
+from ..database import async_session, get_db, get_read_db
+from ..report_store import load_report, store_reports
+from ..upload_stream import StreamedBody, UploadTooLarge, iter_spooled, read_form, spool_body, spooled_digest
+from ..write_behind import WriteBehindClosed, WriteBehindQueue
+from ..schemas import AnalysisOptions, AnalysisRequest, ClinicalReportOut, CohortReportOut
+from ..services.vcf_parser import LinePrefilter, iter_vcf, iter_vcf_regions, parse_vcf, parse_vcf_parallel
+from ..services.variant_table import VARIANT_FIELDS, VariantTable
+from ..services.variant_blob import FORMAT_VERSION, VariantBlobReader, encode_variants
+from ..services.bgzf import GZIP_MAGIC, DecompressionLimitError, is_gzip, iter_decompressed
+from ..services.pgx_engine import analyze_cohort, analyze_variants, build_prefilter, regions_for_drugs
+from ..services.result_cache import AnalysisCache, content_hash
+from ..services.report_model import ClinicalReport, cohort_json
+from ..models import PatientUpload, ExtractedVariant, GeneratedReport, DrugRequestHistory, VariantBlob
+from ..security import get_current_user, rate_limit_dependency, sanitize_patient_id
 from ..config import settings
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
+import asyncio
+import re
 import logging
 
 router = APIRouter()
 logger = logging.getLogger("pharmaguard.analysis")
 
+# Maximum number of variants accepted per upload
+MAX_VARIANTS = 100000
+
+# Number of variants persisted per upload
+STORED_VARIANTS = 1000
+
+# Maximum number of variants returned by GET /reports/{report_id}/variants
+MAX_VARIANT_QUERY_ROWS = 10000
+
+# Chunk size used when reading uploaded files
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Parsed VCFs and per-drug recommendations of recent uploads
+_analysis_cache: Optional[AnalysisCache] = AnalysisCache(
+    settings.result_cache_max_entries,
+    settings.result_cache_max_bytes,
+    ttl=settings.result_cache_ttl,
+) if settings.result_cache_enabled else None
+
+# Characters allowed in patient IDs (see AnalysisOptions.validate_patient_id)
+_INVALID_PATIENT_ID_CHARS = re.compile(r"[^A-Za-z0-9\-_]")
+
+
+class TooManyVariantsError(ValueError):
+    """Raised when an upload exceeds MAX_VARIANTS"""
+
+
+def _retain_variants(
+    variants: Union[Iterable[Dict[str, Any]], Callable[[], Iterable[Dict[str, Any]]]],
+    retained: VariantTable,
+    prefilter: Optional[LinePrefilter] = None,
+    keep: Optional[int] = STORED_VARIANTS,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Pass variants through, keeping the first ``keep`` (None: all) and enforcing MAX_VARIANTS.
+
+    ``variants`` may be a callable returning them, called on first use (in
+    the consuming thread); a ``VariantTable`` it returns is kept whole, by
+    column, rather than row by row.
+    """
+    if callable(variants):
+        variants = variants()
+    if keep is None and isinstance(variants, VariantTable):
+        if len(variants) > MAX_VARIANTS:
+            raise TooManyVariantsError("Too many variants. Maximum 100,000 variants allowed.")
+        retained.extend_table(variants)
+        yield from variants
+        return
+    count = 0
+    for v in variants:
+        count += 1
+        if count + (prefilter.skipped if prefilter is not None else 0) > MAX_VARIANTS:
+            raise TooManyVariantsError("Too many variants. Maximum 100,000 variants allowed.")
+        if keep is None or count <= keep:
+            retained.append_record(v)
+        yield v
+
+
+def _utf8_size(text: str) -> int:
+    """Encoded size of ``text`` without encoding it when it is plain ASCII (the usual VCF case)"""
+    return len(text) if text.isascii() else len(text.encode("utf-8"))
+
+
+def _parse_content(content: str, cohort: bool = False) -> Dict[str, Any]:
+    """parse_vcf, switching to the process pool for bodies above parse_parallel_threshold"""
+    if len(content) >= settings.parse_parallel_threshold:
+        return parse_vcf_parallel(
+            content,
+            cohort=cohort,
+            workers=settings.parse_workers or None,
+            chunk_size=settings.parse_chunk_size,
+        )
+    return parse_vcf(content, cohort=cohort)
+
+
+def _iter_content(content: str, prefilter: Optional[LinePrefilter] = None) -> Iterable[Mapping[str, Any]]:
+    """Variants of an in-memory VCF: streamed when small, parsed in parallel (a VariantTable) when large"""
+    if prefilter is not None or len(content) < settings.parse_parallel_threshold:
+        return iter_vcf(content, prefilter=prefilter)
+    return _parse_content(content)["variants"]
+
+
+def _stores_blob() -> bool:
+    """Whether every variant of an upload is persisted (as a variant blob)"""
+    return settings.variant_storage in ("blob", "both")
+
+
+def _prefilter_for(options: AnalysisOptions) -> Optional[LinePrefilter]:
+    """
+    Rule-driven line pre-filter for uploads, if enabled (never with blob
+    storage, which needs every line). The result cache widens it to every
+    drug (see ``AnalysisCache.analyze``).
+    """
+    if not settings.parse_prefilter or _stores_blob():
+        return None
+    return build_prefilter(options.drugs, passthrough=STORED_VARIANTS, genome_build=options.genome_build)
+
+
+def _upload_too_large(vcf_size: int, client_ip: str, limit: Optional[int] = None) -> HTTPException:
+    limit = limit or settings.max_upload_size
+    logger.warning(f"File size {vcf_size} exceeds limit from {client_ip}")
+    return HTTPException(
+        status_code=413,
+        detail=f"File size exceeds maximum allowed size of {limit / (1024*1024)}MB"
+    )
+
+
+def _with_gz_suffix(file_name: str, head: bytes) -> str:
+    """``file_name`` with a .gz suffix added when the upload is gzip compressed but not named so"""
+    if is_gzip(head) and not file_name.lower().endswith((".gz", ".bgz")):
+        return file_name + ".gz"
+    return file_name
+
+
+def _split_drugs(values: List[str]) -> List[str]:
+    """Accept drugs as repeated fields and/or comma-separated values"""
+    return [drug.strip() for value in values for drug in value.split(",") if drug.strip()]
+
+
+def _has_allowed_extension(file_name: str) -> bool:
+    name = file_name.lower()
+    return any(name.endswith(ext) for ext in settings.allowed_file_types)
+
+
+async def _run_analysis(
+    variants: Union[Iterable[Dict[str, Any]], Callable[[], Iterable[Dict[str, Any]]]],
+    options: AnalysisOptions,
+    file_name: str,
+    vcf_size: Union[int, Callable[[], int]],
+    client_ip: str,
+    db: AsyncSession,
+    prefilter: Optional[LinePrefilter] = None,
+    cache_key: Optional[str] = None,
+) -> Response:
+    """
+    Analyze and persist a (lazy) variant stream, returning the report as a
+    JSON response.
+
+    ``vcf_size`` may be a callable returning the size once the stream is
+    consumed (bodies parsed while they arrive); ``variants`` may be a
+    callable returning the stream, called in the worker thread. ``prefilter``
+    is the LinePrefilter the stream is parsed with, if any.
+    With a ``cache_key`` (content hash) the analysis goes through the
+    result cache: the stream is only consumed if the parsed file is not
+    cached.
+    """
+    sanitized_patient_id = sanitize_patient_id(options.patient_id)
+
+    try:
+        if cache_key is not None and _analysis_cache is not None:
+            report, table = await run_in_threadpool(
+                _analysis_cache.analyze,
+                cache_key,
+                lambda table: _retain_variants(variants, table, prefilter, keep=None),
+                options.patient_id,
+                options.drugs,
+                options.genome_build,
+                prefilter,
+            )
+            stored_variants = table
+        else:
+            # Parse and analyze in a single streaming pass; only the variants
+            # that will be persisted are kept in memory
+            stored_variants = VariantTable()
+            stream = _retain_variants(variants, stored_variants, prefilter, None if _stores_blob() else STORED_VARIANTS)
+            # Parsing is CPU-bound; keep it off the event loop
+            report = await run_in_threadpool(
+                analyze_variants,
+                {"variants": stream, "prefilter": prefilter},
+                options.patient_id,
+                options.drugs,
+                options.genome_build,
+            )
+    except TooManyVariantsError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except DecompressionLimitError as e:
+        logger.warning(f"Decompressed upload too large from {client_ip}: {e}")
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadTooLarge as e:
+        raise _upload_too_large(e.size, client_ip, e.limit)
+    except Exception as e:
+        logger.error(f"VCF parsing error from {client_ip}: {e}")
+        raise HTTPException(
+            status_code=422,
+            detail=f"Invalid VCF format: {str(e)}"
+        )
+
+    # Validate variant count
+    total_variants = report.summary.total_variants
+    if total_variants == 0:
+        raise HTTPException(
+            status_code=422,
+            detail="No variants found in VCF file"
+        )
+    if total_variants > MAX_VARIANTS:
+        # Pre-filtered lines are only counted once the stream is exhausted
+        raise HTTPException(status_code=422, detail="Too many variants. Maximum 100,000 variants allowed.")
+
+    if callable(vcf_size):
+        vcf_size = vcf_size()
+    body = report.to_json()
+    try:
+        await _save(db, options.patient_id, options.notes, file_name, vcf_size, stored_variants, [report])
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Database error during analysis: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=500,
+            detail="An error occurred while processing your request"
+        )
+
+    logger.info(
+        f"Report {report.report_id} generated for patient {sanitized_patient_id} "
+        f"({total_variants} variants, {len(report.recommendations)} recommendations)"
+    )
+
+    return Response(content=body, media_type="application/json")
+
+
+async def _stage_upload(
+    db: AsyncSession,
+    patient_id: str,
+    notes: Optional[str],
+    file_name: str,
+    vcf_size: int,
+    variants: VariantTable,
+    reports: Sequence[ClinicalReport],
+) -> None:
+    """
+    Add an upload, its variants, reports and drug request history to the session (not committed).
+
+    Depending on ``variant_storage``, the first STORED_VARIANTS variants are
+    saved as rows and/or all of ``variants`` as a variant blob (cohort
+    blobs hold the first sample's genotype column only). Reports are
+    stored compressed, with their shared sections deduplicated (see
+    ``report_store``).
+    """
+    # Save upload metadata
+    upload = PatientUpload(
+        patient_id=patient_id,
+        file_name=file_name,
+        file_size=vcf_size,
+        notes=notes,
+    )
+    db.add(upload)
+    await db.flush()
+
+    if _stores_blob():
+        # Compression is CPU-bound; keep it off the event loop
+        blob = await run_in_threadpool(encode_variants, variants)
+        db.add(VariantBlob(
+            upload_id=upload.id,
+            variant_count=len(variants),
+            format_version=FORMAT_VERSION,
+            data=blob,
+        ))
+
+    # Save variants (limit to first 1000 for storage) and the drug request
+    # history in bulk, bypassing the ORM
+    stored_variants = variants[:STORED_VARIANTS] if settings.variant_storage in ("rows", "both") else []
+    await bulk_insert(db, ExtractedVariant.__table__, [
+        {
+            "upload_id": upload.id,
+            "chrom": v["chrom"],
+            "pos": v["pos"],
+            "rs_id": v["id"],
+            "ref": v["ref"],
+            "alt": v["alt"],
+            "qual": v["qual"],
+            "genotype": v["genotype"],
+        }
+        for v in stored_variants
+    ])
+    await bulk_insert(db, DrugRequestHistory.__table__, [
+        {
+            "report_id": report.report_id,
+            "patient_id": report.patient_id,
+            "drug_name": rec.drug,
+            "gene": rec.gene,
+            "risk_level": rec.risk_level,
+        }
+        for report in reports
+        for rec in report.recommendations
+    ])
+
+    stored = await store_reports(db, reports)
+    for report, columns in zip(reports, stored):
+        db.add(GeneratedReport(
+            upload_id=upload.id,
+            report_id=report.report_id,
+            patient_id=report.patient_id,
+            **columns,
+        ))
+
+
+async def _persist(db: AsyncSession, *upload: Any) -> None:
+    """``_stage_upload`` and commit"""
+    await _stage_upload(db, *upload)
+    await db.commit()
+
+
+def _upload_to_json(upload: Sequence[Any]) -> Dict[str, Any]:
+    """A queued upload (``_stage_upload`` arguments) as JSON-ready data, for its dead letter"""
+    patient_id, notes, file_name, vcf_size, variants, reports = upload
+    return {
+        "patient_id": patient_id,
+        "notes": notes,
+        "file_name": file_name,
+        "file_size": vcf_size,
+        "variants": [[v[name] for name in VARIANT_FIELDS] + [v.gt_code] for v in variants],
+        "reports": [report.to_dict() for report in reports],
+    }
+
+
+def _upload_from_json(data: Mapping[str, Any]) -> Tuple[Any, ...]:
+    """
+    Inverse of ``_upload_to_json``. A cohort table comes back without its
+    genotype matrix, which is not stored.
+    """
+    variants = VariantTable()
+    for row in data["variants"]:
+        variants.append(*row[:-1], gt_code=row[-1])
+    reports = [ClinicalReport.from_dict(report) for report in data["reports"]]
+    return data["patient_id"], data["notes"], data["file_name"], data["file_size"], variants, reports
+
+
+# Uploads waiting to be written, when write-behind persistence is enabled
+_write_behind: Optional[WriteBehindQueue] = WriteBehindQueue(
+    async_session,
+    _stage_upload,
+    maxsize=settings.write_behind_queue_size,
+    batch_size=settings.write_behind_batch_size,
+    submit_timeout=settings.write_behind_submit_timeout,
+    max_retries=settings.write_behind_max_retries,
+    retry_backoff=settings.write_behind_retry_backoff,
+    dead_letter_path=settings.write_behind_dead_letter_path or None,
+    encode_job=_upload_to_json,
+    decode_job=_upload_from_json,
+) if settings.write_behind_enabled else None
+_dead_letter_replay: Optional[asyncio.Task] = None
+
+
+async def _save(db: AsyncSession, *upload: Any) -> None:
+    """
+    Persist an upload (``_stage_upload`` arguments) now, or queue it when
+    write-behind is enabled.
+
+    Raises:
+        HTTPException: 503 if the write-behind queue stays full or is shutting down
+    """
+    if _write_behind is None:
+        await _persist(db, *upload)
+        return
+    try:
+        await _write_behind.submit(*upload)
+    except (asyncio.TimeoutError, WriteBehindClosed):
+        logger.warning("Write-behind queue unavailable; rejecting request")
+        raise HTTPException(status_code=503, detail="Server busy, please retry shortly")
+
+
+async def _replay_dead_letters(queue: WriteBehindQueue) -> None:
+    try:
+        replayed = await queue.replay_dead_letters()
+    except Exception as e:
+        logger.error(f"Replaying write-behind dead letters failed: {e}", exc_info=True)
+        return
+    if replayed:
+        logger.info(f"Replayed {replayed} write-behind dead letters")
+
+
+def start_write_behind() -> None:
+    """Queue the uploads of the write-behind dead-letter file again, in the background (application startup)"""
+    global _dead_letter_replay
+    if _write_behind is not None:
+        _dead_letter_replay = asyncio.create_task(_replay_dead_letters(_write_behind))
+
+
+async def close_write_behind() -> None:
+    """Write out queued uploads and stop the write-behind queue (application shutdown)"""
+    if _write_behind is not None:
+        await _write_behind.close()
+    if _dead_letter_replay is not None and not _dead_letter_replay.done():
+        _dead_letter_replay.cancel()
+
 
 @router.post("/analyze", response_model=ClinicalReportOut, dependencies=[Depends(rate_limit_dependency)])
 async def analyze_vcf(
@@ -21,9 +425,9 @@ async def analyze_vcf(
 ):
     """
     Analyze a VCF file and generate a pharmacogenomic report.
-    
+
     Rate limited to 10 requests per minute per IP address.
-    
+
     **Security Features:**
     - Input validation and sanitization
     - Rate limiting
@@ -33,106 +437,346 @@ async def analyze_vcf(
     """
     client_ip = http_request.client.host if http_request.client else "unknown"
     sanitized_patient_id = sanitize_patient_id(request.patient_id)
-    
+
     logger.info(
         f"Analysis request from {client_ip} for patient {sanitized_patient_id} "
         f"with drugs: {', '.join(request.drugs)}"
     )
-    
+
     # Validate file size
-    vcf_size = len(request.vcf_content.encode('utf-8'))
+    vcf_size = _utf8_size(request.vcf_content)
     if vcf_size > settings.max_upload_size:
-        logger.warning(f"File size {vcf_size} exceeds limit from {client_ip}")
-        raise HTTPException(
-            status_code=413,
-            detail=f"File size exceeds maximum allowed size of {settings.max_upload_size / (1024*1024)}MB"
-        )
-    
-    # Parse VCF
+        raise _upload_too_large(vcf_size, client_ip)
+
+    cache_key = content_hash(request.vcf_content) if _analysis_cache is not None else None
+    prefilter = _prefilter_for(request)
+    variants = lambda: _iter_content(request.vcf_content, prefilter)
+    return await _run_analysis(variants, request, "uploaded.vcf", vcf_size, client_ip, db, prefilter, cache_key)
+
+
+@router.post("/analyze/upload", response_model=ClinicalReportOut, dependencies=[Depends(rate_limit_dependency)])
+async def analyze_vcf_upload(
+    http_request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Analyze an uploaded VCF file (plain, gzip or BGZF compressed).
+
+    Accepts either:
+    - ``multipart/form-data`` with a ``file`` part and ``patient_id``,
+      ``drugs``, ``notes`` and ``genome_build`` form fields
+    - a raw request body (e.g. ``application/octet-stream``) with
+      the same fields as query parameters
+
+    ``drugs`` may be repeated or comma-separated. The size limits apply to
+    the bytes as sent (i.e. compressed size) and are enforced on every chunk
+    as it arrives. Multipart bodies are parsed incrementally and their file
+    parts spooled; a raw body is decompressed and parsed while it arrives
+    (unless the result cache is enabled, which needs the content hash before
+    parsing and so spools it first). Decompression always works on bounded
+    chunks.
+
+    Multipart uploads may add an ``index`` part holding the .tbi/.csi index
+    of a bgzipped ``file`` (plus an optional ``genome_build`` field, default
+    GRCh38). Only the pharmacogene regions needed for the selected drugs are
+    then read, which makes exome/genome VCFs up to
+    ``max_indexed_upload_size`` practical; ``totalVariants`` then counts the
+    variants inside those regions. The ``index`` part must come before the
+    ``file`` part: until an index has been received, ``file`` is limited to
+    ``max_upload_size`` like any other upload, so nothing larger is spooled
+    to disk.
+    """
+    client_ip = http_request.client.host if http_request.client else "unknown"
+    content_type = http_request.headers.get("content-type", "")
+
+    # Reject early when the client announces an oversized body
+    is_multipart = content_type.startswith("multipart/form-data")
+    body_limit = max(settings.max_upload_size, settings.max_indexed_upload_size) if is_multipart else settings.max_upload_size
+    content_length = http_request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > body_limit + UPLOAD_CHUNK_SIZE:
+        raise _upload_too_large(int(content_length), client_ip, body_limit)
+
+    form: Optional[FormData] = None
+    if is_multipart:
+        try:
+            form = await read_form(
+                http_request.headers,
+                http_request.stream(),
+                body_limit + UPLOAD_CHUNK_SIZE,
+                {"file": settings.max_upload_size, "index": settings.max_upload_size},
+                {"index": {"file": body_limit}},
+            )
+        except UploadTooLarge as e:
+            raise _upload_too_large(e.size, client_ip, min(e.limit, body_limit))
+        except MultiPartException as e:
+            raise HTTPException(status_code=400, detail=e.message)
     try:
-        parsed = parse_vcf(request.vcf_content)
-    except Exception as e:
-        logger.error(f"VCF parsing error from {client_ip}: {e}")
-        raise HTTPException(
-            status_code=422,
-            detail=f"Invalid VCF format: {str(e)}"
-        )
-    
-    # Validate variant count
-    if len(parsed["variants"]) == 0:
-        raise HTTPException(
-            status_code=422,
-            detail="No variants found in VCF file"
+        return await _analyze_upload(http_request, form, client_ip, db)
+    finally:
+        if form is not None:
+            await form.close()
+
+
+async def _analyze_upload(
+    http_request: Request,
+    form: Optional[FormData],
+    client_ip: str,
+    db: AsyncSession,
+) -> Response:
+    """``analyze_vcf_upload`` of a parsed multipart ``form``, or of the raw request body without one"""
+    upload_file: Optional[UploadFile] = None
+    index_file: Optional[UploadFile] = None
+    if form is not None:
+        fields: Any = form
+        upload_file = form.get("file")
+        if not isinstance(upload_file, UploadFile):
+            raise HTTPException(status_code=422, detail="Missing 'file' part in multipart upload")
+        file_name = upload_file.filename or "uploaded.vcf"
+        index_file = form.get("index") if isinstance(form.get("index"), UploadFile) else None
+    else:
+        fields = http_request.query_params
+        file_name = fields.get("file_name") or "uploaded.vcf"
+
+    try:
+        options = AnalysisOptions(
+            patient_id=fields.get("patient_id"),
+            drugs=_split_drugs(fields.getlist("drugs")),
+            notes=fields.get("notes") or None,
+            genome_build=fields.get("genome_build") or None,
         )
-    
-    if len(parsed["variants"]) > 100000:
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+
+    if not _has_allowed_extension(file_name):
         raise HTTPException(
             status_code=422,
-            detail="Too many variants. Maximum 100,000 variants allowed."
+            detail=f"Unsupported file type. Allowed: {', '.join(settings.allowed_file_types)}"
         )
-    
+
+    logger.info(
+        f"Upload analysis request from {client_ip} for patient "
+        f"{sanitize_patient_id(options.patient_id)} with drugs: {', '.join(options.drugs)}"
+        f"{' (indexed)' if index_file is not None else ''}"
+    )
+
+    if index_file is not None:
+        # Region-restricted read: seek into the spooled upload via the index
+        vcf_size = upload_file.size or 0
+        if vcf_size > settings.max_indexed_upload_size:
+            raise _upload_too_large(vcf_size, client_ip, settings.max_indexed_upload_size)
+        index_bytes = await index_file.read()
+        try:
+            regions = regions_for_drugs(options.drugs, options.genome_build or "GRCh38")
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        variants = iter_vcf_regions(upload_file.file, index_bytes, regions)
+        return await _run_analysis(variants, options, file_name, vcf_size, client_ip, db)
+
+    if upload_file is not None:
+        return await _analyze_spooled(upload_file, options, file_name, client_ip, db)
+
+    if _analysis_cache is not None:
+        # The cache is looked up by content hash before parsing, so the body is spooled first
+        try:
+            spooled = await spool_body(http_request.stream(), settings.max_upload_size)
+        except UploadTooLarge as e:
+            raise _upload_too_large(e.size, client_ip, e.limit)
+        try:
+            return await _analyze_spooled(spooled, options, file_name, client_ip, db)
+        finally:
+            await spooled.close()
+
+    # Decompress and parse the body while it arrives
+    body = StreamedBody(http_request.stream(), settings.max_upload_size)
     try:
-        # Save upload metadata
-        upload = PatientUpload(
-            patient_id=request.patient_id,
-            file_name="uploaded.vcf",
-            file_size=vcf_size,
-            notes=request.notes,
-        )
-        db.add(upload)
-        await db.flush()
-        
-        # Save variants (limit to first 1000 for storage)
-        for v in parsed["variants"][:1000]:
-            db.add(ExtractedVariant(
-                upload_id=upload.id,
-                chrom=v["chrom"],
-                pos=v["pos"],
-                rs_id=v["id"],
-                ref=v["ref"],
-                alt=v["alt"],
-                qual=v["qual"],
-                genotype=v["genotype"],
-            ))
-        
-        # Run analysis with drug filtering
-        report = analyze_variants(parsed, request.patient_id, request.drugs)
-        
-        # Save report
-        db.add(GeneratedReport(
-            upload_id=upload.id,
-            report_id=report["report_id"],
-            patient_id=request.patient_id,
-            report_json=report,
-        ))
-        
-        # Save drug request history
-        for rec in report["recommendations"]:
-            db.add(DrugRequestHistory(
-                report_id=report["report_id"],
-                patient_id=request.patient_id,
-                drug_name=rec["drug"],
-                gene=rec["gene"],
-                risk_level=rec["risk_level"],
-            ))
-        
-        await db.commit()
-        
-        logger.info(
-            f"Report {report['report_id']} generated for patient {sanitized_patient_id} "
-            f"({len(parsed['variants'])} variants, {len(report['recommendations'])} recommendations)"
-        )
-        
-        return report
-        
+        head = await body.peek(len(GZIP_MAGIC))
+    except UploadTooLarge as e:
+        raise _upload_too_large(e.size, client_ip, e.limit)
+    if not head:
+        raise HTTPException(status_code=422, detail="Empty upload")
+    source = iter_decompressed(body, max_output=settings.max_decompressed_size)
+    prefilter = _prefilter_for(options)
+    return await _run_analysis(
+        iter_vcf(source, prefilter=prefilter), options, _with_gz_suffix(file_name, head), lambda: body.size, client_ip, db, prefilter,
+    )
+
+
+async def _analyze_spooled(
+    upload_file: UploadFile,
+    options: AnalysisOptions,
+    file_name: str,
+    client_ip: str,
+    db: AsyncSession,
+) -> Response:
+    """Analyze a complete, spooled (compressed) VCF, read back in chunks"""
+    vcf_size = upload_file.size or 0
+    if vcf_size > settings.max_upload_size:
+        raise _upload_too_large(vcf_size, client_ip)
+    if not vcf_size:
+        raise HTTPException(status_code=422, detail="Empty upload")
+    await upload_file.seek(0)
+    head = await upload_file.read(len(GZIP_MAGIC))
+
+    cache_key = await run_in_threadpool(spooled_digest, upload_file, UPLOAD_CHUNK_SIZE) if _analysis_cache is not None else None
+    prefilter = _prefilter_for(options)
+    source = iter_decompressed(iter_spooled(upload_file, UPLOAD_CHUNK_SIZE), max_output=settings.max_decompressed_size)
+    return await _run_analysis(
+        iter_vcf(source, prefilter=prefilter), options, _with_gz_suffix(file_name, head), vcf_size, client_ip, db, prefilter, cache_key,
+    )
+
+
+@router.post("/analyze/cohort", response_model=CohortReportOut, dependencies=[Depends(rate_limit_dependency)])
+async def analyze_vcf_cohort(
+    request: AnalysisRequest,
+    http_request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Analyze a multi-sample (joint-called) VCF and generate one report per sample.
+
+    ``patient_id`` labels the cohort upload; each report's patient ID is the
+    sample name from the ``#CHROM`` line (characters outside
+    ``[A-Za-z0-9_-]`` replaced by ``_``). The file is parsed once into a
+    packed genotype matrix and all samples are evaluated in a single pass.
+    """
+    client_ip = http_request.client.host if http_request.client else "unknown"
+
+    vcf_size = _utf8_size(request.vcf_content)
+    if vcf_size > settings.max_upload_size:
+        raise _upload_too_large(vcf_size, client_ip)
+
+    cache_key = ("cohort", content_hash(request.vcf_content)) if _analysis_cache is not None else None
+    parsed = _analysis_cache.get_parsed(cache_key) if cache_key is not None else None
+    if parsed is None:
+        try:
+            parsed = await run_in_threadpool(_parse_content, request.vcf_content, True)
+        except Exception as e:
+            logger.error(f"VCF parsing error from {client_ip}: {e}")
+            raise HTTPException(status_code=422, detail=f"Invalid VCF format: {str(e)}")
+        if cache_key is not None:
+            _analysis_cache.put_parsed(cache_key, parsed)
+
+    variants = parsed["variants"]
+    if len(variants) == 0:
+        raise HTTPException(status_code=422, detail="No variants found in VCF file")
+    if len(variants) > MAX_VARIANTS:
+        raise HTTPException(status_code=422, detail="Too many variants. Maximum 100,000 variants allowed.")
+    if not parsed["samples"]:
+        raise HTTPException(status_code=422, detail="VCF has no sample columns")
+
+    patient_ids = [_INVALID_PATIENT_ID_CHARS.sub("_", sample)[:50] or f"SAMPLE_{i + 1}" for i, sample in enumerate(parsed["samples"])]
+    logger.info(
+        f"Cohort analysis request from {client_ip} for cohort {sanitize_patient_id(request.patient_id)} "
+        f"({len(patient_ids)} samples) with drugs: {', '.join(request.drugs)}"
+    )
+    reports = await run_in_threadpool(analyze_cohort, parsed, request.drugs, patient_ids, request.genome_build)
+    bodies = [report.to_json() for report in reports]
+
+    try:
+        await _save(db, request.patient_id, request.notes, "uploaded.vcf", vcf_size, variants, reports)
+    except HTTPException:
+        raise
     except Exception as e:
         await db.rollback()
-        logger.error(f"Database error during analysis: {e}", exc_info=True)
+        logger.error(f"Database error during cohort analysis: {e}", exc_info=True)
         raise HTTPException(
             status_code=500,
             detail="An error occurred while processing your request"
         )
 
+    logger.info(f"Cohort analysis generated {len(reports)} reports ({len(variants)} variants)")
+    return Response(content=cohort_json(bodies), media_type="application/json")
+
+
+@router.get("/reports/{report_id}", response_model=ClinicalReportOut, dependencies=[Depends(rate_limit_dependency)])
+async def get_report(
+    report_id: str,
+    user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    A previously generated report, exactly as it was returned.
+
+    Raises:
+        404: If the report does not exist
+    """
+    body = await load_report(db, report_id)
+    if body is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    logger.info(f"Report {report_id} read by {user['user_id']}")
+    return Response(content=body, media_type="application/json")
+
+
+@router.get("/reports/{report_id}/variants", dependencies=[Depends(rate_limit_dependency)])
+async def report_variants(
+    report_id: str,
+    chrom: Optional[str] = None,
+    start: int = Query(0, ge=0),
+    end: Optional[int] = Query(None, ge=0),
+    rs_id: List[str] = Query([]),
+    limit: int = Query(1000, ge=1, le=MAX_VARIANT_QUERY_ROWS),
+    user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Variants of the upload behind a report, read from its variant blob.
+
+    Query either a region (``chrom`` with optional ``start``/``end``, 1-based
+    and inclusive) or a set of IDs (``rs_id``, repeatable); only the blob's
+    row groups that can contain matches are decompressed.
+
+    Raises:
+        404: If the report does not exist or its upload has no variant blob
+            (blobs are only written with ``variant_storage`` "blob" or "both")
+        422: If neither ``chrom`` nor ``rs_id`` is given
+    """
+    if chrom is None and not rs_id:
+        raise HTTPException(status_code=422, detail="Provide chrom (with optional start/end) or rs_id")
+
+    result = await db.execute(
+        select(VariantBlob.data)
+        .join(GeneratedReport, GeneratedReport.upload_id == VariantBlob.upload_id)
+        .where(GeneratedReport.report_id == report_id)
+    )
+    blob = result.scalar_one_or_none()
+    if blob is None:
+        raise HTTPException(status_code=404, detail="No stored variants for this report")
+
+    def query() -> Dict[str, Any]:
+        reader = VariantBlobReader(blob)
+        if chrom is not None:
+            found = reader.region(chrom, start, end if end is not None else 2 ** 63 - 1)
+            if rs_id:
+                wanted = set(rs_id)
+                found = [v for v in found if v["id"] in wanted]
+        else:
+            found = reader.rs_ids(rs_id)
+        return {
+            "reportId": report_id,
+            "totalVariants": len(reader),
+            "matched": len(found),
+            "variants": found[:limit],
+        }
+
+    logger.info(f"Variant query on report {report_id} by {user['user_id']}")
+    return await run_in_threadpool(query)
+
+
+@router.get("/persistence/stats", dependencies=[Depends(get_current_user)])
+async def persistence_stats():
+    """Queue depth and batch counters of write-behind persistence"""
+    if _write_behind is None:
+        return {"write_behind": False}
+    return {"write_behind": True, **_write_behind.stats()}
+
+
+@router.get("/cache/stats", dependencies=[Depends(get_current_user)])
+async def cache_stats():
+    """Hit/miss/eviction counters of the analysis result cache"""
+    if _analysis_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **_analysis_cache.stats()}
+
 
 @router.get("/health")
 async def health():
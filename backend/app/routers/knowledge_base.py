@@ -0,0 +1,59 @@
+"""Knowledge base version and reload endpoints"""
+from fastapi import APIRouter, Depends, HTTPException
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, Any
+from ..config import settings
+from ..security import get_current_user, rate_limit_dependency
+from ..services.knowledge_base import KnowledgeBaseError, get_knowledge_base, reload_knowledge_base
+import logging
+
+router = APIRouter()
+logger = logging.getLogger("pharmaguard.knowledge_base")
+
+
+@router.get("/knowledge-base", response_model=Dict[str, Any])
+async def knowledge_base_version():
+    """
+    Describe the active knowledge base snapshot
+    
+    Returns:
+        {
+            "version": "3f1c0b9e5a7d2c44",
+            "name": "CPIC core",
+            "source": "cpic_knowledge_base.json",
+            "loaded_at": "...",
+            "drugs": 6,
+            "rules": 6,
+            "star_allele_genes": 6,
+            "genome_builds": ["GRCh38", "GRCh37"]
+        }
+    """
+    return get_knowledge_base().describe()
+
+
+@router.post(
+    "/knowledge-base/reload",
+    response_model=Dict[str, Any],
+    dependencies=[Depends(rate_limit_dependency)],
+)
+async def reload(user: dict = Depends(get_current_user)):
+    """
+    Re-read the configured knowledge base file and swap it in atomically.
+    
+    Analyses already running finish with the snapshot they started with.
+    
+    Returns:
+        The new snapshot's description plus ``previous_version``
+    
+    Raises:
+        422: If the file cannot be read or is invalid (the active snapshot is kept)
+    """
+    previous = get_knowledge_base().version
+    try:
+        kb = await run_in_threadpool(reload_knowledge_base, settings.knowledge_base_path or None)
+    except KnowledgeBaseError as e:
+        logger.error(f"Knowledge base reload failed: {e}")
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    logger.info(f"Knowledge base reloaded by {user['user_id']}: {previous} -> {kb.version}")
+    return {**kb.describe(), "previous_version": previous}
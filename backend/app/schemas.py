@@ -5,11 +5,12 @@ import re
 import bleach
 
 
-class AnalysisRequest(BaseModel):
+class AnalysisOptions(BaseModel):
+    """Analysis parameters shared by the JSON and file upload endpoints"""
     patient_id: str = Field(..., min_length=1, max_length=50)
-    vcf_content: str = Field(..., min_length=10, max_length=5_000_000)  # 5MB limit
     drugs: List[str] = Field(..., min_items=1, max_items=10, description="List of drugs to analyze (1-10 drugs)")
     notes: Optional[str] = Field(None, max_length=500)
+    genome_build: Optional[str] = Field(None, description="Reference build of the VCF positions (GRCh38 or GRCh37); any build if omitted")
     
     @validator('patient_id')
     def validate_patient_id(cls, v):
@@ -18,22 +19,15 @@ class AnalysisRequest(BaseModel):
             raise ValueError('Patient ID must contain only letters, numbers, hyphens, and underscores')
         return v
     
-    @validator('vcf_content')
-    def validate_vcf_format(cls, v):
-        # Check if it starts with VCF header
-        if not v.strip().startswith('##fileformat=VCF'):
-            raise ValueError('Invalid VCF format: must start with ##fileformat=VCF')
-        
-        # Check for minimum required lines
-        lines = v.strip().split('\n')
-        if len(lines) < 2:
-            raise ValueError('Invalid VCF format: file too short')
-        
-        # Check for column header
-        has_header = any(line.startswith('#CHROM') for line in lines)
-        if not has_header:
-            raise ValueError('Invalid VCF format: missing #CHROM header line')
+    @validator('genome_build')
+    def validate_genome_build(cls, v):
+        if v is None:
+            return v
+        from .services.knowledge_base import get_knowledge_base
         
+        builds = get_knowledge_base().gene_loci
+        if v not in builds:
+            raise ValueError(f'Unsupported reference build: {v}. Supported: {", ".join(builds)}')
         return v
     
     @validator('notes')
@@ -71,6 +65,18 @@ class AnalysisRequest(BaseModel):
         return normalized_drugs
 
 
+class AnalysisRequest(AnalysisOptions):
+    vcf_content: str = Field(..., min_length=10, max_length=5_000_000)  # 5MB limit
+    
+    @validator('vcf_content')
+    def validate_vcf_format(cls, v):
+        # Only the cheap prefix check happens here; the parser validates the
+        # rest of the header (#CHROM line) while it reads the file once
+        if not re.match(r'\s*##fileformat=VCF', v):
+            raise ValueError('Invalid VCF format: must start with ##fileformat=VCF')
+        return v
+
+
 class VariantOut(BaseModel):
     chrom: str
     pos: int
@@ -134,6 +140,7 @@ class ClinicalReportOut(BaseModel):
     report_id: str
     patient_id: str
     generated_at: datetime
+    rule_set_version: Optional[str] = None  # Knowledge base version the report was computed with
     selected_drugs: List[str]  # New: List of drugs that were analyzed
     summary: ReportSummary
     recommendations: List[DrugRecommendationOut]
@@ -149,6 +156,10 @@ class ClinicalReportOut(BaseModel):
         by_alias = True
 
 
+class CohortReportOut(BaseModel):
+    reports: List[ClinicalReportOut]
+
+
 class AnalysisHistoryOut(BaseModel):
     id: str
     patient_id: str
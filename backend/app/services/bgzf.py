@@ -0,0 +1,93 @@
+"""Gzip/BGZF decompression helpers for compressed VCF uploads"""
+from typing import Iterable, Iterator, Optional
+import zlib
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+# zlib window flag selecting the gzip container format
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+# Upper bound on the output produced per decompress() call, so a small but
+# highly compressed chunk never inflates into one huge buffer
+OUTPUT_CHUNK_SIZE = 256 * 1024
+
+
+class DecompressionLimitError(ValueError):
+    """Raised when decompressed output exceeds the configured limit"""
+
+
+def is_gzip(data: bytes) -> bool:
+    """Check whether a buffer starts with the gzip magic bytes (BGZF included)"""
+    return data[:2] == GZIP_MAGIC
+
+
+def iter_decompressed(chunks: Iterable[bytes], max_output: Optional[int] = None) -> Iterator[bytes]:
+    """
+    Incrementally decompress a stream of byte chunks.
+
+    Gzip input is detected from its magic bytes and inflated member by member,
+    which covers BGZF (a series of concatenated gzip members). Anything else is
+    passed through unchanged. Output is produced in bounded pieces.
+
+    Args:
+        chunks: Raw (possibly compressed) byte chunks
+        max_output: Optional limit on the number of decompressed bytes
+
+    Raises:
+        DecompressionLimitError: If more than ``max_output`` bytes are produced
+        ValueError: If the gzip stream is corrupt or truncated
+    """
+    produced = 0
+    head = b""
+    decompressor = None
+    member_started = False
+    passthrough = False
+
+    def _emit(data: bytes) -> bytes:
+        nonlocal produced
+        produced += len(data)
+        if max_output is not None and produced > max_output:
+            raise DecompressionLimitError(
+                f"Decompressed VCF exceeds maximum allowed size of {max_output} bytes"
+            )
+        return data
+
+    for chunk in chunks:
+        if not chunk:
+            continue
+        if decompressor is None and not passthrough:
+            # Wait for enough bytes to sniff the format
+            head += chunk
+            if len(head) < len(GZIP_MAGIC):
+                continue
+            chunk, head = head, b""
+            if is_gzip(chunk):
+                decompressor = zlib.decompressobj(GZIP_WBITS)
+            else:
+                passthrough = True
+
+        if passthrough:
+            yield _emit(chunk)
+            continue
+
+        while chunk:
+            member_started = True
+            try:
+                data = decompressor.decompress(chunk, OUTPUT_CHUNK_SIZE)
+            except zlib.error as e:
+                raise ValueError(f"Corrupt gzip/BGZF stream: {e}")
+            if data:
+                yield _emit(data)
+            if decompressor.eof:
+                # End of a gzip member; BGZF continues with the next block
+                chunk = decompressor.unused_data
+                decompressor = zlib.decompressobj(GZIP_WBITS)
+                member_started = False
+            else:
+                chunk = decompressor.unconsumed_tail
+
+    if head:
+        yield _emit(head)
+    if decompressor is not None and member_started:
+        if not decompressor.eof:
+            raise ValueError("Truncated gzip/BGZF stream")
@@ -0,0 +1,79 @@
+"""Multi-gene drug decision tables compiled to dense lookup arrays"""
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+
+class DecisionTable:
+    """
+    Recommendation for one drug from the combined phenotypes of several genes.
+
+    Every gene's phenotypes (from its star-allele definition) get a code
+    0..n-1 and code n stands for "no call". The rows are expanded into a
+    flat array with one cell per combination of codes, holding the index of
+    the first row that covers it (or -1), so evaluating the table is one
+    phenotype -> code lookup per gene plus a single array index, however
+    many rows it has.
+
+    ``definition`` (see ``knowledge_base``):
+    - drug, genes, guideline, evidence
+    - rows: [{phenotypes: {gene: phenotype or [phenotypes]}, risk_category,
+      risk_level, recommendation, dosage_guidance, alternatives}]; a gene
+      missing from ``phenotypes`` matches any phenotype, including no call
+
+    ``phenotypes`` maps each gene to its phenotype names.
+
+    Raises:
+        ValueError: If a row names an unknown gene or phenotype
+    """
+
+    def __init__(self, definition: Mapping[str, Any], phenotypes: Mapping[str, Sequence[str]]):
+        self.drug: str = definition["drug"].upper()
+        self.genes: Tuple[str, ...] = tuple(definition["genes"])
+        self.guideline: str = definition["guideline"]
+        self.evidence: str = definition["evidence"]
+        missing = [gene for gene in self.genes if gene not in phenotypes]
+        if missing:
+            raise ValueError(f"Decision table for {self.drug} uses genes without star-allele definitions: {', '.join(missing)}")
+
+        self.codes: List[Dict[str, int]] = [
+            {phenotype: code for code, phenotype in enumerate(phenotypes[gene])} for gene in self.genes
+        ]
+        dims = [len(codes) + 1 for codes in self.codes]
+        self.strides: List[int] = []
+        size = 1
+        for dim in reversed(dims):
+            self.strides.insert(0, size)
+            size *= dim
+        self.rows: List[Mapping[str, Any]] = list(definition["rows"])
+        self.cells: List[int] = [-1] * size
+        for row_index, row in enumerate(self.rows):
+            for cell in self._cells(row, dims):
+                if self.cells[cell] == -1:
+                    self.cells[cell] = row_index
+
+    def _cells(self, row: Mapping[str, Any], dims: List[int]) -> List[int]:
+        """Flat indexes of every code combination ``row`` covers"""
+        wanted = row.get("phenotypes", {})
+        unknown = set(wanted) - set(self.genes)
+        if unknown:
+            raise ValueError(f"Decision table for {self.drug} has a row for unknown genes: {', '.join(sorted(unknown))}")
+        cells = [0]
+        for gene, codes, dim, stride in zip(self.genes, self.codes, dims, self.strides):
+            names = wanted.get(gene)
+            if names is None:
+                allowed = range(dim)
+            else:
+                names = [names] if isinstance(names, str) else names
+                bad = [name for name in names if name not in codes]
+                if bad:
+                    raise ValueError(f"Decision table for {self.drug}: unknown {gene} phenotype {', '.join(bad)}")
+                allowed = [codes[name] for name in names]
+            cells = [cell + code * stride for cell in cells for code in allowed]
+        return cells
+
+    def lookup(self, phenotypes: Sequence[Optional[str]]) -> Optional[Mapping[str, Any]]:
+        """Row for the genes' phenotypes (in ``genes`` order, None: no call), or None if no row covers them"""
+        index = 0
+        for codes, stride, phenotype in zip(self.codes, self.strides, phenotypes):
+            index += codes.get(phenotype, len(codes)) * stride
+        row = self.cells[index]
+        return self.rows[row] if row >= 0 else None
@@ -1,69 +1,29 @@
 """Drug service for managing supported drugs and drug-gene mappings"""
 from typing import List, Dict, Any, Optional
+from .knowledge_base import get_knowledge_base
 
-# Supported drugs with their metadata
-SUPPORTED_DRUGS = [
-    {
-        "drug": "CODEINE",
-        "primary_gene": "CYP2D6",
-        "description": "Pain relief opioid",
-        "category": "Analgesic"
-    },
-    {
-        "drug": "WARFARIN",
-        "primary_gene": "CYP2C9",
-        "description": "Blood thinner anticoagulant",
-        "category": "Anticoagulant"
-    },
-    {
-        "drug": "CLOPIDOGREL",
-        "primary_gene": "CYP2C19",
-        "description": "Antiplatelet therapy",
-        "category": "Antiplatelet"
-    },
-    {
-        "drug": "SIMVASTATIN",
-        "primary_gene": "SLCO1B1",
-        "description": "Cholesterol statin",
-        "category": "Statin"
-    },
-    {
-        "drug": "AZATHIOPRINE",
-        "primary_gene": "TPMT",
-        "description": "Immunosuppressant",
-        "category": "Immunosuppressant"
-    },
-    {
-        "drug": "FLUOROURACIL",
-        "primary_gene": "DPYD",
-        "description": "Chemotherapy",
-        "category": "Chemotherapy"
-    }
-]
-
-# Create lookup dictionaries for fast access
-DRUG_TO_GENE_MAP = {drug["drug"]: drug["primary_gene"] for drug in SUPPORTED_DRUGS}
-DRUG_METADATA = {drug["drug"]: drug for drug in SUPPORTED_DRUGS}
+# Drug metadata is part of the knowledge base (see ``knowledge_base``)
 
 
 def get_supported_drugs() -> List[Dict[str, str]]:
     """Get list of all supported drugs with metadata"""
-    return SUPPORTED_DRUGS
+    return [dict(drug) for drug in get_knowledge_base().drugs]
 
 
 def is_drug_supported(drug_name: str) -> bool:
     """Check if a drug is supported"""
-    return drug_name.upper() in DRUG_TO_GENE_MAP
+    return drug_name.upper() in get_knowledge_base().drug_gene_map
 
 
 def get_primary_gene(drug_name: str) -> Optional[str]:
     """Get the primary gene for a drug"""
-    return DRUG_TO_GENE_MAP.get(drug_name.upper())
+    return get_knowledge_base().drug_gene_map.get(drug_name.upper())
 
 
 def get_drug_metadata(drug_name: str) -> Optional[Dict[str, str]]:
     """Get full metadata for a drug"""
-    return DRUG_METADATA.get(drug_name.upper())
+    metadata = get_knowledge_base().drug_metadata.get(drug_name.upper())
+    return dict(metadata) if metadata is not None else None
 
 
 def validate_drugs(drugs: List[str]) -> tuple[bool, List[str], List[str]]:
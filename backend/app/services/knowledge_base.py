@@ -0,0 +1,234 @@
+"""
+Versioned, hot-reloadable CPIC knowledge base.
+
+Drug metadata, gene loci, CPIC rules and star-allele definitions live in a
+JSON file (``app/data/cpic_knowledge_base.json`` unless configured
+otherwise). It is compiled into an immutable ``KnowledgeBase`` snapshot whose
+``version`` is a hash of the file's content. ``reload_knowledge_base``
+compiles a new snapshot completely before swapping it in with one reference
+assignment, so an analysis that picked up a snapshot keeps using it even if a
+reload happens half way through, and a broken file never replaces a working
+one.
+
+File layout:
+- ``drugs``: [{drug, primary_gene, description, category}]
+- ``gene_loci``: {build: {gene: [chrom, start, end]}} (1-based, inclusive)
+- ``rules``: CPIC rules, each keyed by ``rs_id`` and, per build, by the exact
+  variant ``loci`` {build: [chrom, pos, ref, alt]} on the forward strand
+  (``risk_allele`` is on the gene strand)
+- ``star_alleles``: {gene: {variants: {rsID: {build: [chrom, pos, ref, alt]}},
+  alleles: [{name, variants, activity}], phenotypes: [{max_activity,
+  phenotype}]}} (``max_activity`` null: no upper bound)
+- ``decision_tables``: multi-gene recommendations [{drug, genes, guideline,
+  evidence, rows: [{phenotypes: {gene: phenotype(s)}, risk_category,
+  risk_level, recommendation, dosage_guidance, alternatives}]}] over the
+  star-allele phenotypes of ``genes`` (see ``decision_tables``)
+"""
+from datetime import datetime
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from .decision_tables import DecisionTable
+from .star_alleles import StarAlleleIndex
+
+logger = logging.getLogger("pharmaguard.knowledge_base")
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "cpic_knowledge_base.json")
+
+RULE_FIELDS = (
+    "gene", "rs_id", "drug", "phenotype", "risk_category", "risk_level", "recommendation",
+    "dosage_guidance", "guideline", "evidence", "alternatives",
+)
+
+TABLE_ROW_FIELDS = ("risk_category", "risk_level", "recommendation", "dosage_guidance", "alternatives")
+
+
+class KnowledgeBaseError(ValueError):
+    """The knowledge base file cannot be read or is invalid"""
+
+
+def _freeze_rule(rule: Mapping[str, Any], drugs: Mapping[str, Any], builds: Mapping[str, Any]) -> Mapping[str, Any]:
+    missing = [field for field in RULE_FIELDS if field not in rule]
+    if missing:
+        raise KnowledgeBaseError(f"Rule {rule.get('rs_id', '?')} is missing {', '.join(missing)}")
+    if rule["drug"].upper() not in drugs:
+        raise KnowledgeBaseError(f"Rule {rule['rs_id']} is for unknown drug {rule['drug']}")
+    loci = {}
+    for build, (chrom, pos, ref, alt) in rule.get("loci", {}).items():
+        if build not in builds:
+            raise KnowledgeBaseError(f"Rule {rule['rs_id']} has a locus on unknown build {build}")
+        loci[build] = (str(chrom), int(pos), ref, alt)
+    frozen = dict(rule)
+    frozen["loci"] = MappingProxyType(loci)
+    frozen["alternatives"] = tuple(rule["alternatives"])
+    return MappingProxyType(frozen)
+
+
+def _freeze_table_row(row: Mapping[str, Any], drug: str) -> Mapping[str, Any]:
+    missing = [field for field in TABLE_ROW_FIELDS if field not in row]
+    if missing:
+        raise KnowledgeBaseError(f"Decision table row for {drug} is missing {', '.join(missing)}")
+    frozen = dict(row)
+    frozen["alternatives"] = tuple(row["alternatives"])
+    return MappingProxyType(frozen)
+
+
+def _star_definition(definition: Mapping[str, Any]) -> Dict[str, Any]:
+    """JSON star-allele definition -> the tuple layout ``StarAlleleCaller`` takes"""
+    return {
+        "variants": {
+            rs_id: {build: (str(chrom), int(pos), ref, alt) for build, (chrom, pos, ref, alt) in loci.items()}
+            for rs_id, loci in definition["variants"].items()
+        },
+        "alleles": [(allele["name"], tuple(allele["variants"]), float(allele["activity"])) for allele in definition["alleles"]],
+        "phenotypes": [
+            (float("inf") if row["max_activity"] is None else float(row["max_activity"]), row["phenotype"])
+            for row in definition["phenotypes"]
+        ],
+    }
+
+
+class KnowledgeBase:
+    """
+    Immutable compiled snapshot of a knowledge base file.
+
+    Besides the data itself it holds the lookup structures built from it
+    (``rules_by_drug``, ``star_index``, ``decision_tables``). ``plans`` caches the
+    ``pgx_engine.AnalysisPlan`` compiled against this snapshot per drug
+    selection; it is derived state and dies with the snapshot.
+    """
+
+    def __init__(self, data: Mapping[str, Any], version: str, source: str):
+        self.version = version
+        self.source = source
+        self.name: str = data.get("name", "")
+        self.loaded_at = datetime.utcnow()
+
+        self.drugs: Tuple[Mapping[str, str], ...] = tuple(
+            MappingProxyType({**drug, "drug": drug["drug"].upper()}) for drug in data["drugs"]
+        )
+        self.drug_metadata: Mapping[str, Mapping[str, str]] = MappingProxyType({drug["drug"]: drug for drug in self.drugs})
+        self.drug_gene_map: Mapping[str, str] = MappingProxyType({drug["drug"]: drug["primary_gene"] for drug in self.drugs})
+
+        self.gene_loci: Mapping[str, Mapping[str, Tuple[str, int, int]]] = MappingProxyType({
+            build: MappingProxyType({gene: (str(chrom), int(start), int(end)) for gene, (chrom, start, end) in genes.items()})
+            for build, genes in data["gene_loci"].items()
+        })
+
+        self.rules: Tuple[Mapping[str, Any], ...] = tuple(
+            _freeze_rule(rule, self.drug_metadata, self.gene_loci) for rule in data["rules"]
+        )
+        rules_by_drug: Dict[str, List[int]] = {}
+        for i, rule in enumerate(self.rules):
+            rules_by_drug.setdefault(rule["drug"].upper(), []).append(i)
+        self.rules_by_drug: Mapping[str, Tuple[int, ...]] = MappingProxyType(
+            {drug: tuple(positions) for drug, positions in rules_by_drug.items()}
+        )
+
+        self.star_index = StarAlleleIndex(
+            {gene: _star_definition(definition) for gene, definition in data.get("star_alleles", {}).items()}
+        )
+
+        phenotypes = {
+            gene: list(dict.fromkeys(name for _, name in caller.phenotypes))
+            for gene, caller in self.star_index.callers.items()
+        }
+        decision_tables: Dict[str, DecisionTable] = {}
+        for definition in data.get("decision_tables", []):
+            drug = definition["drug"].upper()
+            if drug not in self.drug_metadata:
+                raise KnowledgeBaseError(f"Decision table for unknown drug {definition['drug']}")
+            if drug in decision_tables:
+                raise KnowledgeBaseError(f"Several decision tables for {drug}")
+            rows = [_freeze_table_row(row, drug) for row in definition["rows"]]
+            decision_tables[drug] = DecisionTable({**definition, "rows": rows}, phenotypes)
+        self.decision_tables: Mapping[str, DecisionTable] = MappingProxyType(decision_tables)
+        self.plans: Dict[Any, Any] = {}
+
+    def rule_positions(self, selected_drugs: List[str]) -> List[int]:
+        """Positions in ``rules`` of the rules for the selected (uppercase) drugs, in rule order"""
+        return sorted(i for drug in set(selected_drugs) for i in self.rules_by_drug.get(drug, ()))
+
+    def describe(self) -> Dict[str, Any]:
+        """Summary for status endpoints and logs"""
+        return {
+            "version": self.version,
+            "name": self.name,
+            "source": os.path.basename(self.source),
+            "loaded_at": self.loaded_at.isoformat(),
+            "drugs": len(self.drugs),
+            "rules": len(self.rules),
+            "star_allele_genes": len(self.star_index.callers),
+            "decision_tables": len(self.decision_tables),
+            "genome_builds": list(self.gene_loci),
+        }
+
+
+def content_version(data: Any) -> str:
+    """Version hash of knowledge base content (insensitive to formatting and key order)"""
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def load_knowledge_base(path: Optional[str] = None) -> KnowledgeBase:
+    """
+    Read and compile a knowledge base file (the bundled one by default).
+
+    Raises:
+        KnowledgeBaseError: If the file cannot be read or is invalid
+    """
+    path = path or DEFAULT_PATH
+    try:
+        with open(path, "rb") as f:
+            data = json.loads(f.read())
+    except (OSError, ValueError) as e:
+        raise KnowledgeBaseError(f"Cannot load knowledge base {os.path.basename(path)}: {e}") from e
+    try:
+        return KnowledgeBase(data, content_version(data), path)
+    except KnowledgeBaseError:
+        raise
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        raise KnowledgeBaseError(f"Invalid knowledge base {os.path.basename(path)}: {e!r}") from e
+
+
+_lock = threading.Lock()
+_current: Optional[KnowledgeBase] = None
+
+
+def get_knowledge_base() -> KnowledgeBase:
+    """The active snapshot (the bundled file is loaded on first use)"""
+    global _current
+    kb = _current
+    if kb is None:
+        with _lock:
+            if _current is None:
+                _current = load_knowledge_base()
+            kb = _current
+    return kb
+
+
+def reload_knowledge_base(path: Optional[str] = None) -> KnowledgeBase:
+    """
+    Compile ``path`` (default: the active snapshot's file) and make it active.
+
+    Only affects this process; with several server workers each one must be
+    reloaded.
+
+    Raises:
+        KnowledgeBaseError: If the file cannot be read or is invalid; the
+            active snapshot is kept
+    """
+    global _current
+    if path is None and _current is not None:
+        path = _current.source
+    kb = load_knowledge_base(path)
+    with _lock:
+        previous, _current = _current, kb
+    if previous is None or previous.version != kb.version:
+        logger.info(f"Knowledge base {kb.version} active ({len(kb.rules)} rules, {len(kb.drugs)} drugs)")
+    return kb
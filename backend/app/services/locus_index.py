@@ -0,0 +1,56 @@
+"""Sorted per-chromosome position index with bisect lookups"""
+from array import array
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Tuple
+
+from .tabix import normalize_chrom
+
+# (chrom, pos, ref, alt, value)
+LocusEntry = Tuple[str, int, str, str, Any]
+
+
+class LocusIndex:
+    """
+    Immutable exact (chrom, pos, ref, alt) -> values lookup.
+
+    Entries are kept per chromosome in a sorted ``array`` of positions with a
+    parallel list of (ref, alt, value), so a lookup is one dict access plus a
+    binary search however many loci are indexed. Chromosome names are
+    compared without a 'chr' prefix; a multi-allelic ALT ('T,G') matches an
+    entry for any of its alleles, and the lookup reports which one.
+    """
+
+    def __init__(self, entries: Iterable[LocusEntry] = ()):
+        self._positions: Dict[str, array] = {}
+        self._entries: Dict[str, List[Tuple[str, str, Any]]] = {}
+        normalized = sorted(
+            ((normalize_chrom(chrom), pos, ref.upper(), alt.upper(), value) for chrom, pos, ref, alt, value in entries),
+            key=lambda entry: (entry[0], entry[1]),
+        )
+        for chrom, pos, ref, alt, value in normalized:
+            self._positions.setdefault(chrom, array("q")).append(pos)
+            self._entries.setdefault(chrom, []).append((ref, alt, value))
+        self._size = len(normalized)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def lookup(self, chrom: str, pos: int, ref: str, alt: str) -> List[Tuple[int, Any]]:
+        """(ALT allele index, from 1, value) of each entry whose locus matches the variant exactly"""
+        key = normalize_chrom(chrom)
+        positions = self._positions.get(key)
+        if positions is None:
+            return []
+        i = bisect_left(positions, pos)
+        if i == len(positions) or positions[i] != pos:
+            return []
+        entries = self._entries[key]
+        ref = ref.upper()
+        alts = alt.upper().split(",")
+        found: List[Tuple[int, Any]] = []
+        while i < len(positions) and positions[i] == pos:
+            entry_ref, entry_alt, value = entries[i]
+            if entry_ref == ref and entry_alt in alts:
+                found.append((alts.index(entry_alt) + 1, value))
+            i += 1
+        return found
@@ -1,7 +1,14 @@
 """CPIC-style Pharmacogenomic Analysis Engine"""
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterable, List, Mapping, Optional, Tuple, Union
 from datetime import datetime
-import time
+from .variant_table import CARRIER_TABLE, GT_HET, GT_HOM_ALT, GT_HOM_REF, GT_MISSING, SampleVariantRow, allele_gt_codes, decode_gt
+from .decision_tables import DecisionTable
+from .knowledge_base import KnowledgeBase, get_knowledge_base
+from .locus_index import LocusIndex
+from .report_ids import new_report_id
+from .report_model import ClinicalReport, DrugRecommendation, ReportSummary, VariantPreview
+from .tabix import normalize_chrom
+from .vcf_parser import LinePrefilter
 
 # Risk assessment categories
 RISK_CATEGORIES = {
@@ -12,87 +19,264 @@ RISK_CATEGORIES = {
     "unknown": "Unknown - No genetic variant detected"
 }
 
-# Drug-to-gene mapping for all supported drugs
-DRUG_GENE_MAP = {
-    "CODEINE": "CYP2D6",
-    "WARFARIN": "CYP2C9",
-    "CLOPIDOGREL": "CYP2C19",
-    "SIMVASTATIN": "SLCO1B1",
-    "AZATHIOPRINE": "TPMT",
-    "FLUOROURACIL": "DPYD"
-}
+# Padding added around each gene so promoter/upstream variants are included
+LOCUS_FLANK = 5000
+
+# Number of variants echoed back in a report
+PREVIEW_VARIANTS = 50
+
+# Drug metadata, gene loci, CPIC rules, star-allele definitions and
+# multi-gene decision tables come from the knowledge base snapshot (see
+# ``knowledge_base``)
+
+
+def _check_build(kb: KnowledgeBase, build: Optional[str]) -> None:
+    if build is not None and build not in kb.gene_loci:
+        raise ValueError(f"Unsupported reference build: {build}. Supported: {', '.join(kb.gene_loci)}")
+
+
+def regions_for_drugs(selected_drugs: List[str], build: str = "GRCh38", flank: int = LOCUS_FLANK) -> List[Tuple[str, int, int]]:
+    """
+    Genomic regions (chrom, start, end) that must be read to analyze the given drugs.
+    
+    Raises:
+        ValueError: If the reference build is not supported
+    """
+    kb = get_knowledge_base()
+    _check_build(kb, build)
+    loci = kb.gene_loci[build]
+    selected = [drug.upper() for drug in selected_drugs]
+    genes = {kb.drug_gene_map[drug] for drug in selected if drug in kb.drug_gene_map}
+    genes.update(kb.rules[i]["gene"] for i in kb.rule_positions(selected))
+    genes.update(gene for drug in selected if drug in kb.decision_tables for gene in kb.decision_tables[drug].genes)
+    return sorted(
+        (loci[gene][0], max(loci[gene][1] - flank, 1), loci[gene][2] + flank)
+        for gene in genes if gene in loci
+    )
+
+
+def _genes_for_drugs(kb: KnowledgeBase, selected_drugs: Iterable[str]) -> List[str]:
+    """Genes with a star-allele caller that the selected drugs (or their decision tables) depend on"""
+    genes = set()
+    for drug in selected_drugs:
+        if drug in kb.drug_gene_map:
+            genes.add(kb.drug_gene_map[drug])
+        if drug in kb.decision_tables:
+            genes.update(kb.decision_tables[drug].genes)
+    return sorted(gene for gene in genes if gene in kb.star_index.callers)
+
+
+def _prefilter_targets(
+    kb: KnowledgeBase,
+    rules: Iterable[Mapping[str, Any]],
+    build: Optional[str] = None,
+    genes: Iterable[str] = (),
+) -> Tuple[set, Dict[str, List[Tuple[int, int]]]]:
+    """rsIDs and positions (of ``build``, or every build) that can trigger ``rules`` or define star alleles of ``genes``"""
+    rs_ids, intervals = kb.star_index.targets(genes, build)
+    for rule in rules:
+        rs_ids.add(rule["rs_id"])
+        for locus_build, (chrom, pos, _ref, _alt) in rule.get("loci", {}).items():
+            if build is None or locus_build == build:
+                intervals.setdefault(chrom, []).append((pos, pos))
+    return rs_ids, intervals
+
+
+def build_prefilter(selected_drugs: List[str], passthrough: int = 0, genome_build: Optional[str] = None) -> LinePrefilter:
+    """
+    Compile a parser pre-filter for the rules of the selected drugs.
+
+    Pass it to ``iter_vcf(..., prefilter=...)`` and hand it to
+    ``analyze_variants`` as ``parsed_vcf["prefilter"]``: the engine narrows it
+    as rules are satisfied and adds its skipped-line count to
+    ``total_variants``, so reports are identical to an unfiltered run.
+    ``passthrough`` lines at the start are always parsed (e.g. for the
+    report preview and stored variants).
+    """
+    rs_ids, intervals = compile_plan(selected_drugs, genome_build).prefilter_targets()
+    return LinePrefilter(rs_ids, intervals, passthrough=max(passthrough, PREVIEW_VARIANTS))
+
+
+# Kinds of AnalysisPlan hits: (RULE_HIT, active rule index, 0) or (STAR_HIT, gene, bit)
+RULE_HIT = 0
+STAR_HIT = 1
+
+
+class AnalysisPlan:
+    """
+    Matching state for one drug selection and genome build, compiled once.
+
+    The active rules and the star-allele defining variants of the selected
+    genes share one rsID map and one ``LocusIndex``, so each variant costs a
+    single lookup however many rules and genes are active. Plans are
+    immutable and cached on their knowledge base snapshot by
+    ``compile_plan``: analyzing many patients for the same drugs compiles
+    nothing after the first one, and a reload starts from an empty cache.
+    """
+
+    def __init__(self, kb: KnowledgeBase, selected_drugs: Iterable[str], genome_build: Optional[str] = None):
+        _check_build(kb, genome_build)
+        self.kb = kb
+        self.selected_drugs = tuple(drug.upper() for drug in selected_drugs)
+        self.genome_build = genome_build
+        self.active_rules = [kb.rules[i] for i in kb.rule_positions(list(self.selected_drugs))]
+        # Drug -> indexes of its active rules, drugs in the order of their first rule
+        self.rules_by_drug: Dict[str, List[int]] = {}
+        for idx, rule in enumerate(self.active_rules):
+            self.rules_by_drug.setdefault(rule["drug"].upper(), []).append(idx)
+        self.genes = _genes_for_drugs(kb, self.selected_drugs)
+        self.tables = [kb.decision_tables[drug] for drug in self.selected_drugs if drug in kb.decision_tables]
+
+        self.by_rs_id: Dict[str, List[Tuple[int, Any, int]]] = {}
+        # ALT alleles an rsID is defined by, to tell which allele of a multi-allelic record it matched
+        self.rs_alts: Dict[str, set] = {}
+        entries: List[Tuple[str, int, str, str, Tuple[int, Any, int]]] = []
+
+        def add(rs_id: str, loci: Mapping[str, Tuple[str, int, str, str]], hit: Tuple[int, Any, int]) -> None:
+            self.by_rs_id.setdefault(rs_id, []).append(hit)
+            self.rs_alts.setdefault(rs_id, set()).update(alt.upper() for _, _, _, alt in loci.values())
+            for build, (chrom, pos, ref, alt) in loci.items():
+                if genome_build is None or build == genome_build:
+                    entries.append((chrom, pos, ref, alt, hit))
 
-CPIC_RULES = [
-    {
-        "gene": "CYP2D6", "rs_id": "rs3892097", "risk_allele": "A", "drug": "CODEINE",
-        "phenotype": "Poor Metabolizer", 
-        "risk_category": "ineffective",
-        "risk_level": "high",
-        "recommendation": "Avoid codeine. Use alternative analgesics not metabolized by CYP2D6.",
-        "dosage_guidance": "Do not use. Codeine will not be converted to morphine (active form).",
-        "guideline": "CPIC Guideline for CYP2D6 and Codeine Therapy (2019)",
-        "evidence": "Strong", 
-        "alternatives": ["Morphine", "Acetaminophen", "NSAIDs"]
-    },
-    {
-        "gene": "CYP2C19", "rs_id": "rs4244285", "risk_allele": "A", "drug": "CLOPIDOGREL",
-        "phenotype": "Poor Metabolizer", 
-        "risk_category": "ineffective",
-        "risk_level": "high",
-        "recommendation": "Use alternative antiplatelet therapy (e.g., prasugrel, ticagrelor).",
-        "dosage_guidance": "Do not use. Clopidogrel will not be activated to its therapeutic form.",
-        "guideline": "CPIC Guideline for CYP2C19 and Clopidogrel Therapy (2022)",
-        "evidence": "Strong", 
-        "alternatives": ["Prasugrel", "Ticagrelor"]
-    },
-    {
-        "gene": "SLCO1B1", "rs_id": "rs4149056", "risk_allele": "C", "drug": "SIMVASTATIN",
-        "phenotype": "Decreased Function", 
-        "risk_category": "adjust_dosage",
-        "risk_level": "moderate",
-        "recommendation": "Prescribe a lower dose or use an alternative statin.",
-        "dosage_guidance": "Reduce dose to 20mg daily (max 40mg). Monitor for muscle pain/weakness.",
-        "guideline": "CPIC Guideline for SLCO1B1 and Statin Therapy (2022)",
-        "evidence": "Strong", 
-        "alternatives": ["Pravastatin", "Rosuvastatin"]
-    },
-    {
-        "gene": "TPMT", "rs_id": "rs1800460", "risk_allele": "T", "drug": "AZATHIOPRINE",
-        "phenotype": "Intermediate Metabolizer", 
-        "risk_category": "adjust_dosage",
-        "risk_level": "moderate",
-        "recommendation": "Reduce starting dose by 30-70%. Monitor for myelosuppression.",
-        "dosage_guidance": "Start with 30-70% of standard dose (0.75-1.5 mg/kg/day). Monitor CBC weekly for 4 weeks.",
-        "guideline": "CPIC Guideline for TPMT/NUDT15 and Thiopurine Therapy (2018)",
-        "evidence": "Strong", 
-        "alternatives": ["Mycophenolate mofetil"]
-    },
-    {
-        "gene": "CYP2C9", "rs_id": "rs1799853", "risk_allele": "T", "drug": "WARFARIN",
-        "phenotype": "Intermediate Metabolizer", 
-        "risk_category": "adjust_dosage",
-        "risk_level": "moderate",
-        "recommendation": "Reduced warfarin dose required. Use pharmacogenomic-guided dosing.",
-        "dosage_guidance": "Reduce initial dose by 25-50% (start 2.5-3.75mg daily). Monitor INR closely.",
-        "guideline": "CPIC Guideline for CYP2C9/VKORC1 and Warfarin Therapy (2017)",
-        "evidence": "Strong", 
-        "alternatives": ["Direct oral anticoagulants (DOACs)"]
-    },
-    {
-        "gene": "DPYD", "rs_id": "rs3918290", "risk_allele": "A", "drug": "FLUOROURACIL",
-        "phenotype": "Poor Metabolizer", 
-        "risk_category": "toxicity",
-        "risk_level": "high",
-        "recommendation": "Avoid 5-FU and capecitabine. Risk of severe/fatal toxicity.",
-        "dosage_guidance": "Do not use. High risk of severe neutropenia, mucositis, and death.",
-        "guideline": "CPIC Guideline for DPYD and Fluoropyrimidine Therapy (2017)",
-        "evidence": "Strong", 
-        "alternatives": ["Alternative chemotherapy per oncology consult"]
-    },
-]
-
-
-def analyze_variants(parsed_vcf: Dict[str, Any], patient_id: str, selected_drugs: List[str] = None) -> Dict[str, Any]:
+        for idx, rule in enumerate(self.active_rules):
+            add(rule["rs_id"], rule.get("loci", {}), (RULE_HIT, idx, 0))
+        for gene in self.genes:
+            caller = kb.star_index.callers[gene]
+            for rs_id, bit in caller.bits.items():
+                add(rs_id, caller.loci[rs_id], (STAR_HIT, gene, bit))
+        # Lookups are exact, so the loci of every build can share one index
+        self.loci = LocusIndex(entries)
+
+        # Regions (padded like ``regions_for_drugs``) of the star-allele
+        # genes: a gene without a single record in its region is not called
+        # at all rather than called reference
+        self.regions: Dict[str, List[Tuple[int, int, str]]] = {}
+        for build, loci in kb.gene_loci.items():
+            if genome_build is not None and build != genome_build:
+                continue
+            for gene in self.genes:
+                if gene in loci:
+                    chrom, start, end = loci[gene]
+                    self.regions.setdefault(normalize_chrom(chrom), []).append(
+                        (max(start - LOCUS_FLANK, 1), end + LOCUS_FLANK, gene)
+                    )
+        self.located_genes = frozenset(gene for spans in self.regions.values() for _, _, gene in spans)
+
+    def match(self, v: Mapping[str, Any]) -> List[Tuple[int, Any, int, int]]:
+        """
+        Rule and star-allele hits of a variant (may repeat), each with the
+        index (from 1) of the ALT allele it is for. An rsID match on a
+        multi-allelic record counts only if one of its alleles is the one
+        the rsID is defined by.
+        """
+        found = self.loci.lookup(v["chrom"], v["pos"], v["ref"], v["alt"])
+        hits = [hit + (allele,) for allele, hit in found] if found else []
+        ids = self.by_rs_id.get(v["id"])
+        if ids:
+            alts = v["alt"].upper().split(",")
+            if len(alts) == 1:
+                hits.extend(hit + (1,) for hit in ids)
+            else:
+                defining = self.rs_alts[v["id"]]
+                allele = next((i for i, alt in enumerate(alts, 1) if alt in defining), None)
+                if allele is not None:
+                    hits.extend(hit + (allele,) for hit in ids)
+        return hits
+
+    def prefilter_targets(
+        self,
+        pending: Iterable[int] = None,
+        uncovered: Iterable[str] = None,
+    ) -> Tuple[set, Dict[str, List[Tuple[int, int]]]]:
+        """
+        Pre-filter targets for the star-allele genes, the ``pending``
+        (default: all) active rules and the regions of the ``uncovered``
+        (default: all) genes
+        """
+        rules = self.active_rules if pending is None else (self.active_rules[idx] for idx in pending)
+        rs_ids, intervals = _prefilter_targets(self.kb, rules, self.genome_build, self.genes)
+        uncovered = self.located_genes if uncovered is None else set(uncovered)
+        for chrom, spans in self.regions.items():
+            intervals.setdefault(chrom, []).extend((start, end) for start, end, gene in spans if gene in uncovered)
+        return rs_ids, intervals
+
+    def call(self, gene: str, het: int, hom: int) -> Optional[Dict[str, Any]]:
+        """Star-allele call for ALT bitsets of ``gene``"""
+        return self.kb.star_index.call(gene, het, hom)
+
+
+class _GeneCoverage:
+    """
+    Star-allele genes of a plan without a record in their region so far.
+
+    ``open_spans`` maps a chromosome name, as the input spells it, to the
+    region spans of its uncovered genes once ``visit`` has seen it. Callers
+    skip ``visit`` for records on a chromosome whose list is empty, so
+    coverage costs a dict lookup per record once a chromosome's genes are
+    covered (or it has none).
+    """
+
+    __slots__ = ("uncovered", "open_spans", "_regions")
+
+    def __init__(self, plan: AnalysisPlan):
+        self.uncovered = set(plan.located_genes)
+        self.open_spans: Dict[str, List[Tuple[int, int, str]]] = {}
+        self._regions = plan.regions
+
+    def visit(self, chrom: str, pos: int) -> bool:
+        """Mark the genes whose region contains the position covered; True if that covered any"""
+        spans = self.open_spans.get(chrom)
+        if spans is None:
+            spans = self.open_spans[chrom] = [
+                span for span in self._regions.get(normalize_chrom(chrom), ()) if span[2] in self.uncovered
+            ]
+        for start, end, _ in spans:
+            if start <= pos <= end:
+                break
+        else:
+            return False
+        located = {gene for start, end, gene in spans if start <= pos <= end}
+        self.uncovered -= located
+        for name, others in self.open_spans.items():
+            self.open_spans[name] = [span for span in others if span[2] not in located]
+        return True
+
+
+# Compiled plans kept per knowledge base snapshot
+MAX_CACHED_PLANS = 256
+
+
+def compile_plan(
+    selected_drugs: Iterable[str],
+    genome_build: Optional[str] = None,
+    kb: Optional[KnowledgeBase] = None,
+) -> AnalysisPlan:
+    """
+    Shared ``AnalysisPlan`` for a drug selection (order and case preserved
+    as given) and genome build, against ``kb`` (default: the active
+    knowledge base snapshot).
+
+    Raises:
+        ValueError: If the reference build is not supported
+    """
+    kb = kb or get_knowledge_base()
+    key = (tuple(drug.upper() for drug in selected_drugs), genome_build)
+    plan = kb.plans.get(key)
+    if plan is None:
+        plan = AnalysisPlan(kb, *key)
+        if len(kb.plans) >= MAX_CACHED_PLANS:
+            kb.plans.clear()
+        kb.plans[key] = plan
+    return plan
+
+
+def analyze_variants(
+    parsed_vcf: Dict[str, Any],
+    patient_id: str,
+    selected_drugs: List[str] = None,
+    genome_build: Optional[str] = None,
+) -> ClinicalReport:
     """
     Analyze variants and generate pharmacogenomic recommendations.
     
@@ -102,9 +286,13 @@ def analyze_variants(parsed_vcf: Dict[str, Any], patient_id: str, selected_drugs
     - "Unknown" status if no variant detected
     
     Args:
-        parsed_vcf: Parsed VCF data with variants
+        parsed_vcf: Parsed VCF data with variants (a list or any iterable,
+            consumed exactly once) and optionally the ``prefilter`` the
+            variant stream was parsed with (see ``build_prefilter``)
         patient_id: Patient identifier
         selected_drugs: List of drugs to analyze (REQUIRED, uppercase)
+        genome_build: Reference build of the positions (GRCh38/GRCh37);
+            None matches rule loci of every supported build
     
     Returns:
         Clinical report with recommendations ONLY for selected drugs
@@ -112,98 +300,452 @@ def analyze_variants(parsed_vcf: Dict[str, Any], patient_id: str, selected_drugs
     if not selected_drugs:
         raise ValueError("selected_drugs is required - must specify which drugs to analyze")
     
-    recommendations: List[Dict[str, Any]] = []
-    variants = parsed_vcf["variants"]
+    # CRITICAL: Only consider rules for drugs in the selected list
+    return _analyze_sample(compile_plan(selected_drugs, genome_build), parsed_vcf, patient_id)
+
+
+def _analyze_sample(
+    plan: AnalysisPlan,
+    parsed_vcf: Dict[str, Any],
+    patient_id: str,
+    report_id: Optional[str] = None,
+) -> ClinicalReport:
+    """Report for one sample's variants (see ``analyze_variants``)"""
+    # Single pass over the variants: remember the first variant matching each
+    # rule, so ``variants`` may be a lazy stream (e.g. from ``iter_vcf``).
+    # Star-allele defining variants are collected into per-gene ALT bitsets,
+    # and genes are marked covered by the first record in their region.
+    first_match: Dict[int, Mapping[str, Any]] = {}
+    pending = set(range(len(plan.active_rules)))
+    coverage = _GeneCoverage(plan)
+    uncovered, open_spans = coverage.uncovered, coverage.open_spans
+    het = dict.fromkeys(plan.genes, 0)
+    hom = dict.fromkeys(plan.genes, 0)
+    preview: List[VariantPreview] = []
+    total_variants = 0
+    prefilter: Optional[LinePrefilter] = parsed_vcf.get("prefilter")
+    for v in parsed_vcf["variants"]:
+        total_variants += 1
+        if len(preview) < PREVIEW_VARIANTS:
+            preview.append(VariantPreview.from_record(v))
+        retarget = False
+        if uncovered and open_spans.get(v["chrom"], True):
+            retarget = coverage.visit(v["chrom"], v["pos"])
+        hits = plan.match(v)
+        if not hits and not retarget:
+            continue
+        for kind, key, bit, allele in hits:
+            if kind == STAR_HIT:
+                code = _genotype_code(v, allele)
+                if code == GT_HOM_ALT:
+                    hom[key] |= 1 << bit
+                elif code != GT_HOM_REF:
+                    het[key] |= 1 << bit
+            elif key in pending:
+                pending.discard(key)
+                first_match[key] = v
+                retarget = True
+        if retarget and prefilter is not None:
+            # Only lines that can still satisfy a pending rule, define a
+            # star allele or cover a gene need parsing
+            prefilter.configure(*plan.prefilter_targets(pending, uncovered))
+    if prefilter is not None:
+        total_variants += prefilter.skipped
     
-    # Normalize selected drugs to uppercase
-    selected_drugs = [drug.upper() for drug in selected_drugs]
+    calls = {gene: None if gene in uncovered else plan.call(gene, het[gene], hom[gene]) for gene in plan.genes}
+    return _build_report(
+        plan,
+        patient_id,
+        first_match,
+        total_variants,
+        preview,
+        report_id=report_id,
+        calls=calls,
+    )
+
+
+def analyze_cohort(
+    parsed_vcf: Dict[str, Any],
+    selected_drugs: List[str],
+    patient_ids: Optional[List[str]] = None,
+    genome_build: Optional[str] = None,
+) -> List[ClinicalReport]:
+    """
+    Analyze every sample of a multi-sample VCF in a single pass over its variants.
     
-    # Track which selected drugs have been analyzed
-    drugs_with_findings = set()
+    Unlike ``analyze_variants`` (which treats every listed variant as present),
+    a rule only fires for samples that actually carry the matching variant
+    (heterozygous or homozygous alternate call).
     
-    # Find variants for selected drugs only
-    for rule in CPIC_RULES:
-        drug_upper = rule["drug"].upper()
-        
-        # CRITICAL: Skip drugs not in selected list
-        if drug_upper not in selected_drugs:
+    Args:
+        parsed_vcf: Output of ``parse_vcf(content, cohort=True)``
+        selected_drugs: List of drugs to analyze (REQUIRED)
+        patient_ids: Optional patient identifier per sample (defaults to sample names)
+        genome_build: Reference build of the positions (None: any supported build)
+    
+    Returns:
+        One clinical report per sample, in sample order
+    """
+    if not selected_drugs:
+        raise ValueError("selected_drugs is required - must specify which drugs to analyze")
+    
+    table = parsed_vcf["variants"]
+    genotypes = getattr(table, "genotypes", None)
+    if genotypes is None:
+        raise ValueError("parsed_vcf has no per-sample genotypes - parse it with cohort=True")
+    n_samples = genotypes.n_samples
+    if patient_ids is None:
+        patient_ids = genotypes.samples
+    if len(patient_ids) != n_samples:
+        raise ValueError("patient_ids must have one entry per sample")
+    
+    plan = compile_plan(selected_drugs, genome_build)
+    genes = plan.genes
+    
+    # Per sample: rule index -> row index of the first carried matching variant
+    first_match: List[Dict[int, int]] = [{} for _ in range(n_samples)]
+    matched_samples = [0] * len(plan.active_rules)
+    # Per gene and sample: star-allele ALT bitsets
+    het = {gene: [0] * n_samples for gene in genes}
+    hom = {gene: [0] * n_samples for gene in genes}
+    # Active rules some sample has yet to match
+    pending = set(range(len(plan.active_rules)))
+    # Genes without a record in their region (for any sample) are not called
+    coverage = _GeneCoverage(plan)
+    uncovered, open_spans = coverage.uncovered, coverage.open_spans
+    for i, v in enumerate(table):
+        if not pending and not genes:
+            break
+        if uncovered and open_spans.get(v["chrom"], True):
+            coverage.visit(v["chrom"], v["pos"])
+        hits = plan.match(v)
+        if not hits:
             continue
-        
-        # Check if variant exists for this drug
-        variant_found = False
-        for v in variants:
-            if v["id"] == rule["rs_id"] or rule["risk_allele"] in v["alt"]:
-                recommendations.append({
-                    "drug": rule["drug"],
-                    "gene": rule["gene"],
-                    "diplotype": f"{v['ref']}/{v['alt']}",
-                    "phenotype": rule["phenotype"],
-                    "risk_category": rule["risk_category"],
-                    "risk_level": rule["risk_level"],
-                    "recommendation": rule["recommendation"],
-                    "dosage_guidance": rule["dosage_guidance"],
-                    "guideline": rule["guideline"],
-                    "evidence": rule["evidence"],
-                    "alternatives": rule["alternatives"],
-                })
-                drugs_with_findings.add(drug_upper)
-                variant_found = True
-                break
-        
-        # If variant found, don't check other rules for same drug
-        if variant_found:
+        # Per matched ALT allele: the codes of the samples' copies of it, and the rules it hits
+        rows: Dict[int, bytes] = {}
+        rule_hits: Dict[int, set] = {}
+        for kind, key, bit, allele in hits:
+            row = rows.get(allele)
+            if row is None:
+                row = rows[allele] = genotypes.row(i, allele)
+            if kind == STAR_HIT:
+                for code, masks in ((GT_HET, het[key]), (GT_HOM_ALT, hom[key])):
+                    j = row.find(code)
+                    while j != -1:
+                        masks[j] |= 1 << bit
+                        j = row.find(code, j + 1)
+            elif key in pending:
+                rule_hits.setdefault(allele, set()).add(key)
+        if not rule_hits:
             continue
+        for allele, keys in rule_hits.items():
+            flags = rows[allele].translate(CARRIER_TABLE)
+            carrier = flags.find(1)
+            while carrier != -1:
+                sample_matches = first_match[carrier]
+                for idx in keys:
+                    if idx not in sample_matches:
+                        sample_matches[idx] = i
+                        matched_samples[idx] += 1
+                carrier = flags.find(1, carrier + 1)
+        pending = {idx for idx in pending if matched_samples[idx] < n_samples}
+    
+    # Samples mostly share a handful of genotypes: call each one once
+    called: Dict[Tuple[str, int, int], Optional[Dict[str, Any]]] = {}
+    
+    def call(gene: str, j: int) -> Optional[Dict[str, Any]]:
+        if gene in uncovered:
+            return None
+        key = (gene, het[gene][j], hom[gene][j])
+        if key not in called:
+            called[key] = plan.call(*key)
+        return called[key]
+    
+    reports = []
+    for j in range(n_samples):
+        matches = {idx: SampleVariantRow(table, i, j) for idx, i in first_match[j].items()}
+        preview = [VariantPreview.from_record(SampleVariantRow(table, i, j)) for i in genotypes.carrier_indices(j, limit=PREVIEW_VARIANTS)]
+        reports.append(_build_report(
+            plan,
+            patient_ids[j],
+            matches,
+            genotypes.carrier_count(j),
+            preview,
+            report_id=new_report_id(),
+            calls={gene: call(gene, j) for gene in genes},
+        ))
+    return reports
+
+
+def analyze_batch(
+    samples: Union[Iterable[Tuple[str, Dict[str, Any]]], Dict[str, Any]],
+    selected_drugs: List[str],
+    genome_build: Optional[str] = None,
+) -> List[ClinicalReport]:
+    """
+    Analyze many patients against one compiled rule set.
+    
+    The ``AnalysisPlan`` for the drugs is compiled (or fetched from cache)
+    once and shared by every sample, so the per-patient cost is only the
+    pass over its variants.
+    
+    Args:
+        samples: Either (patient_id, parsed_vcf) pairs, each parsed_vcf as
+            accepted by ``analyze_variants`` (consumed lazily, one patient at
+            a time), or a single ``parse_vcf(content, cohort=True)`` result
+            whose samples are analyzed as in ``analyze_cohort``
+        selected_drugs: List of drugs to analyze (REQUIRED)
+        genome_build: Reference build of the positions (None: any supported build)
     
-    # For selected drugs with NO variants found, add "Unknown" status
+    Returns:
+        One clinical report per patient, in input order, each shaped like
+        the result of ``analyze_variants``
+    """
+    if not selected_drugs:
+        raise ValueError("selected_drugs is required - must specify which drugs to analyze")
+    if isinstance(samples, Mapping):
+        return analyze_cohort(samples, selected_drugs, genome_build=genome_build)
+    
+    plan = compile_plan(selected_drugs, genome_build)
+    return [_analyze_sample(plan, parsed_vcf, patient_id) for patient_id, parsed_vcf in samples]
+
+
+def _genotype_code(v: Mapping[str, Any], allele: int = 1) -> int:
+    """
+    Genotype code of a listed variant (see ``sample_gt_code``); a missing GT
+    counts as one ALT copy. On a multi-allelic record only copies of ALT
+    ``allele`` (from 1) count.
+    """
+    code = getattr(v, "gt_code", None)
+    if code is None:
+        # Plain variant dicts carry no FORMAT; their genotype is taken to start with GT
+        code = decode_gt(str(v.get("genotype", ".")).partition(":")[0])
+    if code == GT_MISSING:
+        return GT_HET
+    if "," in v.get("alt", ""):
+        # A call was decoded, so the sample column starts with its GT
+        return allele_gt_codes[str(v["genotype"]).partition(":")[0], allele]
+    return code
+
+
+def _build_report(
+    plan: AnalysisPlan,
+    patient_id: str,
+    first_match: Mapping[int, Mapping[str, Any]],
+    total_variants: int,
+    preview: List[VariantPreview],
+    report_id: Optional[str] = None,
+    calls: Optional[Mapping[str, Optional[Dict[str, Any]]]] = None,
+) -> ClinicalReport:
+    """
+    Assemble a clinical report from the first matching variant of each
+    active rule of ``plan``.
+    
+    ``calls`` maps genes to their star-allele call (see ``star_alleles``),
+    or to None when the VCF has no record in the gene's region; such a
+    gene is never taken to be reference (``*1/*1``). A drug's rules are
+    tried in order: the first matched rule for the called phenotype of its
+    gene wins (any matched rule when the gene has no call), so a rule's
+    risk and recommendation describe the reported phenotype. Failing that,
+    the first matched rule for a phenotype the call is at least as severe
+    as applies, reported with the called phenotype, so a detected risk
+    allele is never reported as unknown risk. A non-reference call without
+    any matched rule is still reported, as an unknown-risk finding. A
+    drug's decision table, when it covers the calls of its genes, takes
+    precedence over its rules.
+    """
+    all_calls = calls or {}
+    decided = {}
+    for table in plan.tables:
+        rec = _table_recommendation(table, all_calls)
+        if rec is not None:
+            decided[table.drug] = rec
+    calls = {gene: call for gene, call in all_calls.items() if call and call["diplotype"] != "*1/*1"}
+    selected_drugs = list(plan.selected_drugs)
+    recommendations: List[DrugRecommendation] = []
+    
+    # Track which selected drugs have been analyzed
+    drugs_with_findings = set()
+    
+    # Drugs in the order of their first rule; decision table findings take
+    # the place of their drug's rules
+    for drug_upper, positions in plan.rules_by_drug.items():
+        rec = decided.get(drug_upper) or _rule_recommendation(plan, positions, first_match, all_calls)
+        if rec is not None:
+            recommendations.append(rec)
+            drugs_with_findings.add(drug_upper)
+    
+    # Decision tables of drugs without rules
+    for drug in selected_drugs:
+        if drug in decided and drug not in drugs_with_findings:
+            recommendations.append(decided[drug])
+            drugs_with_findings.add(drug)
+    
+    # For selected drugs without a finding, add "Unknown" status
     for drug in selected_drugs:
         if drug not in drugs_with_findings:
-            gene = DRUG_GENE_MAP.get(drug, "Unknown")
-            recommendations.append({
-                "drug": drug,
-                "gene": gene,
-                "diplotype": "Not detected",
-                "phenotype": "Normal Metabolizer (presumed)",
-                "risk_category": "unknown",
-                "risk_level": "unknown",
-                "recommendation": f"No genetic variants detected for {gene}. Standard dosing may be appropriate, but clinical judgment required.",
-                "dosage_guidance": "Standard dosing recommended. Monitor patient response and adjust as needed.",
-                "guideline": "No specific guideline - variant not detected",
-                "evidence": "N/A",
-                "alternatives": [],
-            })
-    
-    # Sort by risk level (high risk first, then unknown last)
-    risk_order = {"toxicity": 0, "ineffective": 1, "adjust_dosage": 2, "safe": 3, "unknown": 4}
-    recommendations.sort(key=lambda r: risk_order.get(r["risk_category"], 4))
-
-    report_id = f"RPT-{int(time.time()):X}"
+            gene = plan.kb.drug_gene_map.get(drug, "Unknown")
+            recommendations.append(_unknown_recommendation(drug, gene, calls.get(gene)))
+    
+    return assemble_report(
+        patient_id,
+        selected_drugs,
+        recommendations,
+        total_variants,
+        preview,
+        plan.kb.version,
+        report_id=report_id,
+    )
+
+
+def _rule_recommendation(
+    plan: AnalysisPlan,
+    positions: List[int],
+    first_match: Mapping[int, Mapping[str, Any]],
+    calls: Mapping[str, Optional[Dict[str, Any]]],
+) -> Optional[DrugRecommendation]:
+    """Finding of the rule (of the active rules at ``positions``, one drug's) that applies, if any (see ``_build_report``)"""
+    applies = fallback = None
+    for idx in positions:
+        v = first_match.get(idx)
+        if v is None:
+            continue
+        rule = plan.active_rules[idx]
+        call = calls.get(rule["gene"])
+        if call is None or call["phenotype"] == rule["phenotype"]:
+            applies = (rule, v, call)
+            break
+        if fallback is None and plan.kb.star_index.at_least_as_severe(rule["gene"], call["phenotype"], rule["phenotype"]):
+            fallback = (rule, v, call)
+    if applies is None and fallback is None:
+        return None
+    rule, v, call = applies or fallback
+    return DrugRecommendation(
+        drug=rule["drug"],
+        gene=rule["gene"],
+        diplotype=call["diplotype"] if call else f"{v['ref']}/{v['alt']}",
+        phenotype=call["phenotype"] if call else rule["phenotype"],
+        risk_category=rule["risk_category"],
+        risk_level=rule["risk_level"],
+        recommendation=rule["recommendation"],
+        dosage_guidance=rule["dosage_guidance"],
+        guideline=rule["guideline"],
+        evidence=rule["evidence"],
+        alternatives=rule["alternatives"],
+    )
+
+
+def _unknown_recommendation(drug: str, gene: str, call: Optional[Dict[str, Any]]) -> DrugRecommendation:
+    """Unknown-risk finding for a drug no rule or table applied to; ``call`` is the gene's non-reference call, if any"""
+    if call is None:
+        return DrugRecommendation(
+            drug=drug,
+            gene=gene,
+            diplotype="Not detected",
+            phenotype="Normal Metabolizer (presumed)",
+            risk_category="unknown",
+            risk_level="unknown",
+            recommendation=f"No genetic variants detected for {gene}. Standard dosing may be appropriate, but clinical judgment required.",
+            dosage_guidance="Standard dosing recommended. Monitor patient response and adjust as needed.",
+            guideline="No specific guideline - variant not detected",
+            evidence="N/A",
+        )
+    return DrugRecommendation(
+        drug=drug,
+        gene=gene,
+        diplotype=call["diplotype"],
+        phenotype=call["phenotype"],
+        risk_category="unknown",
+        risk_level="unknown",
+        recommendation=(
+            f"{gene} {call['diplotype']} ({call['phenotype']}) detected; no {drug.lower()} recommendation "
+            f"is available for this phenotype. Clinical judgment required."
+        ),
+        dosage_guidance="No genotype-guided dosing available for this phenotype. Monitor patient response and adjust as needed.",
+        guideline="No specific guideline for this phenotype",
+        evidence="N/A",
+    )
+
+
+def _table_recommendation(
+    table: DecisionTable,
+    calls: Mapping[str, Optional[Dict[str, Any]]],
+) -> Optional[DrugRecommendation]:
+    """Recommendation of a decision table for the star-allele calls of its genes, if a row covers them"""
+    gene_calls = [calls.get(gene) for gene in table.genes]
+    row = table.lookup([call["phenotype"] if call else None for call in gene_calls])
+    if row is None:
+        return None
+    return DrugRecommendation(
+        drug=table.drug,
+        gene="/".join(table.genes),
+        diplotype="; ".join(f"{gene} {call['diplotype'] if call else 'Not called'}" for gene, call in zip(table.genes, gene_calls)),
+        phenotype="; ".join(f"{gene} {call['phenotype'] if call else 'Indeterminate'}" for gene, call in zip(table.genes, gene_calls)),
+        risk_category=row["risk_category"],
+        risk_level=row["risk_level"],
+        recommendation=row["recommendation"],
+        dosage_guidance=row["dosage_guidance"],
+        guideline=table.guideline,
+        evidence=table.evidence,
+        alternatives=row["alternatives"],
+    )
+
+
+# Report order of risk categories (high risk first, then unknown last)
+RISK_ORDER = {"toxicity": 0, "ineffective": 1, "adjust_dosage": 2, "safe": 3, "unknown": 4}
+
+
+DISCLAIMER = "This report is for clinical decision support only. All recommendations should be reviewed by a qualified healthcare provider. 'Unknown' status indicates no genetic variant was detected, or no recommendation covers the detected genotype - standard dosing may be appropriate but requires clinical judgment."
+
+
+def assemble_report(
+    patient_id: str,
+    selected_drugs: List[str],
+    recommendations: List[DrugRecommendation],
+    total_variants: int,
+    preview: List[VariantPreview],
+    rule_set_version: str,
+    report_id: Optional[str] = None,
+) -> ClinicalReport:
+    """
+    Wrap per-drug recommendations (one per selected drug) into a clinical report.
+
+    Recommendations are sorted by risk category; the sort is stable, so
+    callers control the order within a category.
+    """
+    recommendations = sorted(recommendations, key=lambda r: RISK_ORDER.get(r.risk_category, 4))
+
+    if report_id is None:
+        report_id = new_report_id()
     
     # Count risk categories
-    toxicity_count = sum(1 for r in recommendations if r["risk_category"] == "toxicity")
-    ineffective_count = sum(1 for r in recommendations if r["risk_category"] == "ineffective")
-    adjust_dosage_count = sum(1 for r in recommendations if r["risk_category"] == "adjust_dosage")
-    safe_count = sum(1 for r in recommendations if r["risk_category"] == "safe")
-    unknown_count = sum(1 for r in recommendations if r["risk_category"] == "unknown")
-
-    return {
-        "report_id": report_id,
-        "patient_id": patient_id,
-        "generated_at": datetime.utcnow().isoformat(),
-        "selected_drugs": selected_drugs,  # Include selected drugs in response
-        "summary": {
-            "total_variants": len(variants),
-            "drugs_analyzed": len(selected_drugs),
-            "clinically_relevant": len([r for r in recommendations if r["risk_category"] != "unknown"]),
-            "toxicity_risk": toxicity_count,
-            "ineffective_risk": ineffective_count,
-            "dosage_adjustment": adjust_dosage_count,
-            "safe": safe_count,
-            "unknown": unknown_count,
+    counts = dict.fromkeys(RISK_ORDER, 0)
+    levels = {"high": 0, "moderate": 0}
+    for r in recommendations:
+        counts[r.risk_category] = counts.get(r.risk_category, 0) + 1
+        if r.risk_level in levels:
+            levels[r.risk_level] += 1
+
+    return ClinicalReport(
+        report_id=report_id,
+        patient_id=patient_id,
+        generated_at=datetime.utcnow().isoformat(),
+        rule_set_version=rule_set_version,
+        selected_drugs=tuple(selected_drugs),  # Include selected drugs in response
+        summary=ReportSummary(
+            total_variants=total_variants,
+            drugs_analyzed=len(selected_drugs),
+            clinically_relevant=len(recommendations) - counts["unknown"],
+            toxicity_risk=counts["toxicity"],
+            ineffective_risk=counts["ineffective"],
+            dosage_adjustment=counts["adjust_dosage"],
+            safe=counts["safe"],
+            unknown=counts["unknown"],
             # Legacy fields for backward compatibility
-            "high_risk_drugs": sum(1 for r in recommendations if r["risk_level"] == "high"),
-            "moderate_risk_drugs": sum(1 for r in recommendations if r["risk_level"] == "moderate"),
-        },
-        "recommendations": recommendations,
-        "variants": variants[:50],
-        "disclaimer": "This report is for clinical decision support only. All recommendations should be reviewed by a qualified healthcare provider. 'Unknown' status indicates no genetic variant was detected - standard dosing may be appropriate but requires clinical judgment.",
-    }
+            high_risk_drugs=levels["high"],
+            moderate_risk_drugs=levels["moderate"],
+        ),
+        recommendations=tuple(recommendations),
+        variants=tuple(preview),
+        disclaimer=DISCLAIMER,
+    )
@@ -0,0 +1,99 @@
+"""Monotonic, collision-free report identifiers"""
+from datetime import datetime, timezone
+from typing import Optional
+import os
+import threading
+import time
+
+# 96-bit IDs: millisecond Unix timestamp | worker | sequence
+TIMESTAMP_BITS = 48
+WORKER_BITS = 32
+SEQUENCE_BITS = 16
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+# Crockford base32: no I, L, O, U; fixed width keeps IDs sortable as strings
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+ENCODED_LENGTH = 20  # ceil(96 / 5)
+
+PREFIX = "RPT-"
+
+
+def _encode(value: int) -> str:
+    chars = []
+    for _ in range(ENCODED_LENGTH):
+        value, digit = divmod(value, 32)
+        chars.append(ALPHABET[digit])
+    return "".join(reversed(chars))
+
+
+def _decode(text: str) -> int:
+    value = 0
+    for char in text.upper():
+        value = value * 32 + ALPHABET.index(char)
+    return value
+
+
+class ReportIdGenerator:
+    """
+    Snowflake-style ID generator.
+
+    Every ID packs the current time in milliseconds, a per-process worker
+    number and a per-millisecond sequence, base32 encoded behind a prefix
+    (e.g. ``RPT-00D19HSK9SZ20CYTW000``). IDs from one generator are
+    strictly increasing, also when the clock steps back (the last timestamp
+    is reused) or more than 65536 IDs are requested in one millisecond (the
+    timestamp borrows from the next one), and sort by creation time as
+    plain strings.
+
+    The worker number is 32 random bits drawn when the process starts and
+    again in every forked child, so uvicorn/gunicorn workers and process
+    pools need no coordination: two processes only collide if they draw
+    the same worker number *and* emit the same sequence number in the same
+    millisecond. A fixed ``worker`` can be given instead.
+    """
+
+    def __init__(self, prefix: str = PREFIX, worker: Optional[int] = None):
+        if worker is not None and not 0 <= worker < (1 << WORKER_BITS):
+            raise ValueError(f"worker must be in [0, {1 << WORKER_BITS})")
+        self.prefix = prefix
+        self._fixed_worker = worker
+        self.reseed()
+
+    def reseed(self) -> None:
+        """Draw a new worker number and reset the sequence (called after fork)"""
+        self._lock = threading.Lock()
+        self.worker = self._fixed_worker if self._fixed_worker is not None else int.from_bytes(os.urandom(4), "big")
+        self._last_ms = 0
+        self._sequence = 0
+
+    def new_id(self) -> str:
+        with self._lock:
+            now = time.time_ns() // 1_000_000
+            if now > self._last_ms:
+                self._last_ms = now
+                self._sequence = 0
+            elif self._sequence < MAX_SEQUENCE:
+                self._sequence += 1
+            else:
+                self._last_ms += 1
+                self._sequence = 0
+            value = (self._last_ms << (WORKER_BITS + SEQUENCE_BITS)) | (self.worker << SEQUENCE_BITS) | self._sequence
+        return self.prefix + _encode(value)
+
+
+def report_id_timestamp(report_id: str, prefix: str = PREFIX) -> datetime:
+    """Creation time (UTC) encoded in an ID from ``ReportIdGenerator``"""
+    if not report_id.startswith(prefix) or len(report_id) != len(prefix) + ENCODED_LENGTH:
+        raise ValueError(f"Not a generated report ID: {report_id}")
+    ms = _decode(report_id[len(prefix):]) >> (WORKER_BITS + SEQUENCE_BITS)
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc)
+
+
+_generator = ReportIdGenerator()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_generator.reseed)
+
+
+def new_report_id() -> str:
+    """Next report ID of this process"""
+    return _generator.new_id()
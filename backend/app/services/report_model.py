@@ -0,0 +1,181 @@
+"""
+Typed clinical report objects.
+
+The engine builds a report once as slotted, immutable objects and they are
+serialized straight to JSON bytes, in exactly the camelCase shape of
+``schemas.ClinicalReportOut``, for the HTTP response; ``report_store``
+stores them split from the same ``to_dict()``. Nothing re-validates them
+through Pydantic on the way out.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Mapping, Optional, Tuple
+
+import orjson
+
+
+@dataclass(frozen=True, slots=True)
+class VariantPreview:
+    """One variant echoed back in a report (the fields of ``schemas.VariantOut``)"""
+    chrom: str
+    pos: int
+    id: str
+    ref: str
+    alt: str
+    qual: str
+    genotype: str
+
+    @classmethod
+    def from_record(cls, v: Mapping[str, Any]) -> "VariantPreview":
+        """From a parsed variant (dict or variant table row); other fields are dropped"""
+        return cls(v["chrom"], v["pos"], v["id"], v["ref"], v["alt"], v["qual"], v["genotype"])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "chrom": self.chrom,
+            "pos": self.pos,
+            "id": self.id,
+            "ref": self.ref,
+            "alt": self.alt,
+            "qual": self.qual,
+            "genotype": self.genotype,
+        }
+
+
+@dataclass(frozen=True, slots=True)
+class DrugRecommendation:
+    """Risk assessment for one selected drug"""
+    drug: str
+    gene: str
+    diplotype: str
+    phenotype: str
+    risk_category: str
+    risk_level: str
+    recommendation: str
+    dosage_guidance: str
+    guideline: str
+    evidence: str
+    alternatives: Tuple[str, ...] = ()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "drug": self.drug,
+            "gene": self.gene,
+            "diplotype": self.diplotype,
+            "phenotype": self.phenotype,
+            "riskCategory": self.risk_category,
+            "riskLevel": self.risk_level,
+            "recommendation": self.recommendation,
+            "dosageGuidance": self.dosage_guidance,
+            "guideline": self.guideline,
+            "evidence": self.evidence,
+            "alternatives": self.alternatives,
+        }
+
+
+@dataclass(frozen=True, slots=True)
+class ReportSummary:
+    """Risk category counts of a report"""
+    total_variants: int
+    drugs_analyzed: int
+    clinically_relevant: int
+    toxicity_risk: int
+    ineffective_risk: int
+    dosage_adjustment: int
+    safe: int
+    unknown: int
+    # Legacy fields for backward compatibility
+    high_risk_drugs: int
+    moderate_risk_drugs: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "totalVariants": self.total_variants,
+            "drugsAnalyzed": self.drugs_analyzed,
+            "clinicallyRelevant": self.clinically_relevant,
+            "toxicityRisk": self.toxicity_risk,
+            "ineffectiveRisk": self.ineffective_risk,
+            "dosageAdjustment": self.dosage_adjustment,
+            "safe": self.safe,
+            "unknown": self.unknown,
+            "highRiskDrugs": self.high_risk_drugs,
+            "moderateRiskDrugs": self.moderate_risk_drugs,
+        }
+
+
+@dataclass(frozen=True, slots=True)
+class ClinicalReport:
+    """A patient's clinical report (see ``pgx_engine.assemble_report``)"""
+    report_id: str
+    patient_id: str
+    generated_at: str  # ISO 8601, UTC
+    rule_set_version: Optional[str]
+    selected_drugs: Tuple[str, ...]
+    summary: ReportSummary
+    recommendations: Tuple[DrugRecommendation, ...]
+    variants: Tuple[VariantPreview, ...]
+    disclaimer: str
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-ready dict in the API's camelCase shape"""
+        return {
+            "reportId": self.report_id,
+            "patientId": self.patient_id,
+            "generatedAt": self.generated_at,
+            "ruleSetVersion": self.rule_set_version,
+            "selectedDrugs": self.selected_drugs,
+            "summary": self.summary.to_dict(),
+            "recommendations": [rec.to_dict() for rec in self.recommendations],
+            "variants": [v.to_dict() for v in self.variants],
+            "disclaimer": self.disclaimer,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "ClinicalReport":
+        """Inverse of ``to_dict()``"""
+        summary = data["summary"]
+        return cls(
+            report_id=data["reportId"],
+            patient_id=data["patientId"],
+            generated_at=data["generatedAt"],
+            rule_set_version=data["ruleSetVersion"],
+            selected_drugs=tuple(data["selectedDrugs"]),
+            summary=ReportSummary(
+                total_variants=summary["totalVariants"],
+                drugs_analyzed=summary["drugsAnalyzed"],
+                clinically_relevant=summary["clinicallyRelevant"],
+                toxicity_risk=summary["toxicityRisk"],
+                ineffective_risk=summary["ineffectiveRisk"],
+                dosage_adjustment=summary["dosageAdjustment"],
+                safe=summary["safe"],
+                unknown=summary["unknown"],
+                high_risk_drugs=summary["highRiskDrugs"],
+                moderate_risk_drugs=summary["moderateRiskDrugs"],
+            ),
+            recommendations=tuple(
+                DrugRecommendation(
+                    drug=rec["drug"],
+                    gene=rec["gene"],
+                    diplotype=rec["diplotype"],
+                    phenotype=rec["phenotype"],
+                    risk_category=rec["riskCategory"],
+                    risk_level=rec["riskLevel"],
+                    recommendation=rec["recommendation"],
+                    dosage_guidance=rec["dosageGuidance"],
+                    guideline=rec["guideline"],
+                    evidence=rec["evidence"],
+                    alternatives=tuple(rec["alternatives"]),
+                )
+                for rec in data["recommendations"]
+            ),
+            variants=tuple(VariantPreview.from_record(v) for v in data["variants"]),
+            disclaimer=data["disclaimer"],
+        )
+
+    def to_json(self) -> bytes:
+        """UTF-8 JSON of ``to_dict()``"""
+        return orjson.dumps(self.to_dict())
+
+
+def cohort_json(report_bodies: Iterable[bytes]) -> bytes:
+    """``{"reports": [...]}`` response body from the reports' ``to_json()`` bytes"""
+    return b'{"reports":[' + b",".join(report_bodies) + b"]}"
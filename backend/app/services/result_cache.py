@@ -0,0 +1,228 @@
+"""Content-addressed caches for parsed VCFs and per-drug recommendations"""
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Mapping, Optional, Tuple, Union
+import hashlib
+import threading
+import time
+
+from .knowledge_base import KnowledgeBase, get_knowledge_base
+from .pgx_engine import PREVIEW_VARIANTS, analyze_variants, assemble_report, compile_plan
+from .report_model import ClinicalReport, DrugRecommendation, VariantPreview
+from .variant_table import VariantTable
+from .vcf_parser import LinePrefilter
+
+
+def content_hash(content: Union[str, bytes, bytearray, memoryview]) -> str:
+    """SHA-256 hex digest of VCF content (text is hashed as UTF-8)"""
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return hashlib.sha256(content).hexdigest()
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache with a per-entry TTL and an optional total size budget.
+
+    Every entry has a caller-supplied ``size`` (bytes, or 1 to count
+    entries). Least recently used entries are evicted when either
+    ``max_entries`` or ``max_bytes`` would be exceeded; expired entries are
+    dropped when they are looked up. A value larger than ``max_bytes`` is
+    not cached at all.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: Optional[int] = None, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, size, expires = entry
+            if expires and expires <= time.monotonic():
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any, size: int = 1) -> bool:
+        """Store ``value``; returns False when it is too large to cache"""
+        if self.max_entries <= 0 or (self.max_bytes is not None and size > self.max_bytes):
+            return False
+        expires = time.monotonic() + self.ttl if self.ttl else 0.0
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (value, size, expires)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or (self.max_bytes is not None and self._bytes > self.max_bytes):
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+        return True
+
+    def _drop(self, key: Hashable) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class AnalysisCache:
+    """
+    Reuse of parsed VCFs and recommendations across repeated submissions.
+
+    - ``tables``: content hash -> parsed ``VariantTable`` and the count of
+      lines its pre-filter skipped (or a whole ``parse_vcf`` result, see
+      ``get_parsed``), size-bounded by the tables' ``nbytes``
+    - ``recommendations``: (content hash, drug, genome build, rule-set
+      version) -> ``DrugRecommendation`` (immutable, so shared by reports)
+
+    A recommendation depends only on the file, the drug, the build and the
+    rules, never on the patient ID or on the other drugs selected, so a
+    resubmission with a different drug subset only analyzes the drugs that
+    were never analyzed for that file. A knowledge base reload changes the
+    version and therefore misses every old recommendation.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: Optional[float] = None, max_recommendations: Optional[int] = None):
+        self.tables = LRUCache(max_entries, max_bytes=max_bytes, ttl=ttl)
+        self.recommendations = LRUCache(max_recommendations or max_entries * 16, ttl=ttl)
+
+    def analyze(
+        self,
+        key: str,
+        parse: Callable[[VariantTable], Iterable[Mapping[str, Any]]],
+        patient_id: str,
+        selected_drugs: List[str],
+        genome_build: Optional[str] = None,
+        prefilter: Optional[LinePrefilter] = None,
+    ) -> Tuple[ClinicalReport, VariantTable]:
+        """
+        Report for the VCF with content hash ``key``, like ``analyze_variants``.
+
+        ``parse(table)`` is only called on a table cache miss: it must return
+        the VCF's variant stream and append every variant it yields to
+        ``table`` (errors it raises propagate unchanged).
+
+        ``prefilter`` is the ``LinePrefilter`` the stream is parsed with, if
+        any. On a miss it is widened to the targets of every drug of the
+        knowledge base before parsing starts and is never narrowed, so the
+        cached table holds what any drug selection needs, while the lines
+        no rule or star allele can use are still skipped. Such tables are
+        cached per genome build and rule-set version.
+
+        Returns:
+            (report, parsed table)
+        """
+        kb = get_knowledge_base()
+        selected_drugs = [drug.upper() for drug in selected_drugs]
+        found: Dict[str, DrugRecommendation] = {}
+        for drug in selected_drugs:
+            rec = self.recommendations.get((key, drug, genome_build, kb.version))
+            if rec is not None:
+                found[drug] = rec
+        missing = [drug for drug in selected_drugs if drug not in found]
+
+        table_key: Hashable = key if prefilter is None else (key, genome_build, kb.version)
+        cached = self.tables.get(table_key)
+        fresh = cached is None
+        if fresh:
+            table = VariantTable()
+            skipped = 0
+            if prefilter is not None:
+                prefilter.configure(*compile_plan(list(kb.drug_metadata), genome_build, kb).prefilter_targets())
+            variants: Iterable[Mapping[str, Any]] = parse(table)
+        else:
+            table, skipped = cached
+            variants = table
+
+        version = kb.version
+        if missing:
+            partial = analyze_variants({"variants": variants}, patient_id, missing, genome_build)
+            version = partial.rule_set_version
+            for rec in partial.recommendations:
+                found[rec.drug.upper()] = rec
+                self.recommendations.put((key, rec.drug.upper(), genome_build, version), rec)
+        elif fresh:
+            for _ in variants:
+                pass
+        if fresh:
+            if prefilter is not None:
+                skipped = prefilter.skipped
+            self.tables.put(table_key, (table, skipped), table.nbytes)
+
+        report = assemble_report(
+            patient_id,
+            selected_drugs,
+            self._in_report_order(kb, [found[drug] for drug in selected_drugs]),
+            len(table) + skipped,
+            [VariantPreview.from_record(v) for v in table[:PREVIEW_VARIANTS]],
+            version,
+        )
+        return report, table
+
+    @staticmethod
+    def _in_report_order(kb: KnowledgeBase, recommendations: List[DrugRecommendation]) -> List[DrugRecommendation]:
+        """
+        Findings in rule order, then decision-table findings of drugs
+        without rules and drugs without findings, each in selection order
+        (as ``analyze_variants`` lists them)
+        """
+        first_rule = {drug: positions[0] for drug, positions in kb.rules_by_drug.items()}
+
+        def order(item: Tuple[int, DrugRecommendation]) -> Tuple[int, int]:
+            i, rec = item
+            if rec.risk_category == "unknown":
+                return (1, i)
+            return (0, first_rule.get(rec.drug.upper(), len(kb.rules) + i))
+
+        return [rec for _, rec in sorted(enumerate(recommendations), key=order)]
+
+    def get_parsed(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        """A cached ``parse_vcf`` result (e.g. of a cohort VCF)"""
+        return self.tables.get(key)
+
+    def put_parsed(self, key: Hashable, parsed: Dict[str, Any]) -> None:
+        self.tables.put(key, parsed, parsed["variants"].nbytes)
+
+    def clear(self) -> None:
+        self.tables.clear()
+        self.recommendations.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "variant_tables": self.tables.stats(),
+            "recommendations": self.recommendations.stats(),
+        }
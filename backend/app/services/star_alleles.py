@@ -0,0 +1,122 @@
+"""Star-allele (haplotype) diplotype calling with precomputed bitsets"""
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+
+class StarAlleleCaller:
+    """
+    Diplotype caller for one gene.
+
+    Haplotypes are precomputed as bitsets over the gene's defining variants.
+    A patient is described by two bitsets: ``het`` (one ALT copy) and
+    ``hom`` (two ALT copies); untyped positions count as reference. For each
+    candidate first haplotype ``a`` (which must contain ``hom`` and lie
+    within ``het | hom``), the second one is forced to be
+    ``hom | (het & ~a)`` and is found with one dict lookup, so a call costs
+    O(haplotypes) bit operations. Among several explanations the one with
+    the fewest non-reference haplotypes (then the earliest table rows) wins.
+
+    ``definition`` (see ``knowledge_base``):
+    - variants: rsID -> {build: (chrom, pos, ref, alt)} (forward strand)
+    - alleles: (name, defining rsIDs, activity value); several rows may
+      share a name (sub-alleles)
+    - phenotypes: (highest activity score, phenotype), checked in order,
+      so they run from the least to the most activity
+    """
+
+    def __init__(self, gene: str, definition: Mapping[str, Any]):
+        self.gene = gene
+        self.variants: List[str] = list(definition["variants"])
+        self.bits: Dict[str, int] = {rs_id: i for i, rs_id in enumerate(self.variants)}
+        self.loci: Dict[str, Dict[str, Tuple[str, int, str, str]]] = dict(definition["variants"])
+        self.phenotypes: List[Tuple[float, str]] = list(definition["phenotypes"])
+        self.phenotype_ranks: Dict[str, int] = {phenotype: i for i, (_, phenotype) in enumerate(self.phenotypes)}
+        self.names: List[str] = []
+        self.activity: List[float] = []
+        self.masks: List[int] = []
+        self.by_mask: Dict[int, int] = {}
+        for row, (name, rs_ids, activity) in enumerate(definition["alleles"]):
+            mask = 0
+            for rs_id in rs_ids:
+                mask |= 1 << self.bits[rs_id]
+            self.names.append(name)
+            self.activity.append(activity)
+            self.masks.append(mask)
+            self.by_mask.setdefault(mask, row)
+
+    def call(self, het: int, hom: int) -> Optional[Dict[str, Any]]:
+        """
+        Call the diplotype for ALT bitsets ``het``/``hom``.
+
+        Returns None when no pair of known haplotypes explains the genotypes.
+        """
+        carried = het | hom
+        best: Optional[Tuple[Tuple[int, int], int, int]] = None
+        for a, mask in enumerate(self.masks):
+            if mask & ~carried or hom & ~mask:
+                continue
+            b = self.by_mask.get(hom | (het & ~mask))
+            if b is None:
+                continue
+            rank = ((mask != 0) + (self.masks[b] != 0), a + b)
+            if best is None or rank < best[0]:
+                best = (rank, a, b)
+        if best is None:
+            return None
+        _, a, b = best
+        first, second = sorted((a, b), key=lambda row: (self._star_order(row), row))
+        score = self.activity[a] + self.activity[b]
+        return {
+            "gene": self.gene,
+            "diplotype": f"{self.names[first]}/{self.names[second]}",
+            "activity_score": score,
+            "phenotype": self.phenotype_for(score),
+        }
+
+    def _star_order(self, row: int) -> Tuple[int, str]:
+        """Sort key putting '*1' before '*2' before '*10'; named alleles last"""
+        name = self.names[row]
+        digits = "".join(ch for ch in name[1:] if ch.isdigit()) if name.startswith("*") else ""
+        return (int(digits), name) if digits else (1 << 30, name)
+
+    def phenotype_for(self, score: float) -> str:
+        for upper, phenotype in self.phenotypes:
+            if score <= upper:
+                return phenotype
+        return self.phenotypes[-1][1]
+
+
+class StarAlleleIndex:
+    """All callers, plus the defining variants of a set of genes for parser pre-filters"""
+
+    def __init__(self, definitions: Mapping[str, Mapping[str, Any]]):
+        self.callers: Dict[str, StarAlleleCaller] = {
+            gene: StarAlleleCaller(gene, definition) for gene, definition in definitions.items()
+        }
+
+    def targets(self, genes: Iterable[str], build: Optional[str] = None) -> Tuple[set, Dict[str, List[Tuple[int, int]]]]:
+        """rsIDs and positions of the defining variants of ``genes`` (for parser pre-filters)"""
+        rs_ids = set()
+        intervals: Dict[str, List[Tuple[int, int]]] = {}
+        for gene in genes:
+            caller = self.callers.get(gene)
+            if caller is None:
+                continue
+            for rs_id, loci in caller.loci.items():
+                rs_ids.add(rs_id)
+                for locus_build, (chrom, pos, _ref, _alt) in loci.items():
+                    if build is None or locus_build == build:
+                        intervals.setdefault(chrom, []).append((pos, pos))
+        return rs_ids, intervals
+
+    def call(self, gene: str, het: int, hom: int) -> Optional[Dict[str, Any]]:
+        caller = self.callers.get(gene)
+        return caller.call(het, hom) if caller is not None else None
+
+    def at_least_as_severe(self, gene: str, phenotype: str, than: str) -> bool:
+        """Whether ``phenotype`` of ``gene`` has at most the activity of ``than`` (False if either is unknown)"""
+        caller = self.callers.get(gene)
+        if caller is None:
+            return False
+        rank, other = caller.phenotype_ranks.get(phenotype), caller.phenotype_ranks.get(than)
+        return rank is not None and other is not None and rank <= other
+
@@ -0,0 +1,314 @@
+"""Pure-Python BGZF random access and tabix (.tbi) / CSI (.csi) index reader"""
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+import gzip
+import io
+import struct
+import zlib
+
+# Size of the fixed part of a BGZF block header
+BGZF_HEADER_SIZE = 18
+
+# Parameters of the binning scheme used by .tbi indexes
+TBI_MIN_SHIFT = 14
+TBI_DEPTH = 5
+
+# A 1-based, inclusive genomic region: (chrom, start, end)
+Region = Tuple[str, int, int]
+
+
+class IndexFormatError(ValueError):
+    """Raised when an index or BGZF file cannot be decoded"""
+
+
+def reg2bins(beg: int, end: int, min_shift: int, depth: int) -> List[int]:
+    """List the bins overlapping the 0-based half-open interval [beg, end)"""
+    bins: List[int] = []
+    end -= 1
+    shift = min_shift + depth * 3
+    offset = 0
+    for level in range(depth + 1):
+        bins.extend(range(offset + (beg >> shift), offset + (end >> shift) + 1))
+        shift -= 3
+        offset += 1 << (level * 3)
+    return bins
+
+
+def normalize_chrom(chrom: str) -> str:
+    """Strip an optional 'chr' prefix so '22' and 'chr22' compare equal"""
+    return chrom[3:] if chrom.lower().startswith("chr") else chrom
+
+
+class TabixIndex:
+    """
+    Parsed tabix or CSI index.
+
+    Only the parts needed for region queries are kept: per-reference bins
+    with their chunk lists and, for .tbi, the linear index.
+    """
+
+    def __init__(
+        self,
+        names: List[str],
+        bins: List[Dict[int, List[Tuple[int, int]]]],
+        linear: List[List[int]],
+        min_shift: int = TBI_MIN_SHIFT,
+        depth: int = TBI_DEPTH,
+    ):
+        self.names = names
+        self.bins = bins
+        self.linear = linear
+        self.min_shift = min_shift
+        self.depth = depth
+        self._tid = {normalize_chrom(name): tid for tid, name in enumerate(names)}
+
+    @classmethod
+    def from_bytes(cls, data: bytes, contigs: Optional[Sequence[str]] = None) -> "TabixIndex":
+        """
+        Decode a .tbi or .csi index (BGZF compressed or raw).
+
+        ``contigs`` supplies reference names for CSI indexes that do not embed
+        them (they are then taken in ``##contig`` header order).
+        """
+        if data[:2] == b"\x1f\x8b":
+            try:
+                data = gzip.decompress(data)
+            except (OSError, EOFError, zlib.error) as e:
+                raise IndexFormatError(f"Corrupt index: {e}")
+        try:
+            if data[:4] == b"TBI\x01":
+                return cls._parse_tbi(data)
+            if data[:4] == b"CSI\x01":
+                return cls._parse_csi(data, contigs)
+        except struct.error as e:
+            raise IndexFormatError(f"Truncated index: {e}")
+        raise IndexFormatError("Unrecognized index format (expected .tbi or .csi)")
+
+    @staticmethod
+    def _parse_names(blob: bytes) -> List[str]:
+        return [name.decode("utf-8") for name in blob.split(b"\x00") if name]
+
+    @classmethod
+    def _parse_tbi(cls, data: bytes) -> "TabixIndex":
+        n_ref, _fmt, _col_seq, _col_beg, _col_end, _meta, _skip, l_nm = struct.unpack_from("<8i", data, 4)
+        offset = 36
+        names = cls._parse_names(data[offset:offset + l_nm])
+        offset += l_nm
+        bins: List[Dict[int, List[Tuple[int, int]]]] = []
+        linear: List[List[int]] = []
+        for _ in range(n_ref):
+            (n_bin,) = struct.unpack_from("<i", data, offset)
+            offset += 4
+            ref_bins: Dict[int, List[Tuple[int, int]]] = {}
+            for _ in range(n_bin):
+                bin_id, n_chunk = struct.unpack_from("<Ii", data, offset)
+                offset += 8
+                chunks = struct.unpack_from(f"<{2 * n_chunk}Q", data, offset)
+                offset += 16 * n_chunk
+                ref_bins[bin_id] = list(zip(chunks[0::2], chunks[1::2]))
+            (n_intv,) = struct.unpack_from("<i", data, offset)
+            offset += 4
+            linear.append(list(struct.unpack_from(f"<{n_intv}Q", data, offset)))
+            offset += 8 * n_intv
+            bins.append(ref_bins)
+        return cls(names, bins, linear)
+
+    @classmethod
+    def _parse_csi(cls, data: bytes, contigs: Optional[Sequence[str]]) -> "TabixIndex":
+        min_shift, depth, l_aux = struct.unpack_from("<3i", data, 4)
+        offset = 16
+        aux = data[offset:offset + l_aux]
+        offset += l_aux
+        names: List[str] = []
+        if l_aux >= 28:
+            (l_nm,) = struct.unpack_from("<i", aux, 24)
+            names = cls._parse_names(aux[28:28 + l_nm])
+        if not names:
+            names = list(contigs or [])
+        (n_ref,) = struct.unpack_from("<i", data, offset)
+        offset += 4
+        bins: List[Dict[int, List[Tuple[int, int]]]] = []
+        for _ in range(n_ref):
+            (n_bin,) = struct.unpack_from("<i", data, offset)
+            offset += 4
+            ref_bins: Dict[int, List[Tuple[int, int]]] = {}
+            for _ in range(n_bin):
+                bin_id, _loffset, n_chunk = struct.unpack_from("<IQi", data, offset)
+                offset += 16
+                chunks = struct.unpack_from(f"<{2 * n_chunk}Q", data, offset)
+                offset += 16 * n_chunk
+                ref_bins[bin_id] = list(zip(chunks[0::2], chunks[1::2]))
+            bins.append(ref_bins)
+        if len(names) < n_ref:
+            raise IndexFormatError("CSI index does not name its references; ##contig header lines are required")
+        return cls(names, bins, [[] for _ in range(n_ref)], min_shift, depth)
+
+    def chunks_for(self, chrom: str, start: int, end: int) -> List[Tuple[int, int]]:
+        """
+        Virtual-offset chunks that may hold records overlapping a region.
+
+        ``start``/``end`` are 1-based and inclusive. Overlapping chunks are
+        merged so each compressed block is visited at most once per region.
+        """
+        tid = self._tid.get(normalize_chrom(chrom))
+        if tid is None or tid >= len(self.bins):
+            return []
+        beg = max(start - 1, 0)
+        ref_bins = self.bins[tid]
+        linear = self.linear[tid]
+        min_offset = 0
+        if linear:
+            window = min(beg >> self.min_shift, len(linear) - 1)
+            min_offset = linear[window]
+
+        chunks: List[Tuple[int, int]] = []
+        for bin_id in reg2bins(beg, end, self.min_shift, self.depth):
+            for chunk_beg, chunk_end in ref_bins.get(bin_id, ()):
+                if chunk_end > min_offset:
+                    chunks.append((max(chunk_beg, min_offset), chunk_end))
+        chunks.sort()
+
+        merged: List[Tuple[int, int]] = []
+        for chunk_beg, chunk_end in chunks:
+            if merged and chunk_beg <= merged[-1][1]:
+                if chunk_end > merged[-1][1]:
+                    merged[-1] = (merged[-1][0], chunk_end)
+            else:
+                merged.append((chunk_beg, chunk_end))
+        return merged
+
+
+class BgzfReader:
+    """Line reader over a BGZF file supporting seeks to virtual offsets"""
+
+    def __init__(self, fileobj: Any):
+        self._file = fileobj
+        self._block_offset = 0
+        self._block_size = 0
+        self._data = b""
+        self._within = 0
+
+    def _load_block(self, block_offset: int) -> None:
+        self._file.seek(block_offset)
+        header = self._file.read(BGZF_HEADER_SIZE)
+        if not header:
+            self._block_offset, self._block_size, self._data, self._within = block_offset, 0, b"", 0
+            return
+        if len(header) < BGZF_HEADER_SIZE or header[:4] != b"\x1f\x8b\x08\x04":
+            raise IndexFormatError("Not a BGZF file (bgzip it before indexing)")
+        (xlen,) = struct.unpack_from("<H", header, 10)
+        extra = header[12:] + self._file.read(xlen - 6)
+        block_size = None
+        pos = 0
+        while pos + 4 <= len(extra):
+            si1, si2, slen = extra[pos], extra[pos + 1], struct.unpack_from("<H", extra, pos + 2)[0]
+            if si1 == 66 and si2 == 67:
+                (block_size,) = struct.unpack_from("<H", extra, pos + 4)
+                block_size += 1
+                break
+            pos += 4 + slen
+        if block_size is None:
+            raise IndexFormatError("BGZF block is missing its BC size field")
+        rest = self._file.read(block_size - 12 - xlen)
+        try:
+            data = zlib.decompress(header[:12] + extra + rest, 16 + zlib.MAX_WBITS)
+        except zlib.error as e:
+            raise IndexFormatError(f"Corrupt BGZF block at offset {block_offset}: {e}")
+        self._block_offset, self._block_size, self._data, self._within = block_offset, block_size, data, 0
+
+    def seek(self, virtual_offset: int) -> None:
+        block_offset, within = virtual_offset >> 16, virtual_offset & 0xFFFF
+        if block_offset != self._block_offset or not self._block_size:
+            self._load_block(block_offset)
+        self._within = within
+
+    def tell(self) -> int:
+        """Current virtual offset"""
+        if self._within >= len(self._data) and self._block_size:
+            return (self._block_offset + self._block_size) << 16
+        return (self._block_offset << 16) | self._within
+
+    def readline(self) -> Optional[bytes]:
+        """Read one line (without its newline); returns None at end of file"""
+        parts: List[bytes] = []
+        while True:
+            if self._within >= len(self._data):
+                if self._block_size:
+                    self._load_block(self._block_offset + self._block_size)
+                if not self._block_size:
+                    return b"".join(parts) if parts else None
+                continue
+            end = self._data.find(b"\n", self._within)
+            if end == -1:
+                parts.append(self._data[self._within:])
+                self._within = len(self._data)
+                continue
+            parts.append(self._data[self._within:end])
+            self._within = end + 1
+            return b"".join(parts)
+
+
+def _open_binary(source: Union[str, bytes, Any]) -> Tuple[Any, bool]:
+    """Return a seekable binary file object and whether the caller must close it"""
+    if isinstance(source, str):
+        return open(source, "rb"), True
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source), False
+    return source, False
+
+
+def read_header_lines(vcf: Union[str, bytes, Any]) -> List[str]:
+    """Read the '#' header lines from the start of a bgzipped VCF"""
+    fileobj, owned = _open_binary(vcf)
+    try:
+        reader = BgzfReader(fileobj)
+        reader.seek(0)
+        lines: List[str] = []
+        while True:
+            line = reader.readline()
+            if line is None or not line.startswith(b"#"):
+                break
+            lines.append(line.decode("utf-8"))
+            if line.startswith(b"#CHROM"):
+                break
+        return lines
+    finally:
+        if owned:
+            fileobj.close()
+
+
+def iter_region_lines(vcf: Union[str, bytes, Any], index: TabixIndex, regions: Sequence[Region]) -> Iterator[str]:
+    """
+    Yield the data lines of a bgzipped VCF that overlap the given regions.
+
+    Only the BGZF blocks referenced by the index for each region are read and
+    decompressed. A record overlapping several regions is yielded once.
+    """
+    fileobj, owned = _open_binary(vcf)
+    try:
+        reader = BgzfReader(fileobj)
+        seen: set = set()
+        for chrom, start, end in sorted(regions, key=lambda r: (normalize_chrom(r[0]), r[1])):
+            target = normalize_chrom(chrom)
+            for chunk_beg, chunk_end in index.chunks_for(chrom, start, end):
+                reader.seek(chunk_beg)
+                while reader.tell() < chunk_end:
+                    line_offset = reader.tell()
+                    raw = reader.readline()
+                    if raw is None:
+                        break
+                    if not raw or raw.startswith(b"#"):
+                        continue
+                    line = raw.decode("utf-8")
+                    cols = line.split("\t", 5)
+                    if len(cols) < 5 or normalize_chrom(cols[0]) != target:
+                        continue
+                    pos = int(cols[1])
+                    if pos > end:
+                        break
+                    if pos + max(len(cols[3]), 1) - 1 < start or line_offset in seen:
+                        continue
+                    seen.add(line_offset)
+                    yield line
+    finally:
+        if owned:
+            fileobj.close()
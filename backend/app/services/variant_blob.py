@@ -0,0 +1,182 @@
+"""
+Compressed columnar storage of an upload's complete variant set.
+
+A blob holds every variant of a ``VariantTable`` in row groups of
+``GROUP_SIZE`` rows. Each column of each group is compressed on its own
+(zlib), and a directory at the front records per group its row count,
+the position range of each chromosome in it and where each column chunk
+lies. A reader therefore only inflates what a query needs:
+
+- a position range: the ``chrom``/``pos`` chunks of the groups whose
+  directory range overlaps it, then the other columns of groups with a hit
+- an rsID set: the ``id`` chunks, then the other columns of groups with a hit
+
+Layout: ``MAGIC``, format version (u8), directory length (u32, big
+endian), directory (zlib-compressed JSON), column chunks. Positions are
+delta-encoded little-endian int64; text columns are newline-joined UTF-8
+(VCF fields cannot contain newlines).
+"""
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import json
+import struct
+import sys
+import zlib
+
+from .tabix import normalize_chrom
+from .variant_table import VARIANT_FIELDS, VariantTable
+
+MAGIC = b"PGVB"
+FORMAT_VERSION = 1
+GROUP_SIZE = 4096
+COMPRESSION_LEVEL = 6
+
+_HEADER = struct.Struct(">4sBI")
+
+
+def _encode_positions(positions: Sequence[int]) -> bytes:
+    deltas = array("q", positions)
+    for i in range(len(deltas) - 1, 0, -1):
+        deltas[i] -= deltas[i - 1]
+    if sys.byteorder == "big":
+        deltas.byteswap()
+    return deltas.tobytes()
+
+
+def _decode_positions(data: bytes) -> List[int]:
+    values = array("q")
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    for i in range(1, len(values)):
+        values[i] += values[i - 1]
+    return values.tolist()
+
+
+def _encode_text(values: Sequence[str]) -> bytes:
+    text = "\n".join(values)
+    if text.count("\n") != len(values) - 1:
+        raise ValueError("Variant fields cannot contain newlines")
+    return text.encode("utf-8")
+
+
+def encode_variants(table: VariantTable, group_size: int = GROUP_SIZE) -> bytes:
+    """Compress every row of ``table`` into a blob (see module docstring)"""
+    directory: Dict[str, Any] = {"fields": list(VARIANT_FIELDS), "rows": len(table), "groups": []}
+    chunks: List[bytes] = []
+    offset = 0
+    for start in range(0, len(table), group_size):
+        stop = min(start + group_size, len(table))
+        positions = table.pos[start:stop]
+        chroms = table.chrom.slice(start, stop)
+        ranges: Dict[str, List[int]] = {}
+        for chrom, pos in zip(chroms, positions):
+            bounds = ranges.get(chrom)
+            if bounds is None:
+                ranges[chrom] = [pos, pos]
+            elif pos < bounds[0]:
+                bounds[0] = pos
+            elif pos > bounds[1]:
+                bounds[1] = pos
+        columns: Dict[str, Tuple[int, int]] = {}
+        for name in VARIANT_FIELDS:
+            if name == "pos":
+                raw = _encode_positions(positions)
+            elif name == "chrom":
+                raw = _encode_text(chroms)
+            else:
+                raw = _encode_text(table.columns[name].slice(start, stop))
+            chunk = zlib.compress(raw, COMPRESSION_LEVEL)
+            columns[name] = (offset, len(chunk))
+            chunks.append(chunk)
+            offset += len(chunk)
+        directory["groups"].append({"rows": stop - start, "chroms": ranges, "columns": columns})
+    header = zlib.compress(json.dumps(directory, separators=(",", ":")).encode("utf-8"), COMPRESSION_LEVEL)
+    return _HEADER.pack(MAGIC, FORMAT_VERSION, len(header)) + header + b"".join(chunks)
+
+
+class VariantBlobReader:
+    """
+    Random access to a blob from ``encode_variants``.
+
+    Inflated column chunks are kept for the reader's lifetime, so repeated
+    queries on one reader decode each chunk at most once; ``decoded_chunks``
+    counts them.
+
+    Raises:
+        ValueError: If ``blob`` is not a variant blob of a supported version
+    """
+
+    def __init__(self, blob: bytes):
+        if len(blob) < _HEADER.size:
+            raise ValueError("Not a variant blob")
+        magic, version, header_size = _HEADER.unpack_from(blob)
+        if magic != MAGIC:
+            raise ValueError("Not a variant blob")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported variant blob version {version}")
+        start = _HEADER.size
+        directory = json.loads(zlib.decompress(blob[start:start + header_size]))
+        self._blob = memoryview(blob)
+        self._data_start = start + header_size
+        self.fields: List[str] = directory["fields"]
+        self.groups: List[Dict[str, Any]] = directory["groups"]
+        self.rows: int = directory["rows"]
+        self._chunks: Dict[Tuple[int, str], List[Any]] = {}
+        self.decoded_chunks = 0
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def _column(self, group: int, name: str) -> List[Any]:
+        key = (group, name)
+        values = self._chunks.get(key)
+        if values is None:
+            offset, length = self.groups[group]["columns"][name]
+            start = self._data_start + offset
+            raw = zlib.decompress(self._blob[start:start + length])
+            if name == "pos":
+                values = _decode_positions(raw)
+            else:
+                values = raw.decode("utf-8").split("\n") if self.groups[group]["rows"] else []
+            self._chunks[key] = values
+            self.decoded_chunks += 1
+        return values
+
+    def _rows(self, group: int, indices: Iterable[int], fields: Sequence[str]) -> List[Dict[str, Any]]:
+        columns = [(name, self._column(group, name)) for name in fields]
+        return [{name: values[i] for name, values in columns} for i in indices]
+
+    def region(self, chrom: str, start: int, end: int, fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """Variants on ``chrom`` (compared without a 'chr' prefix) with ``start <= pos <= end``, in stored order"""
+        key = normalize_chrom(chrom)
+        fields = fields or self.fields
+        found: List[Dict[str, Any]] = []
+        for g, group in enumerate(self.groups):
+            names = {
+                name for name, (low, high) in group["chroms"].items()
+                if normalize_chrom(name) == key and low <= end and high >= start
+            }
+            if not names:
+                continue
+            chroms = self._column(g, "chrom")
+            positions = self._column(g, "pos")
+            hits = [i for i, pos in enumerate(positions) if start <= pos <= end and chroms[i] in names]
+            if hits:
+                found.extend(self._rows(g, hits, fields))
+        return found
+
+    def rs_ids(self, rs_ids: Iterable[str], fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """Variants whose ID is one of ``rs_ids``, in stored order"""
+        wanted = set(rs_ids)
+        fields = fields or self.fields
+        found: List[Dict[str, Any]] = []
+        for g in range(len(self.groups)):
+            hits = [i for i, variant_id in enumerate(self._column(g, "id")) if variant_id in wanted]
+            if hits:
+                found.extend(self._rows(g, hits, fields))
+        return found
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for g, group in enumerate(self.groups):
+            yield from self._rows(g, range(group["rows"]), self.fields)
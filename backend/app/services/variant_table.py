@@ -0,0 +1,434 @@
+"""Compact columnar storage for parsed VCF variants"""
+from array import array
+import re
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
+
+# Column order of a variant record (matches the dicts produced by iter_vcf)
+VARIANT_FIELDS = ("chrom", "pos", "id", "ref", "alt", "qual", "filter", "info", "genotype")
+
+# Genotype codes stored in a GenotypeMatrix (number of non-reference alleles)
+GT_HOM_REF = 0
+GT_HET = 1
+GT_HOM_ALT = 2
+GT_MISSING = 3
+
+GT_CODE_STRINGS = {GT_HOM_REF: "0/0", GT_HET: "0/1", GT_HOM_ALT: "1/1", GT_MISSING: "./."}
+
+# Translation table mapping genotype codes to 1 for carriers (het/hom-alt), else 0
+CARRIER_TABLE = bytes(1 if code in (GT_HET, GT_HOM_ALT) else 0 for code in range(256))
+
+# Extracts the GT sub-field (text up to the first ':') of every sample column
+_GT_FIELD = re.compile(r"(?:^|\t)([^\t:]*)")
+
+
+class InternedColumn:
+    """String column storing each distinct value once and a small integer code per row"""
+
+    __slots__ = ("codes", "values", "_lookup")
+
+    def __init__(self):
+        self.codes = array("I")
+        self.values: List[str] = []
+        self._lookup: Dict[str, int] = {}
+
+    def append(self, value: str) -> None:
+        code = self._lookup.get(value)
+        if code is None:
+            code = len(self.values)
+            self._lookup[value] = code
+            self.values.append(value)
+        self.codes.append(code)
+
+    def __getitem__(self, index: int) -> str:
+        return self.values[self.codes[index]]
+
+    def slice(self, start: int, stop: int) -> List[str]:
+        """Values of rows ``start``..``stop - 1``"""
+        values = self.values
+        return [values[code] for code in self.codes[start:stop]]
+
+    def extend(self, other: "InternedColumn") -> None:
+        """Append another column, re-mapping its codes onto this column's values"""
+        remap = []
+        for value in other.values:
+            code = self._lookup.get(value)
+            if code is None:
+                code = len(self.values)
+                self._lookup[value] = code
+                self.values.append(value)
+            remap.append(code)
+        self.codes.extend(array("I", map(remap.__getitem__, other.codes)))
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.itemsize * len(self.codes) + sum(len(v) + 49 for v in self.values)
+
+
+class OffsetColumn:
+    """High-cardinality string column packed into one UTF-8 buffer plus end offsets"""
+
+    __slots__ = ("data", "offsets")
+
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = array("Q", [0])
+
+    def append(self, value: str) -> None:
+        self.data += value.encode("utf-8")
+        self.offsets.append(len(self.data))
+
+    def __getitem__(self, index: int) -> str:
+        return self.data[self.offsets[index]:self.offsets[index + 1]].decode("utf-8")
+
+    def slice(self, start: int, stop: int) -> List[str]:
+        """Values of rows ``start``..``stop - 1``, decoding the buffer once"""
+        offsets = self.offsets[start:stop + 1]
+        base = offsets[0]
+        chunk = bytes(self.data[base:offsets[-1]])
+        if chunk.isascii():
+            text = chunk.decode("ascii")
+            return [text[a - base:b - base] for a, b in zip(offsets, offsets[1:])]
+        return [chunk[a - base:b - base].decode("utf-8") for a, b in zip(offsets, offsets[1:])]
+
+    def extend(self, other: "OffsetColumn") -> None:
+        """Append another column, shifting its offsets past this column's data"""
+        base = len(self.data)
+        self.data += other.data
+        self.offsets.extend(array("Q", (offset + base for offset in other.offsets[1:])))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data) + self.offsets.itemsize * len(self.offsets)
+
+
+def decode_gt(gt: str) -> int:
+    """Map a GT string such as '0/1', '1|1', './.' or '1' to a genotype code"""
+    alleles = gt.replace("|", "/").split("/")
+    if not gt or any(a in (".", "") for a in alleles):
+        return GT_MISSING
+    non_ref = sum(1 for a in alleles if a != "0")
+    if non_ref == 0:
+        return GT_HOM_REF
+    if len(alleles) == 1 or non_ref == len(alleles):
+        return GT_HOM_ALT
+    return GT_HET
+
+
+def decode_allele_gt(gt: str, allele: int) -> int:
+    """
+    Genotype code of a GT string counting only copies of ALT allele
+    ``allele`` (from 1), e.g. '1/2' is GT_HET and '1/1' GT_HOM_REF for
+    allele 2 of a multi-allelic record
+    """
+    alleles = gt.replace("|", "/").split("/")
+    if not gt or any(a in (".", "") for a in alleles):
+        return GT_MISSING
+    copies = alleles.count(str(allele))
+    if copies == 0:
+        return GT_HOM_REF
+    if copies == len(alleles):
+        return GT_HOM_ALT
+    return GT_HET
+
+
+class _GtCodeCache(dict):
+    """Memo of GT string -> code; cohorts only ever use a handful of distinct GTs"""
+
+    def __missing__(self, gt: str) -> int:
+        code = self[gt] = decode_gt(gt)
+        return code
+
+
+class _AlleleGtCodeCache(dict):
+    """Memo of (GT string, ALT allele) -> code (see ``decode_allele_gt``)"""
+
+    def __missing__(self, key: Tuple[str, int]) -> int:
+        code = self[key] = decode_allele_gt(*key)
+        return code
+
+
+_gt_codes = _GtCodeCache()
+allele_gt_codes = _AlleleGtCodeCache()
+
+
+def has_gt(fmt: str) -> bool:
+    """Whether a FORMAT column starts with the GT key (the only place the spec allows it)"""
+    return fmt == "GT" or fmt.startswith("GT:")
+
+
+def sample_gt_code(fmt: str, sample: str) -> int:
+    """
+    Genotype code of a sample column described by FORMAT ``fmt``.
+
+    This is the one decoder for a sample's call: without a GT key the call
+    is missing, whatever the first subfield holds.
+    """
+    if not has_gt(fmt):
+        return GT_MISSING
+    return _gt_codes[sample.partition(":")[0]]
+
+
+class GenotypeMatrix:
+    """
+    Packed variants x samples genotype matrix, one byte code per call.
+
+    Rows are appended per variant; a sample's calls across all variants are
+    a strided slice of the buffer, so per-sample work stays in C.
+
+    A code only counts non-reference alleles, so rows with a multi-allelic
+    ALT also keep each sample's GT (as an index into the distinct GTs
+    ``gt_values``) in ``allele_gts``; ``row`` decodes them per ALT allele.
+    """
+
+    __slots__ = ("samples", "data", "_cache", "gt_values", "_gt_ids", "allele_gts")
+
+    def __init__(self, samples: Sequence[str]):
+        self.samples = list(samples)
+        self.data = bytearray()
+        self._cache = _GtCodeCache()
+        self.gt_values: List[str] = []
+        self._gt_ids: Dict[str, int] = {}
+        self.allele_gts: Dict[int, array] = {}
+
+    @property
+    def n_samples(self) -> int:
+        return len(self.samples)
+
+    def __len__(self) -> int:
+        return len(self.data) // self.n_samples if self.samples else 0
+
+    def _gt_id(self, gt: str) -> int:
+        gt_id = self._gt_ids.get(gt)
+        if gt_id is None:
+            gt_id = self._gt_ids[gt] = len(self.gt_values)
+            self.gt_values.append(gt)
+        return gt_id
+
+    def append_sample_columns(self, fmt: str, sample_columns: str, multiallelic: bool = False) -> None:
+        """
+        Decode the tab-joined sample columns of one data line (``multiallelic``:
+        its ALT lists several alleles).
+
+        GT values are pulled out of every column with a single regex scan and
+        mapped through a memoized code table.
+        """
+        n = self.n_samples
+        if not has_gt(fmt):
+            self.data += bytes([GT_MISSING]) * n
+            return
+        gts = _GT_FIELD.findall(sample_columns)[:n]
+        if len(gts) < n:
+            gts += ["."] * (n - len(gts))
+        if multiallelic:
+            self.allele_gts[len(self)] = array("I", map(self._gt_id, gts))
+        self.data += bytes(map(self._cache.__getitem__, gts))
+
+    def extend(self, other: "GenotypeMatrix") -> None:
+        """Append the rows of another matrix over the same samples"""
+        if other.samples != self.samples:
+            raise ValueError("Cannot merge tables with different samples")
+        base = len(self)
+        remap = [self._gt_id(gt) for gt in other.gt_values]
+        for variant_index, gt_ids in other.allele_gts.items():
+            self.allele_gts[base + variant_index] = array("I", map(remap.__getitem__, gt_ids))
+        self.data += other.data
+
+    def row(self, variant_index: int, allele: int = 0) -> bytes:
+        """
+        Genotype codes of all samples for one variant; with an ``allele``
+        (from 1) of a multi-allelic variant, codes count only copies of that
+        ALT allele (see ``decode_allele_gt``)
+        """
+        gt_ids = self.allele_gts.get(variant_index) if allele else None
+        if gt_ids is not None:
+            codes = bytes(allele_gt_codes[gt, allele] for gt in self.gt_values)
+            return bytes(map(codes.__getitem__, gt_ids))
+        n = self.n_samples
+        return bytes(self.data[variant_index * n:(variant_index + 1) * n])
+
+    def column(self, sample_index: int) -> bytes:
+        """Genotype codes of one sample across all variants"""
+        return bytes(self.data[sample_index::self.n_samples])
+
+    def carrier_indices(self, sample_index: int, limit: Optional[int] = None) -> List[int]:
+        """Indices of variants where the sample carries a non-reference allele"""
+        flags = self.column(sample_index).translate(CARRIER_TABLE)
+        indices: List[int] = []
+        pos = flags.find(1)
+        while pos != -1 and (limit is None or len(indices) < limit):
+            indices.append(pos)
+            pos = flags.find(1, pos + 1)
+        return indices
+
+    def carrier_count(self, sample_index: int) -> int:
+        column = self.column(sample_index)
+        return column.count(GT_HET) + column.count(GT_HOM_ALT)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data) + sum(gt_ids.itemsize * len(gt_ids) for gt_ids in self.allele_gts.values())
+
+
+class VariantRow(Mapping):
+    """
+    Read-only, dict-compatible view of one row of a VariantTable.
+
+    Supports ``row["pos"]``, ``row.get(...)``, iteration over keys and
+    ``dict(row)``, so code written against variant dicts keeps working.
+    """
+
+    __slots__ = ("_table", "_index")
+
+    def __init__(self, table: "VariantTable", index: int):
+        self._table = table
+        self._index = index
+
+    def __getitem__(self, key: str) -> Any:
+        column = self._table.columns.get(key)
+        if column is None:
+            raise KeyError(key)
+        return column[self._index]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(VARIANT_FIELDS)
+
+    def __len__(self) -> int:
+        return len(VARIANT_FIELDS)
+
+    def __repr__(self) -> str:
+        return f"VariantRow({dict(self)!r})"
+
+    @property
+    def gt_code(self) -> int:
+        """Genotype code of the call (see ``sample_gt_code``)"""
+        return self._table.gt_codes[self._index]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self)
+
+
+class SampleVariantRow(VariantRow):
+    """VariantRow whose ``genotype`` is one cohort sample's call"""
+
+    __slots__ = ("_sample",)
+
+    def __init__(self, table: "VariantTable", index: int, sample: int):
+        super().__init__(table, index)
+        self._sample = sample
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "genotype":
+            return GT_CODE_STRINGS[self.gt_code]
+        return super().__getitem__(key)
+
+    @property
+    def gt_code(self) -> int:
+        genotypes = self._table.genotypes
+        return genotypes.data[self._index * genotypes.n_samples + self._sample]
+
+
+class VariantTable(Sequence):
+    """
+    Columnar variant store.
+
+    Positions live in a typed ``array``; low-cardinality strings (chrom,
+    alleles, qual, filter, genotype) are interned and high-cardinality ones
+    (id, info) are offset-encoded in a single buffer. Rows are exposed as
+    ``VariantRow`` views, so the table can be handed to anything that
+    expects a list of variant dicts without copying.
+
+    ``gt_codes`` holds the genotype code of each row's (first sample's)
+    call, decoded with FORMAT in view when the row is appended, since the
+    table does not keep FORMAT. Multi-sample (cohort) tables additionally
+    carry a ``GenotypeMatrix`` in ``genotypes``; the ``genotype`` column
+    then holds the first sample's raw call for compatibility.
+    """
+
+    def __init__(self, samples: Optional[Sequence[str]] = None):
+        self.chrom = InternedColumn()
+        self.pos = array("q")
+        self.id = OffsetColumn()
+        self.ref = InternedColumn()
+        self.alt = InternedColumn()
+        self.qual = InternedColumn()
+        self.filter = InternedColumn()
+        self.info = OffsetColumn()
+        self.genotype = InternedColumn()
+        self.gt_codes = array("B")
+        self.columns: Dict[str, Any] = {name: getattr(self, name) for name in VARIANT_FIELDS}
+        self.genotypes: Optional[GenotypeMatrix] = GenotypeMatrix(samples) if samples else None
+
+    @property
+    def samples(self) -> List[str]:
+        return self.genotypes.samples if self.genotypes is not None else []
+
+    def append(
+        self,
+        chrom: str,
+        pos: int,
+        id: str,
+        ref: str,
+        alt: str,
+        qual: str,
+        filter: str,
+        info: str,
+        genotype: str,
+        gt_code: Optional[int] = None,
+    ) -> None:
+        """
+        Append a row. ``gt_code`` is the code of the call (``sample_gt_code``);
+        when omitted, ``genotype`` is taken to start with GT.
+        """
+        self.chrom.append(chrom)
+        self.pos.append(pos)
+        self.id.append(id)
+        self.ref.append(ref)
+        self.alt.append(alt)
+        self.qual.append(qual)
+        self.filter.append(filter)
+        self.info.append(info)
+        self.genotype.append(genotype)
+        self.gt_codes.append(_gt_codes[genotype.partition(":")[0]] if gt_code is None else gt_code)
+
+    def append_record(self, record: Mapping[str, Any]) -> None:
+        """Append a variant dict, ``VcfRecord`` or ``VariantRow`` (the latter two keep their FORMAT-aware ``gt_code``)"""
+        self.append(*(record[name] for name in VARIANT_FIELDS), gt_code=getattr(record, "gt_code", None))
+
+    def extend_table(self, other: "VariantTable") -> None:
+        """Append all rows of another table (e.g. a chunk parsed in a worker process)"""
+        for name in VARIANT_FIELDS:
+            self.columns[name].extend(other.columns[name])
+        self.gt_codes.extend(other.gt_codes)
+        if self.genotypes is not None:
+            if other.genotypes is None:
+                raise ValueError("Cannot merge tables with different samples")
+            self.genotypes.extend(other.genotypes)
+
+    def __len__(self) -> int:
+        return len(self.pos)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[VariantRow, List[VariantRow]]:
+        if isinstance(index, slice):
+            return [VariantRow(self, i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("variant index out of range")
+        return VariantRow(self, index)
+
+    def __iter__(self) -> Iterator[VariantRow]:
+        for i in range(len(self)):
+            yield VariantRow(self, i)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the columns"""
+        return self.pos.itemsize * len(self.pos) + len(self.gt_codes) + sum(
+            column.nbytes for name, column in self.columns.items() if name != "pos"
+        ) + (self.genotypes.nbytes if self.genotypes is not None else 0)
@@ -1,44 +1,473 @@
 """VCF v4.2 Parser"""
-from typing import Dict, Any, List
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Dict, Any, List, Iterator, Iterable, Optional, Sequence, Tuple, Union
+import multiprocessing
+import os
+import threading
+from .tabix import Region, TabixIndex, iter_region_lines, normalize_chrom, read_header_lines
+from .variant_table import GT_MISSING, VariantTable, sample_gt_code
+from .vcf_record import VcfRecord
 
+# Read size used when pulling lines out of file-like objects
+READ_CHUNK_SIZE = 64 * 1024
 
-def parse_vcf(content: str) -> Dict[str, Any]:
-    lines = content.strip().split("\n")
-    metadata: Dict[str, str] = {}
-    variants: List[Dict[str, Any]] = []
-    sample_id = "UNKNOWN"
+# Default size (in characters) of the body chunks handed to parser processes
+PARALLEL_CHUNK_SIZE = 1024 * 1024
 
+# Required prefix of the first line of a VCF file
+FILEFORMAT_PREFIX = "##fileformat=VCF"
+
+VcfSource = Union[str, bytes, bytearray, memoryview, Any]
+
+
+class VcfFormatError(ValueError):
+    """Raised when a VCF header is malformed (detected before any data line is parsed)"""
+
+
+class LinePrefilter:
+    """
+    Cheap test deciding whether a data line is worth parsing in full.
+
+    Only the first columns are looked at: a line is kept when its ID is in
+    ``rs_ids`` or its position falls inside one of ``intervals`` (chrom ->
+    list of 1-based inclusive (start, end), searched with bisect). The first
+    ``passthrough`` lines are always kept. Rejected lines that would have
+    parsed as variants are counted in ``skipped`` so callers can still
+    report exact totals. The targets may be narrowed while parsing is under
+    way (see ``configure``).
+    """
+
+    __slots__ = ("rs_ids", "starts", "ends", "passthrough", "skipped")
+
+    def __init__(
+        self,
+        rs_ids: Iterable[str] = (),
+        intervals: Optional[Dict[str, List[Tuple[int, int]]]] = None,
+        passthrough: int = 0,
+    ):
+        self.passthrough = passthrough
+        self.skipped = 0
+        self.configure(rs_ids, intervals or {})
+
+    def configure(self, rs_ids: Iterable[str], intervals: Dict[str, List[Tuple[int, int]]]) -> None:
+        self.rs_ids = frozenset(rs_ids)
+        self.starts: Dict[str, List[int]] = {}
+        self.ends: Dict[str, List[int]] = {}
+        merged: Dict[str, List[List[int]]] = {}
+        for chrom, spans in intervals.items():
+            spans_for_chrom = merged.setdefault(normalize_chrom(chrom), [])
+            spans_for_chrom.extend([start, end] for start, end in spans)
+        for chrom, spans in merged.items():
+            spans.sort()
+            starts: List[int] = []
+            ends: List[int] = []
+            for start, end in spans:
+                if ends and start <= ends[-1] + 1:
+                    ends[-1] = max(ends[-1], end)
+                else:
+                    starts.append(start)
+                    ends.append(end)
+            self.starts[chrom] = starts
+            self.ends[chrom] = ends
+
+    def keep(self, line: str) -> bool:
+        if self.passthrough > 0:
+            self.passthrough -= 1
+            return True
+        cols = line.split("\t", 5)
+        if len(cols) < 6:
+            return False
+        if cols[2] in self.rs_ids:
+            return True
+        if self.starts:
+            chrom = normalize_chrom(cols[0])
+            starts = self.starts.get(chrom)
+            if starts:
+                i = bisect_right(starts, int(cols[1])) - 1
+                if i >= 0 and int(cols[1]) <= self.ends[chrom][i]:
+                    return True
+        # Same column-count rule as _split_record (at least 8 columns)
+        if cols[5].count("\t") >= 2:
+            self.skipped += 1
+        return False
+
+
+def _iter_text_lines(content: str) -> Iterator[str]:
+    """Yield lines of an in-memory string without building a list of them"""
+    start = 0
+    length = len(content)
+    while start < length:
+        end = content.find("\n", start)
+        if end == -1:
+            end = length
+        yield content[start:end]
+        start = end + 1
+
+
+def _iter_byte_lines(content: Union[bytes, bytearray, memoryview]) -> Iterator[str]:
+    """Yield decoded lines of an in-memory bytes buffer one at a time"""
+    data = bytes(content) if isinstance(content, memoryview) else content
+    start = 0
+    length = len(data)
+    while start < length:
+        end = data.find(b"\n", start)
+        if end == -1:
+            end = length
+        yield data[start:end].decode("utf-8")
+        start = end + 1
+
+
+def _iter_chunk_lines(chunks: Iterable[Union[str, bytes]]) -> Iterator[str]:
+    """Reassemble lines from an iterable of arbitrary text or byte chunks"""
+    pending = b""
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        if not chunk:
+            continue
+        pending += chunk
+        start = 0
+        while True:
+            end = pending.find(b"\n", start)
+            if end == -1:
+                break
+            yield pending[start:end].decode("utf-8")
+            start = end + 1
+        pending = pending[start:]
+    if pending:
+        yield pending.decode("utf-8")
+
+
+def _iter_file_chunks(stream: Any) -> Iterator[Union[str, bytes]]:
+    """Read a file-like object in fixed-size chunks"""
+    while True:
+        chunk = stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+
+def iter_lines(source: VcfSource) -> Iterator[str]:
+    """
+    Iterate over the lines of a VCF source lazily.
+
+    Accepts a string, a bytes-like buffer, a file-like object with ``read()``
+    (text or binary) or any iterable of text/byte chunks.
+    """
+    if isinstance(source, str):
+        return _iter_text_lines(source)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return _iter_byte_lines(source)
+    if hasattr(source, "read"):
+        return _iter_chunk_lines(_iter_file_chunks(source))
+    return _iter_chunk_lines(source)
+
+
+def _parse_header_line(line: str, header: Dict[str, Any]) -> None:
+    """Record a '##' meta line or the '#CHROM' column line into ``header``"""
+    if line.startswith("##"):
+        parts = line[2:].split("=", 1)
+        if len(parts) == 2:
+            header["metadata"][parts[0]] = parts[1]
+    elif line.startswith("#CHROM"):
+        cols = line.split("\t")
+        if len(cols) >= 10:
+            header["sample_id"] = cols[9]
+            header["samples"] = cols[9:]
+
+
+def _split_record(line: str) -> Optional[List[str]]:
+    """
+    Split a data line into columns, or None if it has too few columns.
+
+    All sample columns stay joined in ``cols[9]``, so wide cohort lines are
+    not exploded into one string per sample.
+    """
+    cols = line.split("\t", 9)
+    if len(cols) < 8:
+        return None
+    return cols
+
+
+def _append_columns(table: VariantTable, cols: List[str]) -> None:
+    """Append the columns of a data line to a VariantTable without building a dict"""
+    has_sample = len(cols) >= 10
+    genotype = cols[9].partition("\t")[0] if has_sample else "."
+    table.append(
+        cols[0],
+        int(cols[1]),
+        cols[2] if cols[2] != "." else "",
+        cols[3],
+        cols[4],
+        cols[5],
+        cols[6],
+        cols[7],
+        genotype,
+        sample_gt_code(cols[8], genotype) if has_sample else GT_MISSING,
+    )
+    if table.genotypes is not None:
+        if len(cols) >= 10:
+            table.genotypes.append_sample_columns(cols[8], cols[9], "," in cols[4])
+        else:
+            table.genotypes.append_sample_columns("", "")
+
+
+def _init_header(header: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if header is None:
+        header = {}
+    header.setdefault("metadata", {})
+    header.setdefault("sample_id", "UNKNOWN")
+    header.setdefault("samples", [])
+    return header
+
+
+def _iter_data_columns(
+    lines: Iterable[str],
+    header: Dict[str, Any],
+    validate: bool = True,
+    prefilter: Optional[LinePrefilter] = None,
+) -> Iterator[List[str]]:
+    """
+    Consume header lines into ``header`` and yield the split data lines.
+
+    With ``validate`` the header is checked as it streams past: the first
+    line must be ``##fileformat=VCF...`` and a ``#CHROM`` line must come
+    before the first data line, otherwise ``VcfFormatError`` is raised
+    without reading any further. Data lines rejected by ``prefilter`` are
+    skipped before being split.
+    """
+    expect_fileformat = expect_columns = validate
     for line in lines:
         line = line.strip()
         if not line:
             continue
-        if line.startswith("##"):
-            parts = line[2:].split("=", 1)
-            if len(parts) == 2:
-                metadata[parts[0]] = parts[1]
+        if expect_fileformat:
+            if not line.startswith(FILEFORMAT_PREFIX):
+                raise VcfFormatError(f"must start with {FILEFORMAT_PREFIX}")
+            expect_fileformat = False
+        if line.startswith("#"):
+            _parse_header_line(line, header)
+            if line.startswith("#CHROM"):
+                expect_columns = False
             continue
-        if line.startswith("#CHROM"):
-            cols = line.split("\t")
-            if len(cols) >= 10:
-                sample_id = cols[9]
+        if expect_columns:
+            raise VcfFormatError("missing #CHROM header line")
+        if prefilter is not None and not prefilter.keep(line):
             continue
 
-        cols = line.split("\t")
-        if len(cols) >= 8:
-            variants.append({
-                "chrom": cols[0],
-                "pos": int(cols[1]),
-                "id": cols[2] if cols[2] != "." else "",
-                "ref": cols[3],
-                "alt": cols[4],
-                "qual": cols[5],
-                "filter": cols[6],
-                "info": cols[7],
-                "genotype": cols[9] if len(cols) >= 10 else ".",
-            })
+        cols = _split_record(line)
+        if cols is not None:
+            yield cols
+
+    if expect_fileformat:
+        raise VcfFormatError(f"must start with {FILEFORMAT_PREFIX}")
+    if expect_columns:
+        raise VcfFormatError("missing #CHROM header line")
+
+
+def _read_header(lines: Iterable[str], header: Dict[str, Any]) -> None:
+    """Parse and validate a block of header lines into ``header``"""
+    for _ in _iter_data_columns(lines, header):
+        pass
+
+
+def iter_vcf(
+    source: VcfSource,
+    header: Optional[Dict[str, Any]] = None,
+    prefilter: Optional[LinePrefilter] = None,
+) -> Iterator[VcfRecord]:
+    """
+    Stream variants out of a VCF source one record at a time.
+
+    Records are ``VcfRecord`` mappings with the legacy variant dict keys;
+    INFO, FORMAT and GT are only decoded when their accessors are used.
+
+    Header lines are consumed as they are reached. When ``header`` is given it
+    is filled in place with ``sample_id`` and ``metadata`` so callers can read
+    them once the first variant has been yielded (or the stream is exhausted).
+    A malformed header raises ``VcfFormatError`` before any variant is yielded.
+
+    With a ``prefilter`` only the lines it keeps are parsed and yielded; the
+    rest are merely counted in ``prefilter.skipped``.
+    """
+    header = _init_header(header)
+    for cols in _iter_data_columns(iter_lines(source), header, prefilter=prefilter):
+        yield VcfRecord(cols)
+
+
+def read_vcf_table(
+    source: VcfSource,
+    header: Optional[Dict[str, Any]] = None,
+    cohort: bool = False,
+    validate: bool = True,
+) -> VariantTable:
+    """
+    Parse a VCF source straight into a columnar VariantTable.
+
+    With ``cohort=True`` every sample column is decoded into the table's
+    packed ``GenotypeMatrix`` (rows per sample: ``SampleVariantRow``).
+    ``validate=False`` accepts header-less input such as a slice of the body.
+    """
+    header = _init_header(header)
+    table: Optional[VariantTable] = None
+    for cols in _iter_data_columns(iter_lines(source), header, validate):
+        if table is None:
+            table = VariantTable(header["samples"] if cohort else None)
+        _append_columns(table, cols)
+    if table is None:
+        table = VariantTable(header["samples"] if cohort else None)
+    return table
+
+
+def _contig_names(header_lines: Iterable[str]) -> List[str]:
+    """Contig IDs in ``##contig`` header order"""
+    names = []
+    for line in header_lines:
+        if line.startswith("##contig=<") and "ID=" in line:
+            names.append(line.split("ID=", 1)[1].split(",", 1)[0].strip().rstrip(">"))
+    return names
+
+
+def iter_vcf_regions(
+    vcf: Any,
+    index: Any,
+    regions: Sequence[Region],
+    header: Optional[Dict[str, Any]] = None,
+) -> Iterator[VcfRecord]:
+    """
+    Stream only the variants of a bgzipped VCF that fall inside ``regions``.
+
+    ``vcf`` is a path, bytes buffer or seekable binary file; ``index`` is a
+    ``TabixIndex`` or the raw bytes of a .tbi/.csi file. Only the BGZF blocks
+    the index points at are decompressed, so whole-genome files cost roughly
+    as much as the regions they are queried for.
+    """
+    header = _init_header(header)
+    header_lines = read_header_lines(vcf)
+    _read_header(header_lines, header)
+
+    if not isinstance(index, TabixIndex):
+        index = TabixIndex.from_bytes(bytes(index), _contig_names(header_lines))
+
+    for cols in _iter_data_columns(iter_region_lines(vcf, index, regions), header, validate=False):
+        yield VcfRecord(cols)
+
+
+def parse_vcf(content: VcfSource, cohort: bool = False) -> Dict[str, Any]:
+    header: Dict[str, Any] = {}
+    variants = read_vcf_table(content, header, cohort=cohort)
+
+    return {
+        "sample_id": header["sample_id"],
+        "samples": header["samples"],
+        "variants": variants,
+        "metadata": header["metadata"],
+    }
+
+
+def _split_header(content: str) -> Tuple[str, int]:
+    """Return the header block of an in-memory VCF and the offset where the body starts"""
+    start = 0
+    length = len(content)
+    while start < length:
+        end = content.find("\n", start)
+        if end == -1:
+            end = length
+        line = content[start:end].strip()
+        if line and not line.startswith("#"):
+            break
+        start = end + 1
+    start = min(start, length)
+    return content[:start], start
+
+
+def split_body_chunks(content: str, body_start: int, chunk_size: int) -> List[Tuple[int, int]]:
+    """Cut ``content[body_start:]`` into ``(start, end)`` spans of about ``chunk_size`` ending on line boundaries"""
+    spans: List[Tuple[int, int]] = []
+    start = body_start
+    length = len(content)
+    while start < length:
+        end = content.find("\n", min(start + chunk_size, length) - 1)
+        end = length if end == -1 else end + 1
+        spans.append((start, end))
+        start = end
+    return spans
+
+
+def _parse_chunk(chunk: str, samples: Optional[List[str]]) -> VariantTable:
+    """Worker entry point: parse header-less data lines into a VariantTable"""
+    header = {"samples": samples or []}
+    return read_vcf_table(chunk, header, cohort=samples is not None, validate=False)
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+
+def get_parse_executor(workers: int) -> ProcessPoolExecutor:
+    """
+    Shared process pool for chunked parsing, created on first use.
+
+    Workers are spawned rather than forked so they never inherit the event
+    loop, database connections or locks of the API process.
+    """
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _executor_workers = workers
+        return _executor
+
+
+def shutdown_parse_executor() -> None:
+    """Stop the parser process pool (called on application shutdown)"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True, cancel_futures=True)
+            _executor = None
+
+
+def parse_vcf_parallel(
+    content: str,
+    cohort: bool = False,
+    workers: Optional[int] = None,
+    chunk_size: int = PARALLEL_CHUNK_SIZE,
+) -> Dict[str, Any]:
+    """
+    ``parse_vcf`` for large in-memory VCF text using a process pool.
+
+    The header is parsed here; the body is split on line boundaries into
+    ``chunk_size`` pieces that are parsed into VariantTables by worker
+    processes and appended in file order, so the result is identical to
+    ``parse_vcf``. ``workers`` defaults to the CPU count; with one worker or
+    a single chunk the body is parsed serially in-process.
+    """
+    header = _init_header({})
+    header_text, body_start = _split_header(content)
+    _read_header(iter_lines(header_text), header)
+
+    samples = header["samples"] if cohort else None
+    workers = workers or os.cpu_count() or 1
+    spans = split_body_chunks(content, body_start, max(chunk_size, 1))
+
+    if workers <= 1 or len(spans) <= 1:
+        variants = _parse_chunk(content[body_start:], samples)
+    else:
+        variants = VariantTable(samples)
+        executor = get_parse_executor(workers)
+        chunks = (content[start:end] for start, end in spans)
+        for table in executor.map(_parse_chunk, chunks, repeat(samples)):
+            variants.extend_table(table)
 
     return {
-        "sample_id": sample_id,
+        "sample_id": header["sample_id"],
+        "samples": header["samples"],
         "variants": variants,
-        "metadata": metadata,
+        "metadata": header["metadata"],
     }
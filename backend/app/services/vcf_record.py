@@ -0,0 +1,153 @@
+"""Lazily decoded VCF data records"""
+from typing import Any, Dict, List, Optional, Union
+
+from .variant_table import GT_HET, GT_HOM_ALT, GT_HOM_REF, GT_MISSING, has_gt, sample_gt_code
+
+InfoValue = Union[str, bool]
+
+ZYGOSITY_NAMES = {
+    GT_HOM_REF: "hom_ref",
+    GT_HET: "het",
+    GT_HOM_ALT: "hom_alt",
+    GT_MISSING: "missing",
+}
+
+
+def parse_info(info: str) -> Dict[str, InfoValue]:
+    """Split an INFO column into key -> value (``True`` for flags)"""
+    fields: Dict[str, InfoValue] = {}
+    if not info or info == ".":
+        return fields
+    for item in info.split(";"):
+        key, sep, value = item.partition("=")
+        if key:
+            fields[key] = value if sep else True
+    return fields
+
+
+def _to_int(value: Optional[InfoValue]) -> Optional[int]:
+    if not isinstance(value, str):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+def _to_float(value: Optional[InfoValue]) -> Optional[float]:
+    if not isinstance(value, str):
+        return None
+    try:
+        # Multi-allelic values are comma separated; report the first ALT
+        return float(value.split(",", 1)[0])
+    except ValueError:
+        return None
+
+
+class VcfRecord(dict):
+    """
+    One VCF data line, decoded on demand.
+
+    It is the legacy variant dict (``chrom``, ``pos``, ``id``, ``ref``,
+    ``alt``, ``qual``, ``filter``, ``info``, ``genotype``, where ``info`` and
+    ``genotype`` are the raw INFO and first-sample columns), so key lookups
+    stay as fast as before. The typed accessors (``info_fields``,
+    ``format_keys``, ``sample_fields``, ``gt``, ``zygosity``, ``dp``, ``gq``,
+    ``af``) split those columns on first use and cache the result, so
+    callers that never read them pay nothing.
+    """
+
+    __slots__ = ("format", "_info", "_format", "_sample", "_gt", "_gt_code")
+
+    def __init__(self, cols: List[str]):
+        has_sample = len(cols) >= 10
+        super().__init__(
+            chrom=cols[0],
+            pos=int(cols[1]),
+            id=cols[2] if cols[2] != "." else "",
+            ref=cols[3],
+            alt=cols[4],
+            qual=cols[5],
+            filter=cols[6],
+            info=cols[7],
+            genotype=cols[9].partition("\t")[0] if has_sample else ".",
+        )
+        # FORMAT only means something when there is a sample column to describe
+        self.format = cols[8] if has_sample else ""
+        self._info: Optional[Dict[str, InfoValue]] = None
+        self._format: Optional[List[str]] = None
+        self._sample: Optional[Dict[str, str]] = None
+        self._gt: Optional[str] = None
+        self._gt_code: Optional[int] = None
+
+    def __reduce__(self):
+        return (_rebuild_record, (dict(self), self.format))
+
+    # Decoded fields
+
+    @property
+    def info_fields(self) -> Dict[str, InfoValue]:
+        if self._info is None:
+            self._info = parse_info(self["info"])
+        return self._info
+
+    @property
+    def format_keys(self) -> List[str]:
+        if self._format is None:
+            fmt = self.format
+            self._format = fmt.split(":") if fmt and fmt != "." else []
+        return self._format
+
+    @property
+    def sample_fields(self) -> Dict[str, str]:
+        """FORMAT key -> value for the first sample (trailing dropped fields are omitted)"""
+        if self._sample is None:
+            values = self["genotype"].split(":") if self.format else []
+            self._sample = dict(zip(self.format_keys, values))
+        return self._sample
+
+    @property
+    def gt(self) -> str:
+        """GT of the first sample, or '.' when there is none"""
+        if self._gt is None:
+            self._gt = self["genotype"].partition(":")[0] if has_gt(self.format) else "."
+        return self._gt
+
+    @property
+    def gt_code(self) -> int:
+        """Genotype code (see ``variant_table.GT_*`` and ``sample_gt_code``)"""
+        if self._gt_code is None:
+            self._gt_code = sample_gt_code(self.format, self["genotype"])
+        return self._gt_code
+
+    @property
+    def zygosity(self) -> str:
+        """'hom_ref', 'het', 'hom_alt' or 'missing'"""
+        return ZYGOSITY_NAMES[self.gt_code]
+
+    @property
+    def is_carrier(self) -> bool:
+        return self.gt_code in (GT_HET, GT_HOM_ALT)
+
+    @property
+    def dp(self) -> Optional[int]:
+        """Read depth: the sample's FORMAT DP, else INFO DP"""
+        value = _to_int(self.sample_fields.get("DP"))
+        return value if value is not None else _to_int(self.info_fields.get("DP"))
+
+    @property
+    def gq(self) -> Optional[int]:
+        return _to_int(self.sample_fields.get("GQ"))
+
+    @property
+    def af(self) -> Optional[float]:
+        """INFO AF of the first ALT allele"""
+        return _to_float(self.info_fields.get("AF"))
+
+
+def _rebuild_record(fields: Dict[str, Any], fmt: str) -> VcfRecord:
+    record = VcfRecord.__new__(VcfRecord)
+    record.update(fields)
+    record.format = fmt
+    record._info = record._format = record._sample = record._gt = record._gt_code = None
+    return record
@@ -0,0 +1,176 @@
+"""
+Incremental reading of upload request bodies with size limits.
+
+Limits are checked on every chunk as it arrives, so an oversized upload is
+rejected as soon as it crosses its limit, whether or not the client sent a
+Content-Length header.
+
+- ``read_form`` parses ``multipart/form-data`` as it arrives (starlette's
+  parser): fields are kept in memory, file parts are spooled (memory, then
+  disk) with a limit per part name, which earlier parts may raise
+- ``spool_body`` spools a raw body the same way
+- ``StreamedBody`` hands a raw request body to a worker thread chunk by
+  chunk, so decompression and parsing run while the body is still arriving
+- ``iter_spooled`` reads a spooled part back in chunks
+
+Neither way holds a whole compressed body in memory.
+"""
+from typing import AsyncIterator, Dict, Iterator, Mapping, Optional
+from tempfile import SpooledTemporaryFile
+import hashlib
+
+import anyio
+from starlette.datastructures import FormData, Headers, UploadFile
+from starlette.formparsers import MultiPartParser
+
+
+class UploadTooLarge(ValueError):
+    """Raised when a request body or one of its parts exceeds its limit"""
+
+    def __init__(self, size: int, limit: int):
+        super().__init__(f"Upload of at least {size} bytes exceeds the limit of {limit} bytes")
+        self.size = size
+        self.limit = limit
+
+
+async def _limited(stream: AsyncIterator[bytes], limit: int) -> AsyncIterator[bytes]:
+    size = 0
+    async for chunk in stream:
+        size += len(chunk)
+        if size > limit:
+            raise UploadTooLarge(size, limit)
+        yield chunk
+
+
+class _LimitedMultiPartParser(MultiPartParser):
+    """``MultiPartParser`` rejecting file parts larger than their limit (unknown file parts: 0 bytes)"""
+
+    def __init__(
+        self,
+        headers: Headers,
+        stream: AsyncIterator[bytes],
+        file_limits: Dict[str, int],
+        raised_limits: Optional[Mapping[str, Mapping[str, int]]] = None,
+    ):
+        super().__init__(headers, stream)
+        self._file_limits = dict(file_limits)
+        self._raised_limits = raised_limits or {}
+        self._part_size = 0
+
+    def on_part_begin(self) -> None:
+        super().on_part_begin()
+        self._part_size = 0
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._current_part.file is not None:
+            self._part_size += end - start
+            limit = self._file_limits.get(self._current_part.field_name, 0)
+            if self._part_size > limit:
+                raise UploadTooLarge(self._part_size, limit)
+        super().on_part_data(data, start, end)
+
+    def on_part_end(self) -> None:
+        if self._current_part.file is not None:
+            self._file_limits.update(self._raised_limits.get(self._current_part.field_name, {}))
+        super().on_part_end()
+
+
+async def read_form(
+    headers: Headers,
+    stream: AsyncIterator[bytes],
+    limit: int,
+    file_limits: Dict[str, int],
+    raised_limits: Optional[Mapping[str, Mapping[str, int]]] = None,
+) -> FormData:
+    """
+    Parse a multipart body of at most ``limit`` bytes.
+
+    ``file_limits`` maps the names of the accepted file parts to their
+    maximum size. ``raised_limits`` maps file part names to the limits that
+    apply to the parts after them instead (e.g. a larger ``file`` once an
+    ``index`` part has been received). Close the returned form when done
+    with it.
+
+    Raises:
+        UploadTooLarge: As soon as the body or a file part exceeds its limit
+        starlette.formparsers.MultiPartException: If the body is malformed
+    """
+    return await _LimitedMultiPartParser(headers, _limited(stream, limit), file_limits, raised_limits).parse()
+
+
+async def spool_body(stream: AsyncIterator[bytes], limit: int) -> UploadFile:
+    """
+    A raw body of at most ``limit`` bytes, spooled like a multipart file part.
+    Close it when done with it.
+
+    Raises:
+        UploadTooLarge: As soon as the body exceeds ``limit``
+    """
+    upload = UploadFile(SpooledTemporaryFile(max_size=MultiPartParser.spool_max_size), size=0)
+    try:
+        async for chunk in _limited(stream, limit):
+            await upload.write(chunk)
+    except BaseException:
+        await upload.close()
+        raise
+    return upload
+
+
+def iter_spooled(upload: UploadFile, chunk_size: int) -> Iterator[bytes]:
+    """The content of a spooled file part in ``chunk_size`` pieces (blocking reads; use from a worker thread)"""
+    upload.file.seek(0)
+    while chunk := upload.file.read(chunk_size):
+        yield chunk
+
+
+def spooled_digest(upload: UploadFile, chunk_size: int) -> str:
+    """SHA-256 hex digest of a spooled file part (same as ``content_hash`` of its bytes)"""
+    digest = hashlib.sha256()
+    for chunk in iter_spooled(upload, chunk_size):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+class StreamedBody:
+    """
+    A raw request body read on demand, with a size limit.
+
+    ``peek`` reads the start of the body on the event loop; iterating yields
+    the whole body and must happen in a worker thread started by anyio
+    (e.g. ``run_in_threadpool``), which fetches every chunk from the event
+    loop when it needs it. ``size`` counts the bytes received so far.
+    """
+
+    def __init__(self, stream: AsyncIterator[bytes], limit: int):
+        self._stream = stream.__aiter__()
+        self.limit = limit
+        self.size = 0
+        self._head = b""
+
+    async def _next(self) -> Optional[bytes]:
+        """The next chunk, or None at the end of the body"""
+        try:
+            chunk = await self._stream.__anext__()
+        except StopAsyncIteration:
+            return None
+        self.size += len(chunk)
+        if self.size > self.limit:
+            raise UploadTooLarge(self.size, self.limit)
+        return chunk
+
+    async def peek(self, size: int) -> bytes:
+        """The first ``size`` bytes (fewer if the body is shorter)"""
+        while len(self._head) < size:
+            chunk = await self._next()
+            if chunk is None:
+                break
+            self._head += chunk
+        return self._head[:size]
+
+    def __iter__(self) -> Iterator[bytes]:
+        if self._head:
+            head, self._head = self._head, b""
+            yield head
+        while (chunk := anyio.from_thread.run(self._next)) is not None:
+            if chunk:
+                yield chunk
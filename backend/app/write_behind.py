@@ -0,0 +1,217 @@
+"""
+Write-behind persistence: a bounded queue of pending writes committed in
+batches by a background task.
+
+Requests ``submit`` a job and return without waiting for the database.
+``submit`` waits while the queue is full (backpressure) and gives up after
+``submit_timeout``. The worker takes every job queued at the time, up to
+``batch_size``, stages them in one session and commits once. If that
+commit fails, it retries the batch job by job in fresh sessions, so one
+bad job only loses itself. A job that fails is retried up to
+``max_retries`` times, ``retry_backoff`` seconds apart, doubling each
+time; the worker writes nothing else meanwhile, so an unavailable
+database fills the queue and ``submit`` pushes back. A job that still
+fails is appended to the dead-letter file (without one it is dropped),
+logged and counted: the client already has its response, so the file is
+the only copy of its data. ``replay_dead_letters()`` queues those jobs
+again, e.g. on startup.
+
+The dead-letter file holds one JSON document per line, from
+``encode_job`` (``decode_job`` rebuilds the job on replay), so reading it
+never runs code. It is created readable by its owner only (0600): jobs
+carry patient data.
+
+``close()`` stops accepting jobs and waits until every queued job is
+written or dead-lettered; call it on shutdown.
+"""
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import logging
+import os
+import time
+
+import orjson
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger("pharmaguard.write_behind")
+
+# Stages one job's rows in a session without committing
+StageFn = Callable[..., Awaitable[None]]
+# A job as JSON-ready data and back (dead letters)
+EncodeFn = Callable[[Tuple[Any, ...]], Any]
+DecodeFn = Callable[[Any], Tuple[Any, ...]]
+
+
+class WriteBehindClosed(RuntimeError):
+    """Raised by submit() after close()"""
+
+
+def read_dead_letters(path: str, decode: DecodeFn = tuple) -> Iterator[Tuple[Any, ...]]:
+    """Jobs saved in a dead-letter file, oldest first"""
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield decode(orjson.loads(line))
+
+
+def _append_dead_letter(path: str, data: Any) -> None:
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+    with os.fdopen(fd, "ab") as f:
+        # The mode only applies to a new file
+        os.fchmod(fd, 0o600)
+        f.write(orjson.dumps(data) + b"\n")
+
+
+class WriteBehindQueue:
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        stage: StageFn,
+        maxsize: int = 32,
+        batch_size: int = 16,
+        submit_timeout: float = 30.0,
+        max_retries: int = 3,
+        retry_backoff: float = 0.5,
+        dead_letter_path: Optional[str] = None,
+        encode_job: EncodeFn = list,
+        decode_job: DecodeFn = tuple,
+    ):
+        self._sessions = session_factory
+        self._stage = stage
+        self._queue: "asyncio.Queue[Tuple[Any, ...]]" = asyncio.Queue(maxsize)
+        self.batch_size = batch_size
+        self.submit_timeout = submit_timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.dead_letter_path = dead_letter_path
+        self._encode_job = encode_job
+        self._decode_job = decode_job
+        self._worker: Optional[asyncio.Task] = None
+        self._closed = False
+        self._counts = {
+            "submitted": 0, "written": 0, "failed": 0, "retries": 0, "dead_lettered": 0,
+            "batches": 0, "blocked": 0, "timeouts": 0,
+        }
+        self._commit_seconds = 0.0
+
+    async def submit(self, *job: Any) -> None:
+        """
+        Queue ``stage(session, *job)``.
+
+        Raises:
+            asyncio.TimeoutError: If the queue stayed full for ``submit_timeout`` seconds
+            WriteBehindClosed: If the queue is closed
+        """
+        if self._closed:
+            raise WriteBehindClosed("Write-behind queue is closed")
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        if self._queue.full():
+            self._counts["blocked"] += 1
+        try:
+            await asyncio.wait_for(self._queue.put(job), self.submit_timeout)
+        except asyncio.TimeoutError:
+            self._counts["timeouts"] += 1
+            raise
+        self._counts["submitted"] += 1
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _write(self, batch: List[Tuple[Any, ...]]) -> None:
+        if await self._commit(batch):
+            return
+        if len(batch) > 1:
+            logger.warning(f"Write-behind batch of {len(batch)} failed; retrying jobs one by one")
+        for job in batch:
+            for attempt in range(self.max_retries):
+                await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+                self._counts["retries"] += 1
+                if await self._commit([job]):
+                    break
+            else:
+                await self._dead_letter(job)
+
+    async def _commit(self, batch: List[Tuple[Any, ...]]) -> bool:
+        """Stage and commit ``batch`` in one session; False if that failed"""
+        start = time.perf_counter()
+        try:
+            async with self._sessions() as db:
+                for job in batch:
+                    await self._stage(db, *job)
+                await db.commit()
+        except Exception as e:
+            logger.warning(f"Write-behind commit of {len(batch)} job(s) failed: {e}")
+            return False
+        self._counts["written"] += len(batch)
+        self._counts["batches"] += 1
+        self._commit_seconds += time.perf_counter() - start
+        return True
+
+    async def _dead_letter(self, job: Tuple[Any, ...]) -> None:
+        self._counts["failed"] += 1
+        if not self.dead_letter_path:
+            logger.error(f"Write-behind job failed {1 + self.max_retries} times and was dropped (no dead-letter file)")
+            return
+        try:
+            data = self._encode_job(job)
+            await asyncio.to_thread(_append_dead_letter, self.dead_letter_path, data)
+        except Exception as e:
+            logger.error(f"Write-behind job failed and could not be saved to {self.dead_letter_path}: {e}", exc_info=True)
+            return
+        self._counts["dead_lettered"] += 1
+        logger.error(f"Write-behind job failed {1 + self.max_retries} times; saved to {self.dead_letter_path}")
+
+    async def replay_dead_letters(self) -> int:
+        """
+        Queue the jobs of the dead-letter file again and wait until they
+        are written; returns how many were queued. The file is moved
+        aside while they are and removed afterwards (jobs that fail again
+        are dead-lettered anew); a file left by an interrupted replay is
+        replayed first.
+        """
+        path = self.dead_letter_path
+        if not path:
+            return 0
+        replaying = path + ".replay"
+        if not os.path.exists(replaying):
+            if not os.path.exists(path):
+                return 0
+            os.replace(path, replaying)
+        jobs = await asyncio.to_thread(lambda: list(read_dead_letters(replaying, self._decode_job)))
+        for job in jobs:
+            await self.submit(*job)
+        await self._queue.join()
+        os.remove(replaying)
+        return len(jobs)
+
+    async def close(self) -> None:
+        """Reject new jobs and wait until the queued ones are written"""
+        self._closed = True
+        if self._worker is not None and not self._worker.done():
+            await self._queue.join()
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._worker = None
+
+    def stats(self) -> Dict[str, Any]:
+        batches = self._counts["batches"]
+        return {
+            **self._counts,
+            "queued": self._queue.qsize(),
+            "maxsize": self._queue.maxsize,
+            "mean_batch": round(self._counts["written"] / batches, 2) if batches else 0,
+            "mean_batch_ms": round(self._commit_seconds / batches * 1000, 2) if batches else 0,
+        }
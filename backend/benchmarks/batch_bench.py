@@ -0,0 +1,41 @@
+"""
+Per-patient overhead benchmark: ``analyze_variants`` in a loop vs ``analyze_batch``.
+
+Usage (from backend/)::
+
+    python -m benchmarks.batch_bench [--patients 2000] [--variants 200]
+"""
+import argparse
+import time
+
+from app.services.pgx_engine import analyze_batch, analyze_variants
+from app.services.vcf_parser import parse_vcf
+from .parser_bench import BENCH_DRUGS
+from .synthetic import make_vcf
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Batch analysis benchmark")
+    parser.add_argument("--patients", type=int, default=2000)
+    parser.add_argument("--variants", type=int, default=200, help="variants per patient")
+    args = parser.parse_args()
+
+    # A few distinct files reused round-robin; parsing is not measured
+    files = [parse_vcf(make_vcf(args.variants, pgx_fraction=0.02, seed=seed))["variants"] for seed in range(16)]
+    patients = [(f"P{n}", files[n % len(files)]) for n in range(args.patients)]
+
+    start = time.perf_counter()
+    for patient_id, variants in patients:
+        analyze_variants({"variants": variants}, patient_id, BENCH_DRUGS)
+    loop = time.perf_counter() - start
+
+    start = time.perf_counter()
+    analyze_batch(((patient_id, {"variants": variants}) for patient_id, variants in patients), BENCH_DRUGS)
+    batch = time.perf_counter() - start
+
+    for name, seconds in (("analyze_variants loop", loop), ("analyze_batch", batch)):
+        print(f"{name:<22} {seconds:8.3f} s {args.patients / seconds:>10,.0f} patients/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Analysis engine micro-benchmarks with stored baselines.
+
+Tracks the per-call cost of ``analyze_variants`` across variant, drug and
+rule counts, and of building and serializing reports (``assemble_report``:
+risk sort and summary; ``ClinicalReport.to_json``). Variants are parsed
+before timing, so parsing (see ``parser_bench``) is not included. Rule
+counts are scaled with a temporary knowledge base holding extra rules at
+loci the input does not contain.
+
+Every case is timed with ``timeit`` (auto-ranged call count, best of
+``--repeat`` interleaved rounds). In every round a fixed pure-Python
+reference workload, which no change to the code under test affects, is
+timed right before each case, and the case's cost relative to it (median
+over the rounds) is what ``--check`` compares against
+``baselines/engine_bench.json``. Background load and machine speed then
+largely cancel out, so the stored baselines remain usable on other
+machines and under load; absolute times are stored and printed for
+reference only. Re-save (``--save``) after a change meant to cost time.
+
+Usage (from backend/)::
+
+    python -m benchmarks.engine_bench                  # run and compare
+    python -m benchmarks.engine_bench --save           # store new baselines
+    python -m benchmarks.engine_bench --check --threshold 20
+                                                       # exit 1 on a >20% slowdown
+    python -m benchmarks.engine_bench --case analyze/variants
+"""
+import argparse
+import dataclasses
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import timeit
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.services.knowledge_base import DEFAULT_PATH, get_knowledge_base, reload_knowledge_base
+from app.services.pgx_engine import PREVIEW_VARIANTS, analyze_variants, assemble_report
+from app.services.vcf_parser import iter_vcf
+from .parser_bench import BENCH_DRUGS, _git_revision
+from .synthetic import CHROMS, make_vcf
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "engine_bench.json")
+
+# Allowed slowdown in percent before --check fails
+DEFAULT_THRESHOLD = 25.0
+
+VARIANT_COUNTS = [1000, 10000, 100000]
+DRUG_COUNTS = [1, 3, 6]
+EXTRA_RULES = [100, 1000]
+
+# Variants per input of the drug and rule count cases
+FIXED_VARIANTS = 10000
+
+REPORT_DRUGS = 10
+
+_REFERENCE_KEYS = [(CHROMS[i % len(CHROMS)], i * 7919 % 100003) for i in range(20000)]
+_REFERENCE_INDEX = {(chrom, pos): (chrom, pos, "A", "G") for chrom, pos in _REFERENCE_KEYS[::3]}
+
+
+def _reference() -> int:
+    """Fixed work like the engine's (dict lookups, small strings and tuples) that no code change affects"""
+    hits = 0
+    for chrom, pos in _REFERENCE_KEYS:
+        entry = _REFERENCE_INDEX.get((chrom.lower(), pos))
+        if entry is not None and entry[3] in "A,G".split(","):
+            hits += 1
+    return hits
+
+
+def _variants(n: int) -> List[Dict[str, Any]]:
+    return list(iter_vcf(make_vcf(n, pgx_fraction=0.01)))
+
+
+def _analyze(variants: List[Dict[str, Any]], drugs: List[str]) -> Callable[[], Any]:
+    return lambda: analyze_variants({"variants": variants}, "BENCH", drugs)
+
+
+def _scaled_knowledge_base(extra_rules: int) -> str:
+    """Path of a copy of the bundled knowledge base with ``extra_rules`` more rules (spread over the drugs)"""
+    with open(DEFAULT_PATH, "rb") as f:
+        data = json.load(f)
+    templates = data["rules"]
+    for i in range(extra_rules):
+        rule = dict(templates[i % len(templates)])
+        chrom = CHROMS[i % len(CHROMS)]
+        # Positions below the synthetic generator's first variant never match
+        rule["rs_id"] = f"rsBENCH{i}"
+        rule["loci"] = {build: [chrom, 1 + i, "A", "G"] for build in data["gene_loci"]}
+        data["rules"].append(rule)
+    fd, path = tempfile.mkstemp(prefix="engine_bench_kb_", suffix=".json")
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f)
+    return path
+
+
+def _report_inputs() -> Tuple[list, list, str]:
+    """Recommendations for REPORT_DRUGS drugs (relabelled copies beyond the bundled ones) and a full preview"""
+    drugs = [drug["drug"] for drug in get_knowledge_base().drugs]
+    base = analyze_variants({"variants": iter_vcf(make_vcf(2000, pgx_fraction=0.05))}, "BENCH", drugs)
+    recommendations = list(base.recommendations)
+    while len(recommendations) < REPORT_DRUGS:
+        rec = base.recommendations[len(recommendations) % len(base.recommendations)]
+        recommendations.append(dataclasses.replace(rec, drug=f"{rec.drug}_{len(recommendations)}"))
+    return recommendations, list(base.variants[:PREVIEW_VARIANTS]), base.rule_set_version
+
+
+# (best seconds per call, median cost relative to the reference workload) per case
+Results = Tuple[Dict[str, float], Dict[str, float]]
+
+
+def run(repeat: int, selected: List[str]) -> Results:
+    """
+    Timings (see ``Results``) of every case whose name contains one of
+    ``selected`` (all if empty).
+
+    Cases are timed round-robin, one round of every case at a time, so a
+    burst of background load slows all of them instead of skewing one.
+    """
+    cases: Dict[str, Callable[[], Any]] = {}
+    inputs = {n: _variants(n) for n in sorted(set(VARIANT_COUNTS + [FIXED_VARIANTS]))}
+    for n in VARIANT_COUNTS:
+        cases[f"analyze/variants={n}"] = _analyze(inputs[n], BENCH_DRUGS)
+    for n in DRUG_COUNTS:
+        cases[f"analyze/drugs={n}"] = _analyze(inputs[FIXED_VARIANTS], BENCH_DRUGS[:n])
+
+    recommendations, preview, version = _report_inputs()
+    drugs = [rec.drug for rec in recommendations]
+    cases[f"report/assemble drugs={REPORT_DRUGS}"] = lambda: assemble_report("BENCH", drugs, recommendations, 2000, preview, version)
+    cases[f"report/to_json drugs={REPORT_DRUGS}"] = assemble_report("BENCH", drugs, recommendations, 2000, preview, version).to_json
+    if selected:
+        cases = {name: fn for name, fn in cases.items() if any(part in name for part in selected)}
+    seconds, relative = _time_rounds(cases, repeat)
+
+    # Each rule count needs its own knowledge base snapshot
+    rules = len(get_knowledge_base().rules)
+    for extra in EXTRA_RULES:
+        name = f"analyze/rules={rules + extra}"
+        if selected and not any(part in name for part in selected):
+            continue
+        path = _scaled_knowledge_base(extra)
+        try:
+            reload_knowledge_base(path)
+            timed, ratios = _time_rounds({name: _analyze(inputs[FIXED_VARIANTS], BENCH_DRUGS)}, repeat)
+            seconds.update(timed)
+            relative.update(ratios)
+        finally:
+            reload_knowledge_base(DEFAULT_PATH)
+            os.unlink(path)
+    return seconds, relative
+
+
+def _time_rounds(cases: Dict[str, Callable[[], Any]], repeat: int) -> Results:
+    """Timings of each case over ``repeat`` interleaved rounds, each case preceded by the reference workload"""
+    reference = timeit.Timer(_reference)
+    reference_number = reference.autorange()[0]
+    timers = {name: timeit.Timer(fn) for name, fn in cases.items()}
+    numbers = {name: timer.autorange()[0] for name, timer in timers.items()}
+    best = dict.fromkeys(cases, float("inf"))
+    ratios: Dict[str, List[float]] = {name: [] for name in cases}
+    for _ in range(repeat):
+        for name, timer in timers.items():
+            base = reference.timeit(reference_number) / reference_number
+            seconds = timer.timeit(numbers[name]) / numbers[name]
+            best[name] = min(best[name], seconds)
+            ratios[name].append(seconds / base)
+    relative = {name: statistics.median(values) for name, values in ratios.items()}
+    for name, seconds in best.items():
+        print(f"{name:<34} {seconds * 1e6:14.1f} us {relative[name]:12.4f}x ref", flush=True)
+    return best, relative
+
+
+def _load_baselines(path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(results: Results, stored: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Print the change per case, relative to the reference workload (absolute
+    times for baselines saved without relative costs); returns the cases
+    slower than ``threshold`` percent
+    """
+    seconds, relative = results
+    baselines = stored.get("relative")
+    now = relative
+    if baselines is None:
+        baselines, now = stored["cases"], seconds
+        print("\nBaselines have no relative costs; comparing absolute times")
+    regressions = []
+    print(f"\n{'case':<34} {'baseline us':>14} {'now us':>14} {'change':>9}")
+    for name, value in now.items():
+        base = baselines.get(name)
+        stored_seconds = stored["cases"].get(name)
+        if base is None or stored_seconds is None:
+            print(f"{name:<34} {'-':>14} {seconds[name] * 1e6:14.1f} {'new':>9}")
+            continue
+        change = (value - base) / base * 100
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<34} {stored_seconds * 1e6:14.1f} {seconds[name] * 1e6:14.1f} {change:+8.1f}%{flag}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Analysis engine micro-benchmarks")
+    parser.add_argument("--repeat", type=int, default=7, help="timed rounds per case (best time, median relative cost)")
+    parser.add_argument("--case", action="append", default=[], help="only cases whose name contains this (repeatable)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline file")
+    parser.add_argument("--save", action="store_true", help="write the results as the new baselines")
+    parser.add_argument("--check", action="store_true", help="exit 1 if a case is slower than its baseline by more than --threshold")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed slowdown in percent")
+    args = parser.parse_args()
+
+    results = run(args.repeat, args.case)
+
+    stored = _load_baselines(args.baseline)
+    if stored is not None:
+        regressions = compare(results, stored, args.threshold)
+    elif args.check:
+        print(f"No baselines at {args.baseline}; run with --save first")
+        sys.exit(2)
+    else:
+        regressions = []
+
+    if args.save:
+        keep = stored is not None and args.case
+        cases = dict(stored["cases"]) if keep else {}
+        relative = dict(stored.get("relative", {})) if keep else {}
+        cases.update({name: round(seconds, 9) for name, seconds in results[0].items()})
+        relative.update({name: round(ratio, 6) for name, ratio in results[1].items()})
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "meta": {
+                    "revision": _git_revision(),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "cpus": os.cpu_count(),
+                    "repeat": args.repeat,
+                },
+                "cases": cases,
+                "relative": relative,
+            }, f, indent=2)
+            f.write("\n")
+        print(f"Baselines written to {args.baseline}")
+
+    if args.check:
+        if regressions:
+            print(f"FAILED: {len(regressions)} case(s) more than {args.threshold:g}% slower: {', '.join(regressions)}")
+            sys.exit(1)
+        print(f"OK: no case more than {args.threshold:g}% slower than its baseline")
+
+
+if __name__ == "__main__":
+    main()
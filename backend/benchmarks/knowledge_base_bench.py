@@ -0,0 +1,75 @@
+"""
+Knowledge base reload cost and lookup latency.
+
+Measures loading + compiling a snapshot, fetching the active snapshot,
+compiling an analysis plan (cold, i.e. right after a reload, and cached),
+matching a variant against a plan, evaluating a multi-gene decision table
+and the drug metadata lookups.
+
+Usage (from backend/)::
+
+    python -m benchmarks.knowledge_base_bench [--path FILE] [--repeat 200]
+"""
+import argparse
+import time
+from typing import Callable
+
+from app.services.drug_service import get_primary_gene, is_drug_supported
+from app.services.knowledge_base import get_knowledge_base, load_knowledge_base, reload_knowledge_base
+from app.services.pgx_engine import compile_plan
+from app.services.vcf_parser import iter_vcf
+from .parser_bench import BENCH_DRUGS
+from .synthetic import make_vcf
+
+
+def _per_call(fn: Callable[[], object], repeat: int) -> float:
+    """Best of 5 timings of ``repeat`` calls, in microseconds per call"""
+    best = float("inf")
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        best = min(best, time.perf_counter() - start)
+    return best / repeat * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Knowledge base reload and lookup benchmark")
+    parser.add_argument("--path", help="knowledge base file (default: the bundled one)")
+    parser.add_argument("--repeat", type=int, default=200, help="calls per timing")
+    args = parser.parse_args()
+
+    reload_knowledge_base(args.path)
+    kb = get_knowledge_base()
+    variants = list(iter_vcf(make_vcf(10000, pgx_fraction=0.05)))
+    plan = compile_plan(BENCH_DRUGS)
+
+    def cold_plan():
+        kb.plans.clear()
+        compile_plan(BENCH_DRUGS, kb=kb)
+
+    table = next(iter(kb.decision_tables.values()), None)
+    table_phenotypes = [next(iter(codes)) for codes in table.codes] if table else []
+
+    def match_all():
+        for v in variants:
+            plan.match(v)
+
+    rows = [
+        ("load + compile snapshot", _per_call(lambda: load_knowledge_base(args.path), max(args.repeat // 10, 1))),
+        ("get_knowledge_base", _per_call(get_knowledge_base, args.repeat * 100)),
+        ("compile_plan (cold)", _per_call(cold_plan, args.repeat)),
+        ("compile_plan (cached)", _per_call(lambda: compile_plan(BENCH_DRUGS), args.repeat * 10)),
+        ("is_drug_supported", _per_call(lambda: is_drug_supported("warfarin"), args.repeat * 100)),
+        ("get_primary_gene", _per_call(lambda: get_primary_gene("CODEINE"), args.repeat * 100)),
+        ("plan.match per variant", _per_call(match_all, 1) / len(variants)),
+    ]
+    if table is not None:
+        rows.append((f"decision table ({table.drug})", _per_call(lambda: table.lookup(table_phenotypes), args.repeat * 100)))
+    print(f"knowledge base {kb.version}: {len(kb.rules)} rules, {len(kb.drugs)} drugs, {len(kb.star_index.callers)} star-allele genes, {len(kb.decision_tables)} decision tables")
+    for name, micros in rows:
+        print(f"{name:<26} {micros:12.3f} us")
+
+
+if __name__ == "__main__":
+    main()
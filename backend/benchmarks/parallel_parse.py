@@ -0,0 +1,52 @@
+"""
+Serial vs. process-pool VCF parsing benchmark.
+
+Usage (from backend/)::
+
+    python -m benchmarks.parallel_parse [--sizes 10000 100000 1000000] [--workers N] [--chunk-size C]
+"""
+import argparse
+import os
+import time
+
+from app.services.vcf_parser import parse_vcf, parse_vcf_parallel, shutdown_parse_executor, PARALLEL_CHUNK_SIZE
+from .synthetic import make_vcf
+
+
+def _best_of(repeat: int, fn, *args, **kwargs) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=PARALLEL_CHUNK_SIZE)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"cpus={os.cpu_count()} workers={args.workers} chunk_size={args.chunk_size}")
+    print(f"{'lines':>10} {'MB':>8} {'serial s':>10} {'parallel s':>11} {'speedup':>8}")
+    try:
+        # Warm the pool so worker start-up is not billed to the first size
+        parse_vcf_parallel(make_vcf(1000), workers=args.workers, chunk_size=1024)
+        for size in args.sizes:
+            content = make_vcf(size)
+            serial = _best_of(args.repeat, parse_vcf, content)
+            parallel = _best_of(
+                args.repeat, parse_vcf_parallel, content, workers=args.workers, chunk_size=args.chunk_size
+            )
+            print(
+                f"{size:>10} {len(content) / 1e6:>8.1f} {serial:>10.3f} {parallel:>11.3f} {serial / parallel:>7.2f}x"
+            )
+    finally:
+        shutdown_parse_executor()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+VCF parser throughput and memory benchmark.
+
+Runs every parser mode over a grid of synthetic inputs and reports
+lines/sec and tracemalloc peak memory per (scenario, mode).
+
+Usage (from backend/)::
+
+    python -m benchmarks.parser_bench [--quick] [--output results.json]
+
+Results are printed as a table and, with ``--output``, written as JSON
+(``{"meta": {...}, "results": [...]}``) for comparison across commits.
+"""
+import argparse
+import gzip
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from app.services.bgzf import iter_decompressed
+from app.services.pgx_engine import analyze_variants, build_prefilter
+from app.services.vcf_parser import iter_vcf, parse_vcf, parse_vcf_parallel, shutdown_parse_executor
+from .synthetic import make_vcf
+
+# Drugs used by the analysis-backed modes (all CPIC rules active)
+BENCH_DRUGS = ["CODEINE", "CLOPIDOGREL", "SIMVASTATIN", "AZATHIOPRINE", "WARFARIN", "FLUOROURACIL"]
+
+# (name, n_variants, n_samples, info_width, pgx_fraction)
+SCENARIOS = [
+    ("baseline-100k", 100000, 1, 1, 0.0),
+    ("wide-info-100k", 100000, 1, 20, 0.0),
+    ("pgx-dense-100k", 100000, 1, 1, 0.05),
+    ("cohort-20k-x100", 20000, 100, 1, 0.01),
+    ("baseline-1m", 1000000, 1, 1, 0.0),
+]
+
+QUICK_SCENARIOS = [
+    ("baseline-10k", 10000, 1, 1, 0.0),
+    ("wide-info-10k", 10000, 1, 20, 0.0),
+    ("cohort-2k-x50", 2000, 50, 1, 0.01),
+]
+
+
+def _consume(iterable) -> None:
+    for _ in iterable:
+        pass
+
+
+def _modes(content: str, gz: bytes, cohort: bool) -> Dict[str, Callable[[], Any]]:
+    """Parser entry points to measure, each a zero-argument callable"""
+    modes: Dict[str, Callable[[], Any]] = {
+        "iter_vcf": lambda: _consume(iter_vcf(content)),
+        "iter_vcf_gzip": lambda: _consume(iter_vcf(iter_decompressed([gz]))),
+        "parse_vcf": lambda: parse_vcf(content),
+        "parse_vcf_parallel": lambda: parse_vcf_parallel(content),
+        "analyze_stream": lambda: analyze_variants({"variants": iter_vcf(content)}, "BENCH", BENCH_DRUGS),
+    }
+
+    def analyze_prefiltered():
+        prefilter = build_prefilter(BENCH_DRUGS)
+        return analyze_variants({"variants": iter_vcf(content, prefilter=prefilter), "prefilter": prefilter}, "BENCH", BENCH_DRUGS)
+
+    modes["analyze_prefiltered"] = analyze_prefiltered
+    if cohort:
+        modes["parse_vcf_cohort"] = lambda: parse_vcf(content, cohort=True)
+        modes["parse_vcf_parallel_cohort"] = lambda: parse_vcf_parallel(content, cohort=True)
+    return modes
+
+
+def _measure(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    """Best wall time over ``repeat`` runs, then one traced run for peak memory"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": best, "peak_bytes": peak}
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(scenarios, repeat: int, modes_filter: List[str]) -> Dict[str, Any]:
+    results = []
+    for name, n_variants, n_samples, info_width, pgx_fraction in scenarios:
+        content = make_vcf(n_variants, n_samples=n_samples, info_width=info_width, pgx_fraction=pgx_fraction)
+        gz = gzip.compress(content.encode("utf-8"), compresslevel=6)
+        for mode, fn in _modes(content, gz, cohort=n_samples > 1).items():
+            if modes_filter and mode not in modes_filter:
+                continue
+            stats = _measure(fn, repeat)
+            row = {
+                "scenario": name,
+                "mode": mode,
+                "variants": n_variants,
+                "samples": n_samples,
+                "info_width": info_width,
+                "pgx_fraction": pgx_fraction,
+                "input_bytes": len(content),
+                "seconds": round(stats["seconds"], 6),
+                "lines_per_sec": round(n_variants / stats["seconds"]),
+                "peak_mb": round(stats["peak_bytes"] / (1024 * 1024), 3),
+            }
+            results.append(row)
+            print(
+                f"{name:<18} {mode:<26} {row['lines_per_sec']:>12,} lines/s {row['peak_mb']:>9.3f} MB",
+                flush=True,
+            )
+    return {
+        "meta": {
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="VCF parser throughput and memory benchmark")
+    parser.add_argument("--quick", action="store_true", help="small inputs only (a few seconds)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per mode (best is reported)")
+    parser.add_argument("--mode", action="append", default=[], help="only run this mode (repeatable)")
+    parser.add_argument("--output", help="write JSON results to this file ('-' for stdout)")
+    args = parser.parse_args()
+
+    try:
+        report = run(QUICK_SCENARIOS if args.quick else SCENARIOS, args.repeat, args.mode)
+    finally:
+        shutdown_parse_executor()
+
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    elif args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Report ID generation throughput under concurrency.
+
+Generates IDs from several processes (forked and spawned, like gunicorn and
+uvicorn workers) with several threads each, and reports IDs/s per start
+method. Uniqueness and ordering are checked by ``tests/test_report_ids.py``.
+
+Usage (from backend/)::
+
+    python -m benchmarks.report_id_stress [--processes 4] [--threads 8] [--ids 20000]
+"""
+import argparse
+import multiprocessing
+import threading
+import time
+from typing import List
+
+from app.services.report_ids import new_report_id
+
+
+def _thread_ids(count: int, out: List[int]) -> None:
+    for _ in range(count):
+        new_report_id()
+    out.append(count)
+
+
+def _process_ids(threads: int, per_thread: int) -> int:
+    """Number of IDs generated by ``threads`` concurrent threads of this process"""
+    results: List[int] = []
+    workers = [threading.Thread(target=_thread_ids, args=(per_thread, results)) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return sum(results)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Report ID generation throughput")
+    parser.add_argument("--processes", type=int, default=4, help="processes per start method")
+    parser.add_argument("--threads", type=int, default=8, help="threads per process")
+    parser.add_argument("--ids", type=int, default=20000, help="IDs per thread")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    count = _process_ids(args.threads, args.ids)
+    elapsed = time.perf_counter() - start
+    print(f"{'in-process':<12} {count:>12,} IDs in {elapsed:6.2f} s ({count / elapsed:>12,.0f} IDs/s)")
+
+    for method in [m for m in ("fork", "spawn") if m in multiprocessing.get_all_start_methods()]:
+        with multiprocessing.get_context(method).Pool(args.processes) as pool:
+            # Warm the pool so process start-up is not timed
+            pool.map(abs, range(args.processes))
+            start = time.perf_counter()
+            count = sum(pool.starmap(_process_ids, [(args.threads, args.ids)] * args.processes))
+            elapsed = time.perf_counter() - start
+        print(f"{method:<12} {count:>12,} IDs in {elapsed:6.2f} s ({count / elapsed:>12,.0f} IDs/s)")
+
+
+if __name__ == "__main__":
+    main()
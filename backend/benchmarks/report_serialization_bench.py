@@ -0,0 +1,113 @@
+"""
+Report serialization cost per request.
+
+Compares the previous path, where the engine returned a plain dict that
+FastAPI validated against ``ClinicalReportOut``, dumped and rendered with
+``json.dumps`` while SQLAlchemy ran ``json.dumps`` again for the
+``report_json`` column, against serializing the engine's ``ClinicalReport``
+once with ``to_json()`` and reusing the bytes for both.
+
+The report has 50 preview variants and 10 recommendations (the knowledge
+base has fewer drugs, so the extra ones are relabelled copies). Both paths
+are checked to produce the same JSON document.
+
+Usage (from backend/)::
+
+    python -m benchmarks.report_serialization_bench [--repeat 2000]
+"""
+import argparse
+import asyncio
+import dataclasses
+import json
+import time
+from typing import Any, Dict
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from app.database import _json_serializer
+from app.schemas import ClinicalReportOut
+from app.services.knowledge_base import get_knowledge_base
+from app.services.pgx_engine import PREVIEW_VARIANTS, analyze_variants, assemble_report
+from app.services.report_model import ClinicalReport
+from app.services.vcf_parser import iter_vcf
+from .synthetic import make_vcf
+
+REPORT_DRUGS = 10
+
+
+def _bench_report(content: str) -> ClinicalReport:
+    drugs = [drug["drug"] for drug in get_knowledge_base().drugs]
+    base = analyze_variants({"variants": iter_vcf(content)}, "BENCH", drugs)
+    recommendations = list(base.recommendations)
+    while len(recommendations) < REPORT_DRUGS:
+        rec = base.recommendations[len(recommendations) % len(base.recommendations)]
+        recommendations.append(dataclasses.replace(rec, drug=f"{rec.drug}_{len(recommendations)}"))
+    report = assemble_report(
+        "BENCH",
+        [rec.drug for rec in recommendations],
+        recommendations,
+        base.summary.total_variants,
+        list(base.variants),
+        base.rule_set_version,
+    )
+    assert len(report.variants) == PREVIEW_VARIANTS and len(report.recommendations) == REPORT_DRUGS
+    return report
+
+
+def _legacy_dict(report: ClinicalReport, records) -> Dict[str, Any]:
+    """The snake_case dict the engine used to return (previews were whole parsed records)"""
+    legacy = dataclasses.asdict(report)
+    legacy["variants"] = [dict(v) for v in records]
+    return legacy
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Report serialization benchmark")
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    content = make_vcf(2000, pgx_fraction=0.05)
+    report = _bench_report(content)
+    legacy = _legacy_dict(report, list(iter_vcf(content))[:PREVIEW_VARIANTS])
+    field = create_model_field("Response_analyze", ClinicalReportOut, mode="serialization")
+
+    async def legacy_path() -> bytes:
+        jsonable = await serialize_response(field=field, response_content=legacy)
+        body = JSONResponse(jsonable).body
+        _json_serializer(legacy)
+        return body
+
+    def typed_path() -> bytes:
+        body = report.to_json()
+        _json_serializer(body)
+        return body
+
+    old_body = asyncio.run(legacy_path())
+    new_body = typed_path()
+    old_doc, new_doc = json.loads(old_body), json.loads(new_body)
+    assert old_doc == new_doc and list(old_doc) == list(new_doc), "serialized reports differ"
+
+    async def time_legacy() -> float:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            await legacy_path()
+        return time.perf_counter() - start
+
+    legacy_s = min(asyncio.run(time_legacy()) for _ in range(3))
+    typed_s = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            typed_path()
+        typed_s = min(typed_s, time.perf_counter() - start)
+
+    print(f"report: {len(report.variants)} variants, {len(report.recommendations)} drugs, {len(new_body):,} bytes")
+    for name, seconds in (("dict + response_model + json.dumps x2", legacy_s), ("ClinicalReport.to_json once", typed_s)):
+        print(f"{name:<38} {seconds / args.repeat * 1e6:10.1f} us/request")
+    print(f"saving {(legacy_s - typed_s) / args.repeat * 1e6:.1f} us/request ({legacy_s / typed_s:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Report storage benchmark: ``report_json`` column vs ``report_store`` payloads.
+
+Analyzes one synthetic upload ``--reports`` times (cycling through drug
+selections, like re-analyses of a patient's file) and persists each report
+to a temporary SQLite database through:
+- ``json``: the full report in ``GeneratedReport.report_json``
+- ``store``: ``store_reports`` (compressed core on the row, shared sections
+  deduplicated in ``report_payloads``)
+
+and prints the bytes stored, the mean time per report write (including its
+commit) and the mean time of ``load_report``.
+
+Usage (from backend/)::
+
+    python -m benchmarks.report_store_bench [--reports 200] [--variants 2000]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import List
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.database import Base, _json_serializer
+from app.models import GeneratedReport, PatientUpload, ReportPayload
+from app.report_store import load_report, store_reports
+from app.services.pgx_engine import analyze_variants
+from app.services.report_model import ClinicalReport
+from app.services.vcf_parser import iter_vcf
+from .parser_bench import BENCH_DRUGS
+from .synthetic import make_vcf
+
+
+def _reports(count: int, variants: int) -> List[ClinicalReport]:
+    parsed = list(iter_vcf(make_vcf(variants, pgx_fraction=0.01)))
+    selections = [BENCH_DRUGS[i:i + 2] or BENCH_DRUGS for i in range(len(BENCH_DRUGS))]
+    return [analyze_variants({"variants": parsed}, "BENCH", selections[i % len(selections)]) for i in range(count)]
+
+
+async def run(path: str, reports: List[ClinicalReport]) -> None:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}", json_serializer=_json_serializer)
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    try:
+        async with sessions() as db:
+            upload = PatientUpload(patient_id="BENCH", file_name="bench.vcf", file_size=0)
+            db.add(upload)
+            await db.commit()
+
+        timings = {"json": 0.0, "store": 0.0}
+        for mode in timings:
+            for i, report in enumerate(reports):
+                async with sessions() as db:
+                    start = time.perf_counter()
+                    if mode == "json":
+                        columns = {"report_json": report.to_json()}
+                    else:
+                        columns = (await store_reports(db, [report]))[0]
+                    db.add(GeneratedReport(
+                        upload_id=upload.id,
+                        report_id=f"{mode}-{i}",
+                        patient_id=report.patient_id,
+                        **columns,
+                    ))
+                    await db.commit()
+                    timings[mode] += time.perf_counter() - start
+
+        async with sessions() as db:
+            json_bytes = sum(len(report.to_json()) for report in reports)
+            cores = (await db.execute(select(func.sum(func.length(GeneratedReport.report_data))))).scalar()
+            payloads, sections = (await db.execute(
+                select(func.count(), func.sum(func.length(ReportPayload.data)))
+            )).one()
+            stored = cores + sections
+            reads = {}
+            for mode in timings:
+                start = time.perf_counter()
+                for i in range(len(reports)):
+                    await load_report(db, f"{mode}-{i}")
+                reads[mode] = (time.perf_counter() - start) / len(reports)
+
+        n = len(reports)
+        print(f"{n} reports of one upload, {json_bytes / n:,.0f} B of JSON each")
+        print(f"json     {json_bytes:>12,} B stored  write {timings['json'] / n * 1000:7.2f} ms  read {reads['json'] * 1000:7.2f} ms")
+        print(f"store    {stored:>12,} B stored  write {timings['store'] / n * 1000:7.2f} ms  read {reads['store'] * 1000:7.2f} ms"
+              f"  ({payloads} shared sections, {json_bytes / stored:.1f}x smaller)")
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="report_json vs content-addressed report storage")
+    parser.add_argument("--reports", type=int, default=200)
+    parser.add_argument("--variants", type=int, default=2000, help="variants in the analyzed upload")
+    args = parser.parse_args()
+    reports = _reports(args.reports, args.variants)
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(run(os.path.join(tmp, "bench.db"), reports))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Deterministic synthetic VCF generator for benchmarks"""
+import random
+from typing import List, Tuple
+
+from app.services.knowledge_base import get_knowledge_base
+
+CHROMS = ["1", "2", "6", "10", "12", "16", "22"]
+GENOTYPES = ["0/0", "0/1", "1/1", "0|1", "./."]
+
+
+def _pgx_sites(build: str) -> List[Tuple[str, int, str, str, str]]:
+    """(chrom, pos, rsID, ref, alt) of every CPIC rule locus in ``build``"""
+    sites = []
+    for rule in get_knowledge_base().rules:
+        if build in rule.get("loci", {}):
+            chrom, pos, ref, alt = rule["loci"][build]
+            sites.append((chrom, pos, rule["rs_id"], ref, alt))
+    return sites
+
+
+def make_vcf(
+    n_variants: int,
+    n_samples: int = 1,
+    info_width: int = 1,
+    pgx_fraction: float = 0.0,
+    seed: int = 42,
+    build: str = "GRCh38",
+) -> str:
+    """
+    Build an in-memory VCF.
+
+    Args:
+        n_variants: Number of data lines
+        n_samples: Number of sample columns
+        info_width: Number of key=value pairs in each INFO column
+        pgx_fraction: Share of lines placed on a CPIC rule locus (rsID,
+            position and alleles); the rest are spread over ``CHROMS``
+        seed: Random seed; equal arguments always give identical output
+        build: Reference build used for pharmacogene coordinates
+    """
+    rng = random.Random(seed)
+    samples = [f"SAMPLE_{i + 1}" for i in range(n_samples)]
+    sites = _pgx_sites(build)
+    lines: List[str] = [
+        "##fileformat=VCFv4.2",
+        "##source=benchmarks.synthetic",
+        f"##reference={build}",
+        "##INFO=<ID=DP,Number=1,Type=Integer,Description=\"Read depth\">",
+        "##FORMAT=<ID=GT,Number=1,Type=String,Description=\"Genotype\">",
+        "##FORMAT=<ID=DP,Number=1,Type=Integer,Description=\"Read depth\">",
+        "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t" + "\t".join(samples),
+    ]
+    pos = 10000
+    for i in range(n_variants):
+        pos += rng.randint(1, 500)
+        ref, alt = rng.sample("ACGT", 2)
+        if pgx_fraction and rng.random() < pgx_fraction:
+            chrom, site_pos, rs_id, ref, alt = rng.choice(sites)
+        else:
+            chrom, site_pos, rs_id = CHROMS[i * len(CHROMS) // n_variants], pos, f"rs{1000000 + i}"
+        info = ";".join([f"DP={rng.randint(5, 200)}"] + [f"K{k}={rng.randint(0, 999)}" for k in range(info_width - 1)])
+        calls = "\t".join(f"{rng.choice(GENOTYPES)}:{rng.randint(5, 60)}" for _ in samples)
+        lines.append(f"{chrom}\t{site_pos}\t{rs_id}\t{ref}\t{alt}\t{rng.randint(20, 99)}\tPASS\t{info}\tGT:DP\t{calls}")
+    return "\n".join(lines) + "\n"
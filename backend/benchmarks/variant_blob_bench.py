@@ -0,0 +1,81 @@
+"""
+Variant blob benchmark: size, encode time and selective reads.
+
+For each variant count, parses a synthetic VCF into a ``VariantTable`` and
+reports:
+- the blob's size next to the VCF text and the in-memory table
+- ``encode_variants`` time
+- a full decode, a region query (about 0.1% of the rows) and an rsID query
+  (three IDs), each on a fresh reader, with the column chunks inflated
+
+Synthetic VCFs are position-sorted like real ones, so a region touches
+few row groups; rsIDs are unordered and need every group's ``id`` chunk.
+
+Usage (from backend/)::
+
+    python -m benchmarks.variant_blob_bench [--variants 10000 --variants 100000] [--repeat 5]
+"""
+import argparse
+import time
+from typing import Any, Callable, List, Tuple
+
+from app.services.variant_blob import VariantBlobReader, encode_variants
+from app.services.vcf_parser import parse_vcf
+from .synthetic import make_vcf
+
+VARIANT_COUNTS = [1000, 10000, 100000]
+
+
+def _best(fn: Callable[[], Any], repeat: int) -> Tuple[float, Any]:
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def _query(blob: bytes, run: Callable[[VariantBlobReader], List[Any]]) -> Callable[[], Tuple[int, int]]:
+    def query() -> Tuple[int, int]:
+        reader = VariantBlobReader(blob)
+        return len(run(reader)), reader.decoded_chunks
+    return query
+
+
+def bench(n: int, repeat: int) -> None:
+    content = make_vcf(n)
+    table = parse_vcf(content)["variants"]
+    encode_s, blob = _best(lambda: encode_variants(table), repeat)
+    groups = len(VariantBlobReader(blob).groups)
+
+    # ~0.1% of the rows from the middle of the file, and IDs near its start, middle and end
+    middle = table[len(table) // 2]
+    span = max(table.pos[-1] - table.pos[0], 1) * 0.001
+    region = (middle["chrom"], middle["pos"], int(middle["pos"] + span))
+    ids = {table[0]["id"], middle["id"], table[len(table) - 1]["id"]}
+
+    print(f"{n} variants: {groups} row groups")
+    print(f"  size     vcf {len(content):>11,} B  table {table.nbytes:>11,} B  blob {len(blob):>10,} B "
+          f"({len(blob) / len(content):.1%} of the VCF)")
+    print(f"  encode   {encode_s * 1000:10.2f} ms  {n / encode_s:>12,.0f} variants/s")
+    queries = {
+        "full": lambda reader: list(reader),
+        "region": lambda reader: reader.region(*region),
+        "rs_ids": lambda reader: reader.rs_ids(ids),
+    }
+    for name, run in queries.items():
+        seconds, (rows, chunks) = _best(_query(blob, run), repeat)
+        print(f"  {name:<8} {seconds * 1000:10.2f} ms  {rows:>8} rows  {chunks:>4} chunks inflated")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Variant blob size and query benchmark")
+    parser.add_argument("--variants", type=int, action="append", help="variant count (repeatable)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    for n in args.variants or VARIANT_COUNTS:
+        bench(n, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
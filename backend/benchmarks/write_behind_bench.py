@@ -0,0 +1,115 @@
+"""
+/analyze latency with inline persistence vs write-behind.
+
+Sends ``--requests`` POST /api/v1/analyze requests (``--variants``
+variants each, result cache off) with ``--concurrency`` in flight (closed
+loop) or started at ``--rate`` per second (open loop), through
+the ASGI app in-process (httpx), against a temporary SQLite database, in
+two modes:
+- ``inline``: the response waits for the commit
+- ``write-behind``: ``WriteBehindQueue`` with the configured queue and
+  batch sizes; the time to drain the queue afterwards is reported too
+
+Prints throughput and p50/p99 latency per mode.
+
+Usage (from backend/)::
+
+    python -m benchmarks.write_behind_bench [--requests 200] [--concurrency 8]
+    python -m benchmarks.write_behind_bench --rate 8 --concurrency 64
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import Any, Dict, List
+
+
+def _percentile(values: List[float], q: float) -> float:
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+async def _load(app: Any, body: Dict[str, Any], requests: int, concurrency: int, rate: float) -> Dict[str, float]:
+    import httpx
+
+    latencies: List[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def one(i: int) -> None:
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/api/v1/analyze", json={**body, "patient_id": f"BENCH-{i}"})
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        if rate:
+            tasks = []
+            for i in range(requests):
+                tasks.append(asyncio.create_task(one(i)))
+                await asyncio.sleep(max(0.0, start + (i + 1) / rate - time.perf_counter()))
+            await asyncio.gather(*tasks)
+        else:
+            await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {"rps": requests / elapsed, "p50": _percentile(latencies, 0.5), "p99": _percentile(latencies, 0.99)}
+
+
+async def run(requests: int, concurrency: int, variants: int, rate: float) -> None:
+    # The app reads its settings on import, so only import it once the environment is set
+    from app.config import settings
+    from app.database import Base, async_session, engine
+    from app.main import app
+    from app.routers import analysis
+    from app.security import rate_limit_dependency
+    from app.write_behind import WriteBehindQueue
+    from .synthetic import make_vcf
+
+    app.dependency_overrides[rate_limit_dependency] = lambda: None
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    body = {"vcf_content": make_vcf(variants, pgx_fraction=0.01), "drugs": ["CODEINE", "WARFARIN"]}
+
+    load = f"{rate:g} req/s offered" if rate else f"{concurrency} in flight"
+    print(f"{requests} requests, {load}, {variants} variants each ({engine.dialect.name})")
+    try:
+        for mode in ("inline", "write-behind"):
+            queue = None
+            if mode == "write-behind":
+                queue = WriteBehindQueue(
+                    async_session,
+                    analysis._stage_upload,
+                    maxsize=settings.write_behind_queue_size,
+                    batch_size=settings.write_behind_batch_size,
+                    submit_timeout=settings.write_behind_submit_timeout,
+                )
+            analysis._write_behind = queue
+            result = await _load(app, body, requests, concurrency, rate)
+            line = f"{mode:<13} {result['rps']:8.1f} req/s  p50 {result['p50'] * 1000:8.2f} ms  p99 {result['p99'] * 1000:8.2f} ms"
+            if queue is not None:
+                start = time.perf_counter()
+                await queue.close()
+                stats = queue.stats()
+                line += f"  (drained in {(time.perf_counter() - start) * 1000:.0f} ms, mean batch {stats['mean_batch']})"
+            print(line, flush=True)
+    finally:
+        analysis._write_behind = None
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Inline vs write-behind persistence latency")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--variants", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=0, help="open loop: start requests at this rate (concurrency then only caps requests in flight)")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ["RESULT_CACHE_ENABLED"] = "false"
+        asyncio.run(run(args.requests, args.concurrency, args.variants, args.rate))
+
+
+if __name__ == "__main__":
+    main()
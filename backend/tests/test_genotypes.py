@@ -0,0 +1,44 @@
+"""Streamed records and table rows decode a sample's call the same way"""
+import pickle
+
+from app.services.pgx_engine import _genotype_code
+from app.services.variant_table import GT_HET, GT_HOM_ALT, GT_HOM_REF, GT_MISSING, VariantTable
+from app.services.vcf_parser import iter_vcf, parse_vcf
+
+VCF = "##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\n" + "\n".join([
+    "22\t1\trs1\tA\tG\t50\tPASS\t.\tDP\t35",        # no GT key: the first subfield is not a call
+    "22\t2\trs2\tA\tG\t50\tPASS\t.\tGT:DP\t1/1:35",
+    "22\t3\trs3\tA\tG\t50\tPASS\t.\tGTX\t1/1",      # not the GT key either
+    "22\t4\trs4\tA\tG\t50\tPASS\t.",                # no sample column
+    "22\t5\trs5\tA\tG\t50\tPASS\t.\tGT\t0/0",
+    "22\t6\trs6\tA\tG\t50\tPASS\t.\tGT\t0|1",
+]) + "\n"
+
+EXPECTED = [GT_MISSING, GT_HOM_ALT, GT_MISSING, GT_MISSING, GT_HOM_REF, GT_HET]
+
+
+def test_records_and_rows_agree():
+    records = list(iter_vcf(VCF))
+    parsed = parse_vcf(VCF)["variants"]
+    copied = VariantTable()
+    for record in records:
+        copied.append_record(record)
+
+    assert [r.gt_code for r in records] == EXPECTED
+    assert [r.gt_code for r in parsed] == EXPECTED
+    assert [r.gt_code for r in copied] == EXPECTED
+    # Missing calls count as one ALT copy in the engine, whichever representation it gets
+    assert [_genotype_code(r) for r in records] == [_genotype_code(r) for r in parsed] == [GT_HET, GT_HOM_ALT, GT_HET, GT_HET, GT_HOM_REF, GT_HET]
+
+
+def test_decoded_call_survives_pickling():
+    record = list(iter_vcf(VCF))[1]
+    assert record.gt == "1/1" and record.gt_code == GT_HOM_ALT
+    restored = pickle.loads(pickle.dumps(record))
+    assert restored.gt_code == GT_HOM_ALT and restored.zygosity == "hom_alt"
+    assert list(pickle.loads(pickle.dumps(parse_vcf(VCF)["variants"])).gt_codes) == EXPECTED
+
+
+def test_plain_dicts_are_read_as_gt_first():
+    assert _genotype_code({"genotype": "1/1:35"}) == GT_HOM_ALT
+    assert _genotype_code({"genotype": "./."}) == GT_HET
@@ -0,0 +1,179 @@
+"""Rule findings agree with the star-allele call of their gene"""
+import itertools
+import json
+
+from app.services.knowledge_base import DEFAULT_PATH, KnowledgeBase, get_knowledge_base
+from app.services.pgx_engine import _analyze_sample, analyze_cohort, analyze_variants, build_prefilter, compile_plan
+from app.services.vcf_parser import iter_vcf, parse_vcf
+
+HEADER = "##fileformat=VCFv4.2\n##reference=GRCh38\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t{samples}\n"
+
+# Rule variants: CYP2D6*4 (codeine), DPYD*2A (fluorouracil), TPMT*3B
+# (azathioprine) and SLCO1B1*5 (simvastatin)
+CYP2D6_4 = "22\t42128945\trs3892097\tC\tT\t50\tPASS\t.\tGT\t{}"
+DPYD_2A = "1\t97450058\trs3918290\tC\tT\t50\tPASS\t.\tGT\t{}"
+TPMT_3B = "6\t18138997\trs1800460\tC\tT\t50\tPASS\t.\tGT\t{}"
+SLCO1B1_5 = "12\t21178615\trs4149056\tT\tC\t50\tPASS\t.\tGT\t{}"
+# CYP2D6*10, which no rule is keyed on
+CYP2D6_10 = "22\t42130692\trs1065852\tG\tA\t50\tPASS\t.\tGT\t{}"
+# VKORC1 -1639G>A, and a record inside CYP2C9 that defines no star allele
+VKORC1 = "16\t31096368\trs9923231\tC\tT\t50\tPASS\t.\tGT\t{}"
+CYP2C9_OTHER = "10\t94950000\t.\tG\tA\t50\tPASS\t.\tGT\t{}"
+
+
+def _vcf(*lines: str, samples: str = "S1") -> str:
+    return HEADER.format(samples=samples) + "\n".join(lines) + "\n"
+
+
+def _by_drug(report):
+    return {rec.drug: rec for rec in report.recommendations}
+
+
+def test_heterozygous_carrier_gets_the_intermediate_metabolizer_rule():
+    vcf = _vcf(CYP2D6_4.format("0/1"), DPYD_2A.format("0/1"))
+    recs = _by_drug(analyze_variants({"variants": iter_vcf(vcf)}, "P1", ["CODEINE", "FLUOROURACIL"], "GRCh38"))
+
+    codeine = recs["CODEINE"]
+    assert (codeine.diplotype, codeine.phenotype, codeine.risk_category) == ("*1/*4", "Intermediate Metabolizer", "adjust_dosage")
+    assert "Avoid" not in codeine.recommendation
+
+    fluorouracil = recs["FLUOROURACIL"]
+    assert (fluorouracil.diplotype, fluorouracil.phenotype) == ("*1/*2A", "Intermediate Metabolizer")
+    assert (fluorouracil.risk_category, fluorouracil.risk_level) == ("toxicity", "high")
+    assert "by 50%" in fluorouracil.recommendation
+
+
+def test_homozygous_carrier_gets_the_rule():
+    vcf = _vcf(CYP2D6_4.format("1/1"), DPYD_2A.format("1/1"), TPMT_3B.format("1/1"), SLCO1B1_5.format("1/1"))
+    drugs = ["CODEINE", "FLUOROURACIL", "AZATHIOPRINE", "SIMVASTATIN"]
+    recs = _by_drug(analyze_variants({"variants": iter_vcf(vcf)}, "P1", drugs, "GRCh38"))
+
+    codeine = recs["CODEINE"]
+    assert (codeine.diplotype, codeine.phenotype, codeine.risk_category) == ("*4/*4", "Poor Metabolizer", "ineffective")
+    assert codeine.recommendation.startswith("Avoid codeine")
+
+    fluorouracil = recs["FLUOROURACIL"]
+    assert (fluorouracil.diplotype, fluorouracil.phenotype, fluorouracil.risk_category) == ("*2A/*2A", "Poor Metabolizer", "toxicity")
+
+    azathioprine = recs["AZATHIOPRINE"]
+    assert (azathioprine.diplotype, azathioprine.phenotype, azathioprine.risk_category) == ("*3B/*3B", "Poor Metabolizer", "toxicity")
+
+    simvastatin = recs["SIMVASTATIN"]
+    assert (simvastatin.diplotype, simvastatin.phenotype, simvastatin.risk_category) == ("*5/*5", "Poor Function", "toxicity")
+
+
+def test_every_call_with_a_rule_variant_has_a_rule():
+    # Every diplotype containing a rule's variant, with any other defining
+    # variants of the gene, gets a finding rather than unknown risk
+    kb = get_knowledge_base()
+    for rule in kb.rules:
+        caller = kb.star_index.callers[rule["gene"]]
+        rule_bit = 1 << caller.bits[rule["rs_id"]]
+        phenotypes = {r["phenotype"] for r in kb.rules if r["drug"] == rule["drug"] and r["gene"] == rule["gene"]}
+        others = [1 << bit for rs_id, bit in caller.bits.items() if rs_id != rule["rs_id"]]
+        for rule_copies, *copies in itertools.product((1, 2), *[(0, 1, 2)] * len(others)):
+            het = hom = 0
+            for bit, n in zip([rule_bit] + others, [rule_copies] + copies):
+                if n == 1:
+                    het |= bit
+                elif n == 2:
+                    hom |= bit
+            call = caller.call(het, hom)
+            assert call is None or any(
+                kb.star_index.at_least_as_severe(rule["gene"], call["phenotype"], phenotype) for phenotype in phenotypes
+            ), (rule["drug"], call)
+
+
+def test_more_severe_call_falls_back_to_the_variant_rule():
+    # Without its poor metabolizer rule, a TPMT*3B homozygote gets the
+    # intermediate metabolizer rule, reported as the poor metabolizer it is
+    with open(DEFAULT_PATH) as f:
+        data = json.load(f)
+    data["rules"] = [r for r in data["rules"] if (r["drug"], r["phenotype"]) != ("AZATHIOPRINE", "Poor Metabolizer")]
+    plan = compile_plan(["AZATHIOPRINE"], "GRCh38", KnowledgeBase(data, "test", DEFAULT_PATH))
+    azathioprine = _analyze_sample(plan, {"variants": iter_vcf(_vcf(TPMT_3B.format("1/1")))}, "P1").recommendations[0]
+    assert (azathioprine.diplotype, azathioprine.phenotype, azathioprine.risk_category) == ("*3B/*3B", "Poor Metabolizer", "adjust_dosage")
+
+
+def test_non_reference_call_without_a_matched_rule_is_unknown_with_the_call():
+    vcf = _vcf(CYP2D6_10.format("1/1"))
+    codeine = _by_drug(analyze_variants({"variants": iter_vcf(vcf)}, "P1", ["CODEINE"], "GRCh38"))["CODEINE"]
+    assert (codeine.diplotype, codeine.phenotype, codeine.risk_category) == ("*10/*10", "Intermediate Metabolizer", "unknown")
+    assert "*10/*10 (Intermediate Metabolizer)" in codeine.recommendation
+    assert "No genetic variants detected" not in codeine.recommendation
+
+
+def test_multiallelic_record_counts_only_the_matched_allele():
+    # ALT 2 (T) is DPYD*2A; ALT 1 (G) defines nothing
+    line = "1\t97450058\trs3918290\tC\tG,T\t50\tPASS\t.\tGT\t{}"
+    expected = {
+        "1/1": ("Not detected", "unknown"),
+        "1/2": ("*1/*2A", "toxicity"),
+        "0/2": ("*1/*2A", "toxicity"),
+        "2/2": ("*2A/*2A", "toxicity"),
+    }
+    for gt, outcome in expected.items():
+        vcf = _vcf(line.format(gt))
+        for variants in (iter_vcf(vcf), parse_vcf(vcf)["variants"]):
+            fluorouracil = _by_drug(analyze_variants({"variants": variants}, "P1", ["FLUOROURACIL"], "GRCh38"))["FLUOROURACIL"]
+            assert (fluorouracil.diplotype, fluorouracil.risk_category) == outcome, gt
+
+    samples = "\t".join(f"S{i}" for i in range(len(expected)))
+    parsed = parse_vcf(_vcf(line.format("\t".join(expected)), samples=samples), cohort=True)
+    # Also after merging tables, as parallel parsing does
+    merged = parse_vcf(_vcf(DPYD_2A.format("\t".join(["0/0"] * len(expected))), samples=samples), cohort=True)
+    merged["variants"].extend_table(parsed["variants"])
+    for table in (parsed, merged):
+        reports = analyze_cohort(table, ["FLUOROURACIL"], genome_build="GRCh38")
+        assert [(r.recommendations[0].diplotype, r.recommendations[0].risk_category) for r in reports] == list(expected.values())
+
+
+def test_rs_id_match_needs_the_defining_allele_on_multiallelic_records():
+    # Off the GRCh38 locus, so only the rsID can match; neither ALT is *2A's T
+    vcf = _vcf("1\t97450000\trs3918290\tC\tG,A\t50\tPASS\t.\tGT\t1/2")
+    fluorouracil = _by_drug(analyze_variants({"variants": iter_vcf(vcf)}, "P1", ["FLUOROURACIL"], "GRCh38"))["FLUOROURACIL"]
+    assert fluorouracil.risk_category == "unknown"
+
+
+def test_reference_call_keeps_the_not_detected_text():
+    vcf = _vcf(CYP2D6_4.format("0/0"))
+    codeine = _by_drug(analyze_variants({"variants": iter_vcf(vcf)}, "P1", ["CODEINE"], "GRCh38"))["CODEINE"]
+    assert (codeine.diplotype, codeine.risk_category) == ("Not detected", "unknown")
+    assert codeine.recommendation.startswith("No genetic variants detected for CYP2D6")
+
+
+def test_cohort_samples_follow_their_own_calls():
+    vcf = _vcf(CYP2D6_4.format("0/1\t1/1\t0/0"), samples="HET\tHOM\tREF")
+    het, hom, ref = analyze_cohort(parse_vcf(vcf, cohort=True), ["CODEINE"], genome_build="GRCh38")
+    assert (het.recommendations[0].phenotype, het.recommendations[0].risk_category) == ("Intermediate Metabolizer", "adjust_dosage")
+    assert (hom.recommendations[0].phenotype, hom.recommendations[0].risk_category) == ("Poor Metabolizer", "ineffective")
+    assert (ref.recommendations[0].diplotype, ref.recommendations[0].risk_category) == ("Not detected", "unknown")
+
+
+def test_gene_without_records_is_not_called_reference():
+    vcf = _vcf(VKORC1.format("0/1"))
+    warfarin = _by_drug(analyze_variants({"variants": iter_vcf(vcf)}, "P1", ["WARFARIN"], "GRCh38"))["WARFARIN"]
+    assert (warfarin.diplotype, warfarin.risk_category) == ("Not detected", "unknown")
+
+
+def test_gene_with_records_but_no_defining_variant_is_called_reference():
+    # Unrelated records first, so the pre-filter's pass-through lines run out
+    filler = [f"2\t{1000 + i}\t.\tA\tG\t50\tPASS\t.\tGT\t0/1" for i in range(60)]
+    vcf = _vcf(*filler, CYP2C9_OTHER.format("0/1"), VKORC1.format("0/1"))
+    for prefilter in (None, build_prefilter(["WARFARIN"], genome_build="GRCh38")):
+        variants = iter_vcf(vcf, prefilter=prefilter)
+        report = analyze_variants({"variants": variants, "prefilter": prefilter}, "P1", ["WARFARIN"], "GRCh38")
+        warfarin = _by_drug(report)["WARFARIN"]
+        assert warfarin.diplotype == "CYP2C9 *1/*1; VKORC1 -1639A/-1639G"
+        assert warfarin.risk_category == "safe"
+        assert report.summary.total_variants == 62
+
+
+def test_gene_is_covered_by_a_later_record_on_a_chromosome_already_seen():
+    # 'chr'-prefixed names; the first chr10 record lies outside CYP2C9
+    lines = ["chr" + line for line in (CYP2C9_OTHER.replace("94950000", "1000"), CYP2C9_OTHER, VKORC1)]
+    vcf = _vcf(*(line.format("0/1") for line in lines))
+    warfarin = _by_drug(analyze_variants({"variants": iter_vcf(vcf)}, "P1", ["WARFARIN"], "GRCh38"))["WARFARIN"]
+    assert warfarin.risk_category == "safe"
+    [sample] = analyze_cohort(parse_vcf(vcf, cohort=True), ["WARFARIN"], genome_build="GRCh38")
+    assert _by_drug(sample)["WARFARIN"].diplotype == warfarin.diplotype
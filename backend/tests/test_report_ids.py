@@ -0,0 +1,68 @@
+"""Report IDs are unique and ordered across threads and processes"""
+import multiprocessing
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+import pytest
+
+from app.services import report_ids
+from app.services.report_ids import MAX_SEQUENCE, ReportIdGenerator, new_report_id, report_id_timestamp
+
+THREADS = 4
+IDS_PER_THREAD = 2000
+
+
+def _thread_ids(count: int, out: List[List[str]]) -> None:
+    out.append([new_report_id() for _ in range(count)])
+
+
+def _process_ids(threads: int = THREADS, per_thread: int = IDS_PER_THREAD) -> List[List[str]]:
+    """IDs of ``threads`` concurrent threads of this process, one list per thread"""
+    results: List[List[str]] = []
+    workers = [threading.Thread(target=_thread_ids, args=(per_thread, results)) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return results
+
+
+def _check(per_thread: List[List[str]], started: datetime) -> None:
+    finished = datetime.now(timezone.utc) + timedelta(seconds=1)
+    all_ids = [report_id for ids in per_thread for report_id in ids]
+    assert len(set(all_ids)) == len(all_ids)
+    for ids in per_thread:
+        assert ids == sorted(ids) and len(set(ids)) == len(ids)
+    assert all(started <= report_id_timestamp(report_id) <= finished for report_id in all_ids)
+
+
+def test_threads_of_one_process():
+    started = datetime.now(timezone.utc) - timedelta(seconds=1)
+    _check(_process_ids(), started)
+
+
+@pytest.mark.parametrize("method", [m for m in ("fork", "spawn") if m in multiprocessing.get_all_start_methods()])
+def test_processes(method):
+    # Forked children inherit this generator's state, and must reseed it
+    new_report_id()
+    started = datetime.now(timezone.utc) - timedelta(seconds=1)
+    with multiprocessing.get_context(method).Pool(3) as pool:
+        results = pool.starmap(_process_ids, [()] * 3)
+    _check([ids for result in results for ids in result] + [[new_report_id()]], started)
+
+
+def test_sequence_overflow_and_clock_step_back(monkeypatch):
+    now = [1_700_000_000_000 * 1_000_000]
+    monkeypatch.setattr(report_ids.time, "time_ns", lambda: now[0])
+    generator = ReportIdGenerator(worker=7)
+
+    ids = [generator.new_id() for _ in range(MAX_SEQUENCE + 3)]
+    # The clock steps back by a second
+    now[0] -= 1_000_000_000
+    ids += [generator.new_id() for _ in range(3)]
+
+    assert ids == sorted(ids) and len(set(ids)) == len(ids)
+    first, last = report_id_timestamp(ids[0]), report_id_timestamp(ids[-1])
+    # The sequence ran out once, so the later IDs borrowed the next millisecond
+    assert last - first == timedelta(milliseconds=1)
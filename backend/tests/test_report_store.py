@@ -0,0 +1,123 @@
+"""Stored reports load back in the API's shape"""
+import asyncio
+
+import orjson
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import report_store
+from app.database import Base
+from app.models import GeneratedReport, PatientUpload, ReportPayload
+from app.report_store import load_report, store_reports
+from app.services.pgx_engine import analyze_variants
+from app.services.report_model import ClinicalReport
+from app.services.vcf_parser import iter_vcf
+from benchmarks.synthetic import make_vcf
+
+# A report_json row as the first releases stored it: the engine's snake_case
+# dict, with the parsed variants in full
+SNAKE_CASE_REPORT = {
+    "report_id": "RPT-LEGACY",
+    "patient_id": "P1",
+    "generated_at": "2024-01-02T03:04:05",
+    "selected_drugs": ["CODEINE"],
+    "summary": {
+        "total_variants": 1, "drugs_analyzed": 1, "clinically_relevant": 1, "toxicity_risk": 0,
+        "ineffective_risk": 1, "dosage_adjustment": 0, "safe": 0, "unknown": 0,
+        "high_risk_drugs": 1, "moderate_risk_drugs": 0,
+    },
+    "recommendations": [{
+        "drug": "CODEINE", "gene": "CYP2D6", "diplotype": "C/T", "phenotype": "Poor Metabolizer",
+        "risk_category": "ineffective", "risk_level": "high", "recommendation": "Avoid codeine.",
+        "dosage_guidance": "Do not use.", "guideline": "CPIC", "evidence": "Strong", "alternatives": ["Morphine"],
+    }],
+    "variants": [{
+        "chrom": "22", "pos": 42128945, "id": "rs3892097", "ref": "C", "alt": "T",
+        "qual": "50", "filter": "PASS", "info": ".", "genotype": "1/1",
+    }],
+    "disclaimer": "For research use only.",
+}
+
+
+async def _session_factory():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return engine, async_sessionmaker(engine, expire_on_commit=False)
+
+
+async def _upload(session):
+    upload = PatientUpload(patient_id="P1", file_name="p1.vcf", file_size=1)
+    session.add(upload)
+    await session.flush()
+    return upload
+
+
+def _load(report_json):
+    async def run():
+        engine, session_factory = await _session_factory()
+        async with session_factory() as session:
+            upload = await _upload(session)
+            session.add(GeneratedReport(
+                upload_id=upload.id, report_id=report_json.get("report_id") or report_json["reportId"],
+                patient_id="P1", report_json=report_json,
+            ))
+            await session.commit()
+            loaded = await load_report(session, "RPT-LEGACY")
+        await engine.dispose()
+        return orjson.loads(loaded)
+
+    return asyncio.run(run())
+
+
+def test_sections_are_stored_once_and_cores_per_report():
+    content = make_vcf(200, pgx_fraction=0.1, seed=1)
+    reports = [
+        analyze_variants({"variants": iter_vcf(content)}, "P1", drugs, "GRCh38")
+        for drugs in (["CODEINE"], ["WARFARIN", "CLOPIDOGREL"], ["CODEINE"])
+    ]
+
+    async def run():
+        # Digests remembered from other tests' databases are not in this one
+        report_store._known_sections.clear()
+        engine, session_factory = await _session_factory()
+        async with session_factory() as session:
+            upload = await _upload(session)
+            columns = await store_reports(session, reports)
+            for report, values in zip(reports, columns):
+                session.add(GeneratedReport(upload_id=upload.id, report_id=report.report_id, patient_id="P1", **values))
+            await session.commit()
+            payloads = await session.scalar(select(func.count()).select_from(ReportPayload))
+            loaded = [await load_report(session, report.report_id) for report in reports]
+        await engine.dispose()
+        return payloads, loaded
+
+    payloads, loaded = asyncio.run(run())
+    # One variants section and one disclaimer, whatever the drug selection
+    assert payloads == 2
+    assert loaded == [report.to_json() for report in reports]
+
+
+def test_snake_case_report_json_is_converted():
+    report = _load(SNAKE_CASE_REPORT)
+    assert report["reportId"] == "RPT-LEGACY"
+    assert report["selectedDrugs"] == ["CODEINE"]
+    assert report["summary"]["totalVariants"] == 1
+    assert report["recommendations"][0]["riskCategory"] == "ineffective"
+    assert report["recommendations"][0]["dosageGuidance"] == "Do not use."
+    assert report["variants"] == [{
+        "chrom": "22", "pos": 42128945, "id": "rs3892097", "ref": "C", "alt": "T", "qual": "50", "genotype": "1/1",
+    }]
+
+
+def test_camel_case_report_json_is_returned_as_stored():
+    camel_case = {"reportId": "RPT-LEGACY", "patientId": "P1", "summary": {"totalVariants": 0}}
+    assert _load(camel_case) == camel_case
+
+
+def test_report_from_dict_round_trips():
+    content = make_vcf(200, pgx_fraction=0.1, seed=1)
+    report = analyze_variants({"variants": iter_vcf(content)}, "P1", ["CODEINE", "WARFARIN"], "GRCh38")
+    assert report.recommendations and report.variants
+    data = orjson.loads(report.to_json())
+    assert ClinicalReport.from_dict(data) == report
@@ -0,0 +1,42 @@
+"""Cached analyses of pre-filtered tables match uncached analyses"""
+import dataclasses
+import random
+
+from app.services.pgx_engine import analyze_variants, build_prefilter
+from app.services.result_cache import AnalysisCache, content_hash
+from app.services.vcf_parser import iter_vcf
+from benchmarks.synthetic import make_vcf
+
+DRUGS = ["CODEINE", "CLOPIDOGREL", "SIMVASTATIN", "AZATHIOPRINE", "WARFARIN", "FLUOROURACIL"]
+
+
+def _comparable(report):
+    report = dataclasses.asdict(report)
+    del report["report_id"], report["generated_at"]
+    return report
+
+
+def _parse(content, prefilter):
+    def parse(table):
+        for v in iter_vcf(content, prefilter=prefilter):
+            table.append_record(v)
+            yield v
+    return parse
+
+
+def test_prefiltered_table_serves_every_drug_selection():
+    rng = random.Random(7)
+    cache = AnalysisCache(8, 64 << 20)
+    files = [make_vcf(2000, pgx_fraction=0.02, seed=seed) for seed in range(3)]
+    for _ in range(40):
+        content = rng.choice(files)
+        drugs = rng.sample(DRUGS, rng.randint(1, len(DRUGS)))
+        build = rng.choice([None, "GRCh38"])
+        # Built for the selected drugs; the cache widens it to all of them
+        prefilter = build_prefilter(drugs, passthrough=10, genome_build=build)
+        cached, table = cache.analyze(content_hash(content), _parse(content, prefilter), "P1", drugs, build, prefilter)
+        expected = analyze_variants({"variants": iter_vcf(content)}, "P1", drugs, build)
+        assert _comparable(cached) == _comparable(expected)
+        assert cached.summary.total_variants == 2000
+        assert len(table) < 2000
+    assert cache.tables.stats()["hits"] > 0
@@ -0,0 +1,284 @@
+"""BGZF random access and .tbi/.csi region queries against indexes built here in pure Python"""
+import gzip
+import io
+import random
+import struct
+import zlib
+
+import pytest
+
+from app.services.tabix import (
+    BgzfReader,
+    IndexFormatError,
+    TabixIndex,
+    iter_region_lines,
+    read_header_lines,
+    reg2bins,
+)
+
+HEADER = [
+    "##fileformat=VCFv4.2",
+    "##contig=<ID=chr1>",
+    "##contig=<ID=chr22>",
+    "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1",
+]
+
+
+def _reg2bin(beg: int, end: int, min_shift: int = 14, depth: int = 5) -> int:
+    """Smallest bin containing [beg, end) (SAM/tabix spec)"""
+    end -= 1
+    shift, offset = min_shift, ((1 << depth * 3) - 1) // 7
+    for level in range(depth, 0, -1):
+        if beg >> shift == end >> shift:
+            return offset + (beg >> shift)
+        shift += 3
+        offset -= 1 << (level - 1) * 3
+    return 0
+
+
+def _bgzf_block(data: bytes) -> bytes:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    payload = compressor.compress(data) + compressor.flush()
+    header = b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00"
+    return header + struct.pack("<H", len(payload) + 25) + payload + struct.pack("<II", zlib.crc32(data), len(data))
+
+
+def _bgzip(data: bytes, block_size: int):
+    """BGZF file cutting ``data`` every ``block_size`` bytes (lines straddle blocks), and a virtual offset function"""
+    blocks = [data[i:i + block_size] for i in range(0, len(data), block_size)]
+    starts, out = [], bytearray()
+    for block in blocks:
+        starts.append(len(out))
+        out += _bgzf_block(block)
+    eof = len(out)
+    out += _bgzf_block(b"")
+
+    def voffset(k: int) -> int:
+        if k >= len(data):
+            return eof << 16
+        return (starts[k // block_size] << 16) | (k % block_size)
+
+    return bytes(out), voffset
+
+
+def _records(lines):
+    """(chrom, beg, end, start byte, end byte) of each data line; [beg, end) is 0-based"""
+    offset = 0
+    for line in lines:
+        size = len(line) + 1
+        if not line.startswith("#"):
+            cols = line.split("\t")
+            beg = int(cols[1]) - 1
+            yield cols[0], beg, beg + len(cols[3]), offset, offset + size
+        offset += size
+
+
+def _index_refs(lines, voffset, min_shift=14, depth=5):
+    names, refs = [], {}
+    for chrom, beg, end, start, stop in _records(lines):
+        if chrom not in refs:
+            names.append(chrom)
+            refs[chrom] = ({}, {})
+        bins, linear = refs[chrom]
+        chunks = bins.setdefault(_reg2bin(beg, end, min_shift, depth), [])
+        if chunks and chunks[-1][1] == voffset(start):
+            chunks[-1][1] = voffset(stop)
+        else:
+            chunks.append([voffset(start), voffset(stop)])
+        for window in range(beg >> 14, ((end - 1) >> 14) + 1):
+            linear.setdefault(window, voffset(start))
+    return names, refs
+
+
+def _tbi(lines, voffset, index_names=None) -> bytes:
+    names, refs = _index_refs(lines, voffset)
+    blob = b"".join(name.encode() + b"\0" for name in (index_names or names))
+    out = bytearray(b"TBI\x01" + struct.pack("<8i", len(names), 2, 1, 2, 0, ord("#"), 0, len(blob)) + blob)
+    for name in names:
+        bins, linear = refs[name]
+        out += struct.pack("<i", len(bins))
+        for bin_id, chunks in bins.items():
+            out += struct.pack("<Ii", bin_id, len(chunks))
+            for chunk in chunks:
+                out += struct.pack("<QQ", *chunk)
+        windows, last = [], 0
+        for window in range(max(linear) + 1):
+            last = linear.get(window, last)
+            windows.append(last)
+        out += struct.pack("<i", len(windows)) + struct.pack(f"<{len(windows)}Q", *windows)
+    return bytes(out)
+
+
+def _csi(lines, voffset, with_names=True, min_shift=14, depth=5) -> bytes:
+    names, refs = _index_refs(lines, voffset, min_shift, depth)
+    aux = b""
+    if with_names:
+        blob = b"".join(name.encode() + b"\0" for name in names)
+        aux = struct.pack("<7i", 2, 1, 2, 0, ord("#"), 0, len(blob)) + blob
+    out = bytearray(b"CSI\x01" + struct.pack("<3i", min_shift, depth, len(aux)) + aux + struct.pack("<i", len(names)))
+    for name in names:
+        bins, _ = refs[name]
+        out += struct.pack("<i", len(bins))
+        for bin_id, chunks in bins.items():
+            out += struct.pack("<IQi", bin_id, chunks[0][0], len(chunks))
+            for chunk in chunks:
+                out += struct.pack("<QQ", *chunk)
+    return bytes(out)
+
+
+def _vcf(seed: int = 7, per_chrom: int = 400, chroms=("chr1", "chr22")):
+    rng = random.Random(seed)
+    lines = list(HEADER)
+    for chrom in chroms:
+        positions = sorted(rng.sample(range(1, 3_000_000), per_chrom))
+        for i, pos in enumerate(positions):
+            ref = "A" * rng.choice((1, 1, 1, 5, 40))
+            lines.append(f"{chrom}\t{pos}\trs{pos}\t{ref}\tG\t50\tPASS\tDP={i}\tGT\t0/1")
+    return lines
+
+
+def _expected(lines, chrom, start, end):
+    target = chrom[3:] if chrom.startswith("chr") else chrom
+    found = []
+    for line in lines:
+        if line.startswith("#"):
+            continue
+        cols = line.split("\t")
+        name = cols[0][3:] if cols[0].startswith("chr") else cols[0]
+        pos = int(cols[1])
+        if name == target and pos <= end and pos + len(cols[3]) - 1 >= start:
+            found.append(line)
+    return found
+
+
+@pytest.fixture(scope="module")
+def indexed():
+    lines = _vcf()
+    data = ("\n".join(lines) + "\n").encode()
+    # Small blocks: most lines cross a block boundary
+    bgzf, voffset = _bgzip(data, block_size=97)
+    return lines, bgzf, voffset
+
+
+def test_reg2bins_contains_the_bin_of_every_overlapping_interval():
+    rng = random.Random(1)
+    for _ in range(2000):
+        beg = rng.randrange(0, (1 << 29) - 6_000_000)
+        end = beg + rng.choice((1, 10, 20_000, 300_000, 5_000_000))
+        point = rng.randrange(beg, end)
+        bins = reg2bins(max(point - rng.randrange(0, 200_000), 0), point + rng.randrange(1, 200_000), 14, 5)
+        assert _reg2bin(beg, end) in bins
+
+
+def test_reg2bins_levels():
+    assert reg2bins(0, 1, 14, 5) == [0, 1, 9, 73, 585, 4681]
+    # One 16 kb window at the finest level, two when crossing its boundary
+    assert reg2bins(16384, 16385, 14, 5)[-1] == 4682
+    assert reg2bins(16383, 16385, 14, 5)[-2:] == [4681, 4682]
+    # CSI with a deeper tree uses the same scheme
+    assert reg2bins(0, 1, 14, 6)[-1] == ((1 << 18) - 1) // 7
+
+
+def test_bgzf_reader_reads_lines_across_block_boundaries(indexed):
+    lines, bgzf, voffset = indexed
+    reader = BgzfReader(io.BytesIO(bgzf))
+    reader.seek(0)
+    read = []
+    while (line := reader.readline()) is not None:
+        read.append(line.decode())
+    assert read == lines
+    assert read_header_lines(bgzf) == HEADER
+
+
+def test_bgzf_seek_and_tell_use_virtual_offsets(indexed):
+    lines, bgzf, voffset = indexed
+    reader = BgzfReader(io.BytesIO(bgzf))
+    records = list(_records(lines))
+    for _, _, _, start, stop in records[::37]:
+        reader.seek(voffset(start))
+        assert reader.tell() == voffset(start)
+        line = reader.readline().decode()
+        assert (line + "\n").encode() == ("\n".join(lines) + "\n").encode()[start:stop]
+    # Past the last line: the end of the data blocks
+    reader.seek(voffset(records[-1][3]))
+    reader.readline()
+    assert reader.tell() == voffset(records[-1][4])
+
+
+@pytest.mark.parametrize("kind", ["tbi", "tbi.gz", "csi", "csi.gz"])
+def test_region_queries_match_a_scan(indexed, kind):
+    lines, bgzf, voffset = indexed
+    raw = _tbi(lines, voffset) if kind.startswith("tbi") else _csi(lines, voffset)
+    index = TabixIndex.from_bytes(gzip.compress(raw) if kind.endswith(".gz") else raw)
+    rng = random.Random(kind)
+    for _ in range(150):
+        chrom = rng.choice(("chr1", "chr22"))
+        start = rng.randrange(1, 3_000_000)
+        end = start + rng.choice((0, 1, 100, 20_000, 400_000))
+        assert list(iter_region_lines(bgzf, index, [(chrom, start, end)])) == _expected(lines, chrom, start, end)
+
+
+def test_chunks_are_merged_and_start_at_the_linear_index(indexed):
+    lines, bgzf, voffset = indexed
+    index = TabixIndex.from_bytes(_tbi(lines, voffset))
+    chunks = index.chunks_for("chr1", 1, 3_000_000)
+    assert chunks == sorted(chunks)
+    assert all(a[1] < b[0] for a, b in zip(chunks, chunks[1:]))
+    # A query far into the chromosome skips the chunks ending before its window
+    first = [r for r in _records(lines) if r[0] == "chr1" and r[1] >= 2_000_000][0]
+    tail = index.chunks_for("chr1", 2_000_001, 3_000_000)
+    assert tail and tail[0][0] >= index.linear[0][2_000_000 >> 14]
+    assert tail[0][0] <= voffset(first[3])
+
+
+def test_overlapping_regions_yield_each_record_once(indexed):
+    lines, bgzf, voffset = indexed
+    index = TabixIndex.from_bytes(_tbi(lines, voffset))
+    regions = [("chr22", 100_000, 900_000), ("chr22", 500_000, 1_200_000), ("22", 800_000, 850_000)]
+    assert list(iter_region_lines(bgzf, index, regions)) == _expected(lines, "chr22", 100_000, 1_200_000)
+
+
+def test_chr_prefix_mismatch_between_query_index_and_records():
+    lines = _vcf(seed=3, per_chrom=200, chroms=("chr22",))
+    data = ("\n".join(lines) + "\n").encode()
+    bgzf, voffset = _bgzip(data, block_size=512)
+    expected = _expected(lines, "22", 10_000, 2_000_000)
+    assert expected
+
+    # Index named without the prefix, records and query with it (and the reverse)
+    index = TabixIndex.from_bytes(_tbi(lines, voffset, index_names=["22"]))
+    assert list(iter_region_lines(bgzf, index, [("chr22", 10_000, 2_000_000)])) == expected
+    index = TabixIndex.from_bytes(_tbi(lines, voffset))
+    assert list(iter_region_lines(bgzf, index, [("22", 10_000, 2_000_000)])) == expected
+    assert list(iter_region_lines(bgzf, index, [("CHR22", 10_000, 2_000_000)])) == expected
+
+
+def test_csi_without_names_takes_them_from_contig_lines(indexed):
+    lines, bgzf, voffset = indexed
+    raw = _csi(lines, voffset, with_names=False)
+    index = TabixIndex.from_bytes(raw, contigs=["chr1", "chr22"])
+    assert list(iter_region_lines(bgzf, index, [("22", 1, 500_000)])) == _expected(lines, "chr22", 1, 500_000)
+    with pytest.raises(IndexFormatError):
+        TabixIndex.from_bytes(raw)
+
+
+def test_missing_or_unusable_index(indexed):
+    lines, bgzf, voffset = indexed
+    for data in (b"", b"not an index", gzip.compress(b"")):
+        with pytest.raises(IndexFormatError):
+            TabixIndex.from_bytes(data)
+    with pytest.raises(IndexFormatError):
+        TabixIndex.from_bytes(_tbi(lines, voffset)[:200])
+    with pytest.raises(IndexFormatError):
+        TabixIndex.from_bytes(gzip.compress(_tbi(lines, voffset))[:-30])
+
+    # A contig the index does not cover yields nothing
+    index = TabixIndex.from_bytes(_tbi(lines, voffset))
+    assert index.chunks_for("chr7", 1, 10_000_000) == []
+    assert list(iter_region_lines(bgzf, index, [("chr7", 1, 10_000_000)])) == []
+
+
+def test_plain_gzip_is_not_bgzf():
+    data = gzip.compress(("\n".join(HEADER) + "\n").encode())
+    with pytest.raises(IndexFormatError):
+        read_header_lines(data)
@@ -0,0 +1,52 @@
+"""Multipart file part limits"""
+import asyncio
+
+import pytest
+from starlette.datastructures import Headers
+
+from app.upload_stream import UploadTooLarge, read_form
+
+BOUNDARY = "pharmaguardboundary"
+HEADERS = Headers({"content-type": f"multipart/form-data; boundary={BOUNDARY}"})
+LIMITS = {"file": 100, "index": 100}
+RAISED = {"index": {"file": 1000}}
+
+
+def _body(*parts):
+    body = b""
+    for name, data in parts:
+        body += (
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"; filename="{name}.bin"\r\n'
+            "Content-Type: application/octet-stream\r\n\r\n"
+        ).encode() + data + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+
+def _read(body):
+    async def stream():
+        for i in range(0, len(body), 64):
+            yield body[i:i + 64]
+
+    async def run():
+        form = await read_form(HEADERS, stream(), 10_000, LIMITS, RAISED)
+        sizes = {name: part.size for name, part in form.multi_items()}
+        await form.close()
+        return sizes
+
+    return asyncio.run(run())
+
+
+def test_file_after_index_gets_the_raised_limit():
+    assert _read(_body(("index", b"i" * 50), ("file", b"f" * 500))) == {"index": 50, "file": 500}
+
+
+def test_file_before_index_keeps_the_plain_limit():
+    with pytest.raises(UploadTooLarge) as e:
+        _read(_body(("file", b"f" * 500), ("index", b"i" * 50)))
+    assert e.value.limit == 100
+
+
+def test_file_without_index_keeps_the_plain_limit():
+    assert _read(_body(("file", b"f" * 100))) == {"file": 100}
+    with pytest.raises(UploadTooLarge):
+        _read(_body(("file", b"f" * 101)))
@@ -0,0 +1,33 @@
+"""Variant blob round trip and queries"""
+from app.services.variant_blob import VariantBlobReader, encode_variants
+from app.services.variant_table import VariantTable
+
+
+def _table(rows):
+    table = VariantTable()
+    for chrom, pos, variant_id in rows:
+        table.append(chrom, pos, variant_id, "A", "G", "50", "PASS", ".", "0/1")
+    return table
+
+
+ROWS = [("chr1", 100, "rs1"), ("chr1", 200, "rs2"), ("chr2", 150, "rs3"), ("chr1", 300, "rs4"), ("1", 250, "rs5")]
+
+
+def test_round_trip_across_groups():
+    reader = VariantBlobReader(encode_variants(_table(ROWS), group_size=2))
+    assert len(reader) == len(ROWS)
+    assert [(v["chrom"], v["pos"], v["id"]) for v in reader] == ROWS
+
+
+def test_region_ignores_chr_prefix():
+    reader = VariantBlobReader(encode_variants(_table(ROWS), group_size=2))
+    expected = ["rs2", "rs4", "rs5"]
+    for chrom in ("1", "chr1", "CHR1"):
+        assert [v["id"] for v in reader.region(chrom, 200, 300)] == expected
+    assert [v["id"] for v in reader.region("chr2", 1, 1000)] == ["rs3"]
+    assert reader.region("3", 1, 1000) == []
+
+
+def test_rs_ids():
+    reader = VariantBlobReader(encode_variants(_table(ROWS), group_size=2))
+    assert [v["pos"] for v in reader.rs_ids(["rs5", "rs1", "rs9"])] == [100, 250]
@@ -0,0 +1,108 @@
+"""Write-behind retries, dead letters and their replay"""
+import asyncio
+import stat
+
+from app.write_behind import WriteBehindQueue, read_dead_letters
+
+
+class _Database:
+    """Committed jobs, plus how many more commits containing a job should fail"""
+
+    def __init__(self):
+        self.rows = []
+        self.failures = {}
+
+    def session(self):
+        return _Session(self)
+
+
+class _Session:
+    def __init__(self, database):
+        self.database = database
+        self.staged = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def commit(self):
+        failing = [job for job in self.staged if self.database.failures.get(job, 0) > 0]
+        for job in failing:
+            self.database.failures[job] -= 1
+        if failing:
+            raise RuntimeError(f"commit failed for {failing}")
+        self.database.rows.extend(self.staged)
+
+
+async def _stage(db, job):
+    db.staged.append(job)
+
+
+def _queue(database, tmp_path, **options):
+    return WriteBehindQueue(
+        database.session, _stage, batch_size=8, retry_backoff=0.001,
+        dead_letter_path=str(tmp_path / "dead.jsonl"), **options,
+    )
+
+
+def test_failed_job_is_retried_alone(tmp_path):
+    async def run(database):
+        queue = _queue(database, tmp_path, max_retries=3)
+        for job in ("a", "bad", "b"):
+            await queue.submit(job)
+        await queue.close()
+        return queue.stats()
+
+    database = _Database()
+    database.failures["bad"] = 2
+    stats = asyncio.run(run(database))
+    assert sorted(database.rows) == ["a", "b", "bad"]
+    assert (stats["written"], stats["failed"], stats["dead_lettered"]) == (3, 0, 0)
+    assert stats["retries"] >= 2
+    assert not (tmp_path / "dead.jsonl").exists()
+
+
+def test_job_failing_every_retry_is_dead_lettered_and_replayed(tmp_path):
+    async def fail(database):
+        queue = _queue(database, tmp_path, max_retries=2)
+        for job in ("a", "bad"):
+            await queue.submit(job)
+        await queue.close()
+        return queue.stats()
+
+    database = _Database()
+    # One first attempt and two retries
+    database.failures["bad"] = 3
+    stats = asyncio.run(fail(database))
+    assert database.rows == ["a"]
+    assert (stats["failed"], stats["dead_lettered"]) == (1, 1)
+    assert list(read_dead_letters(str(tmp_path / "dead.jsonl"))) == [("bad",)]
+    assert (tmp_path / "dead.jsonl").read_bytes() == b'["bad"]\n'
+    assert stat.S_IMODE((tmp_path / "dead.jsonl").stat().st_mode) == 0o600
+
+    async def replay(database):
+        queue = _queue(database, tmp_path, max_retries=2)
+        replayed = await queue.replay_dead_letters()
+        await queue.close()
+        return replayed
+
+    assert asyncio.run(replay(database)) == 1
+    assert database.rows == ["a", "bad"]
+    assert not (tmp_path / "dead.jsonl").exists()
+    assert not (tmp_path / "dead.jsonl.replay").exists()
+
+
+def test_without_dead_letter_file_the_job_is_dropped():
+    async def run():
+        database = _Database()
+        database.failures["bad"] = 10
+        queue = WriteBehindQueue(database.session, _stage, retry_backoff=0.001, max_retries=1)
+        await queue.submit("bad")
+        await queue.close()
+        return database, queue.stats()
+
+    database, stats = asyncio.run(run())
+    assert database.rows == []
+    assert (stats["failed"], stats["dead_lettered"]) == (1, 0)